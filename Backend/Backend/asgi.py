@@ -3,6 +3,10 @@ ASGI config for Backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live report channel (ticket-app/live_updates, Server-Sent Events) is an
+async streaming view and must be served through this entry point (e.g.
+uvicorn/daphne) — not WSGI, which would hold a worker per open tab.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
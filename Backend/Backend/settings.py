@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'TicketAppB.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -85,6 +86,26 @@ DATABASES = {
     }
 }
 
+# Read replica for report / dashboard reads (TicketAppB/db_router.py).
+# Leave REPORTING_DB_HOST unset to keep every query on `default`.
+if env('REPORTING_DB_HOST', default=''):
+    DATABASES['reporting'] = {
+        **DATABASES['default'],
+        'NAME': env('REPORTING_DB_NAME', default=DATABASES['default']['NAME']),
+        'USER': env('REPORTING_DB_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': env('REPORTING_DB_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        'HOST': env('REPORTING_DB_HOST'),
+        'PORT': env('REPORTING_DB_PORT', default=DATABASES['default']['PORT']),
+    }
+
+DATABASE_ROUTERS = ['TicketAppB.db_router.ReportingRouter']
+
+# Queries that include today fall back to the primary when the replica is
+# further behind than this (seconds). Lag is re-measured at most every
+# REPORTING_DB_LAG_CHECK_SECONDS per process.
+REPORTING_DB_MAX_LAG_SECONDS = int(env('REPORTING_DB_MAX_LAG_SECONDS', default=30))
+REPORTING_DB_LAG_CHECK_SECONDS = int(env('REPORTING_DB_LAG_CHECK_SECONDS', default=5))
+
 
 # custom user model
 AUTH_USER_MODEL = 'TicketAppB.CustomUser'
@@ -153,6 +174,59 @@ REST_FRAMEWORK = {
 SESSION_IDLE_TIMEOUT = int(env('SESSION_IDLE_TIMEOUT', default=1200))
 SESSION_IDLE_TIMEOUT_APK = int(env('SESSION_IDLE_TIMEOUT_APK', default=43200))
 
+# Validate cached sessions with one Redis script call (authentication.touch_session)
+# instead of separate GET/SET round trips. Off only for troubleshooting.
+SESSION_AUTH_USE_SCRIPT = env.bool('SESSION_AUTH_USE_SCRIPT', default=True)
+
+# Company/dealer deactivation kills up to this many sessions in the request;
+# larger sets are revoked by a Celery task after commit.
+SESSION_REVOKE_ASYNC_THRESHOLD = int(env('SESSION_REVOKE_ASYNC_THRESHOLD', default=200))
+
+# Authenticated-user snapshot (principal_cache): Redis lifetime in seconds and
+# per-process LRU size. Snapshots are versioned, so saves take effect at once.
+PRINCIPAL_CACHE_TTL = int(env('PRINCIPAL_CACHE_TTL', default=300))
+PRINCIPAL_CACHE_LRU_SIZE = int(env('PRINCIPAL_CACHE_LRU_SIZE', default=2048))
+
+# Server-side report cache entry lifetime in seconds. Entries are keyed by data
+# version, so this only bounds Redis memory — not staleness.
+REPORT_CACHE_TTL = int(env('REPORT_CACHE_TTL', default=21600))
+
+# Company dashboard snapshot lifetime in seconds. Same-day ingests invalidate
+# it immediately; month totals can lag by up to this long.
+DASHBOARD_SNAPSHOT_TTL = int(env('DASHBOARD_SNAPSHOT_TTL', default=60))
+
+# Background report jobs: how long a job's status and result stay fetchable,
+# how many days a worker aggregates per step, and the longest range allowed.
+REPORT_JOB_TTL = int(env('REPORT_JOB_TTL', default=3600))
+REPORT_JOB_CHUNK_DAYS = int(env('REPORT_JOB_CHUNK_DAYS', default=31))
+REPORT_JOB_MAX_DAYS = int(env('REPORT_JOB_MAX_DAYS', default=366))
+
+# Directory for report job files (ticket export). Must be shared by the Celery
+# workers and the web processes; files are deleted after REPORT_JOB_TTL.
+REPORT_JOB_FILE_ROOT = env('REPORT_JOB_FILE_ROOT', default=os.path.join(MEDIA_ROOT, 'report_jobs'))
+
+# Sharded range reports (report_shards): threads computing uncached shards
+# per process, and how long a closed shard's result stays in Redis.
+REPORT_SHARD_WORKERS = int(env('REPORT_SHARD_WORKERS', default=4))
+REPORT_SHARD_TTL = int(env('REPORT_SHARD_TTL', default=86400))
+
+# Cold ticket archive (ticket_archive): closed days older than this many days
+# move out of transaction_data into columnar files under TICKET_ARCHIVE_ROOT.
+TICKET_ARCHIVE_ROOT = env('TICKET_ARCHIVE_ROOT', default=str(BASE_DIR / 'ticket_archive'))
+TICKET_ARCHIVE_AFTER_DAYS = int(env('TICKET_ARCHIVE_AFTER_DAYS', default=120))
+TICKET_ARCHIVE_DAYS_PER_RUN = int(env('TICKET_ARCHIVE_DAYS_PER_RUN', default=50))
+
+# Report rate limiting (rate_limit): company-wide token bucket (requests per
+# minute, burst) and in-flight cap. Per-user limits scale with UserTier.
+REPORT_RATE_LIMIT_ENABLED = env.bool('REPORT_RATE_LIMIT_ENABLED', default=True)
+REPORT_RATE_COMPANY_PER_MINUTE = int(env('REPORT_RATE_COMPANY_PER_MINUTE', default=240))
+REPORT_RATE_COMPANY_BURST = int(env('REPORT_RATE_COMPANY_BURST', default=60))
+REPORT_RATE_COMPANY_CONCURRENCY = int(env('REPORT_RATE_COMPANY_CONCURRENCY', default=8))
+REPORT_RATE_LEASE_SECONDS = int(env('REPORT_RATE_LEASE_SECONDS', default=120))
+
+# Responses smaller than this are not compressed (gzip / brotli).
+RESPONSE_COMPRESSION_MIN_BYTES = int(env('RESPONSE_COMPRESSION_MIN_BYTES', default=1024))
+
 
 COOKIE_SECURE = env.bool('COOKIE_SECURE', default=not DEBUG)
 SESSION_COOKIE_SECURE = COOKIE_SECURE
@@ -172,6 +246,25 @@ PRODUCT_AUTH_ENDPOINT = env('PRODUCT_AUTH_ENDPOINT', default='/product-authentic
 PRODUCT_REGISTRATION_URL = f"{LICENSE_SERVER_BASE_URL}{PRODUCT_REGISTRATION_ENDPOINT}"
 PRODUCT_AUTH_URL = f"{LICENSE_SERVER_BASE_URL}{PRODUCT_AUTH_ENDPOINT}"
 
+# License server client (license_client): pooled keep-alive connections,
+# (connect, read) timeouts in seconds per endpoint.
+LICENSE_HTTP_POOL_SIZE = int(env('LICENSE_HTTP_POOL_SIZE', default=10))
+LICENSE_CONNECT_TIMEOUT = float(env('LICENSE_CONNECT_TIMEOUT', default=3.05))
+LICENSE_REGISTER_TIMEOUT = float(env('LICENSE_REGISTER_TIMEOUT', default=30))
+LICENSE_AUTH_TIMEOUT = float(env('LICENSE_AUTH_TIMEOUT', default=10))
+# Circuit breaker: open for COOLDOWN seconds after THRESHOLD consecutive
+# failures. Authentication lookups may be served from cache for AUTH_CACHE_TTL.
+LICENSE_BREAKER_THRESHOLD = int(env('LICENSE_BREAKER_THRESHOLD', default=5))
+LICENSE_BREAKER_COOLDOWN = int(env('LICENSE_BREAKER_COOLDOWN', default=30))
+LICENSE_AUTH_CACHE_TTL = int(env('LICENSE_AUTH_CACHE_TTL', default=60))
+# License validation polling (tasks.poll_company_license): seconds between
+# checks, and how long a validation may stay pending before it is given up.
+LICENSE_POLL_INTERVAL_SECONDS = int(env('LICENSE_POLL_INTERVAL_SECONDS', default=3))
+LICENSE_POLL_TIMEOUT_SECONDS = int(env('LICENSE_POLL_TIMEOUT_SECONDS', default=120))
+# Concurrent TerminalMap fetches in tasks.auto_populate_aggregator_tids; keep
+# at or below LICENSE_HTTP_POOL_SIZE so every thread has a pooled connection.
+AGGREGATOR_TID_SYNC_WORKERS = int(env('AGGREGATOR_TID_SYNC_WORKERS', default=8))
+
 # Application Configuration
 APP_VERSION   = env('APP_VERSION')
 PROJECT_NAME  = env('PROJECT_NAME')
@@ -225,6 +318,18 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'TicketAppB.tasks.sweep_stale_sessions',
         'schedule': 600,  # every 10 minutes
     },
+    'flush-session-last-seen': {
+        'task': 'TicketAppB.tasks.flush_session_last_seen',
+        'schedule': 60.0,  # every minute
+    },
+    'reconcile-session-slots': {
+        'task': 'TicketAppB.tasks.reconcile_session_slots',
+        'schedule': 600,  # every 10 minutes
+    },
+    'deliver-outbound-mail': {
+        'task': 'TicketAppB.tasks.deliver_outbound_mail',
+        'schedule': 60.0,  # retries and lost triggers; new mail is sent on enqueue
+    },
     'auto-populate-aggregator-tids': {
         'task': 'TicketAppB.tasks.auto_populate_aggregator_tids',
         'schedule': crontab(hour=0, minute=30),  # daily at 00:30
@@ -237,6 +342,30 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'TicketAppB.tasks.scan_unmatched_aggregator_transactions',
         'schedule': 300.0,  # every 5 minutes
     },
+    'warm-dashboard-snapshots': {
+        'task': 'TicketAppB.tasks.warm_dashboard_snapshots',
+        'schedule': 45.0,  # just under DASHBOARD_SNAPSHOT_TTL
+    },
+    'reconcile-dashboard-counters': {
+        'task': 'TicketAppB.tasks.reconcile_dashboard_counters',
+        'schedule': 1800.0,  # every 30 minutes
+    },
+    'write-replication-heartbeat': {
+        'task': 'TicketAppB.tasks.write_replication_heartbeat',
+        'schedule': 5.0,  # lag resolution for the reporting replica
+    },
+    'fold-od-matrix-increments': {
+        'task': 'TicketAppB.tasks.fold_od_matrix_increments',
+        'schedule': 60.0,  # every minute
+    },
+    'cleanup-report-job-files': {
+        'task': 'TicketAppB.tasks.cleanup_report_job_files',
+        'schedule': 900.0,  # every 15 minutes
+    },
+    'archive-ticket-days': {
+        'task': 'TicketAppB.tasks.archive_ticket_days',
+        'schedule': crontab(hour=3, minute=0),  # daily at 03:00, after log cleanup
+    },
 }
 
 
@@ -246,4 +375,9 @@ EMAIL_PORT = env('EMAIL_PORT',default=587)
 EMAIL_USE_TLS = env('EMAIL_USE_TLS',default=True)
 EMAIL_HOST_USER = env('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
+
+# Outbound mail queue (mail_queue): messages sent per SMTP connection, and
+# attempts before a message is marked failed.
+MAIL_QUEUE_BATCH_SIZE = int(env('MAIL_QUEUE_BATCH_SIZE', default=50))
+MAIL_QUEUE_MAX_ATTEMPTS = int(env('MAIL_QUEUE_MAX_ATTEMPTS', default=5))
 DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL')
\ No newline at end of file
@@ -1,6 +1,7 @@
 from django.urls import path
 from .views.web import auth as auth_views
 from .views.apk import reports as apk_views
+from .views.web import report_jobs as report_job_views
 from .views.apk import apk_upload as apk_upload_views
 from .views.apk import master_send as apk_download_views
 from .views import setup_data as setup_data_views
@@ -23,9 +24,11 @@ urlpatterns = [
     path('apk/dashboard',  apk_views.apk_dashboard, name='apk_dashboard'),
 
     # drill-down flow: buses → schedules → trips → tickets / passengers
+    # (bus-timeline returns schedules + trips for a bus in one call)
     path('apk/buses',      apk_views.apk_bus_list,  name='apk_buses'),
     path('apk/schedules',  apk_views.apk_schedules, name='apk_schedules'),
     path('apk/trips',      apk_views.apk_trips,     name='apk_trips'),
+    path('apk/bus-timeline', apk_views.apk_bus_timeline, name='apk_bus_timeline'),
     path('apk/tickets',    apk_views.apk_tickets,   name='apk_tickets'),
     path('apk/passengers', apk_views.apk_passengers, name='apk_passengers'),
 
@@ -35,8 +38,14 @@ urlpatterns = [
     path('reports/payment-type',  apk_views.payment_type_report,  name='apk_payment_type'),
     path('reports/farewise',      apk_views.farewise_report,      name='apk_farewise'),
     path('reports/expense',                apk_views.expense_report,                name='apk_expense'),
+    path('reports/od-matrix',              apk_views.od_matrix_report,              name='apk_od_matrix'),
     path('reports/aggregator-transactions', apk_views.aggregator_transaction_report, name='apk_aggregator_transactions'),
 
+    # background report jobs — same views as the web report-jobs endpoints
+    path('reports/jobs',                     report_job_views.submit_report_job, name='apk_submit_report_job'),
+    path('reports/jobs/<str:job_id>',        report_job_views.report_job_status, name='apk_report_job_status'),
+    path('reports/jobs/<str:job_id>/result', report_job_views.report_job_result, name='apk_report_job_result'),
+
     # etm version for apk (open to everyone, no tier gate)
     path('device/getEtmVersion', setup_data_views.get_etm_device_version_for_apk),
 
@@ -3,6 +3,38 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def reset_stale_validations() -> int:
+    """
+    Move VALIDATING companies whose poll is past its deadline back to PENDING.
+    Only those (same takeover rule as validate_company_license): every process
+    start runs this, and a live poll_company_license chain keeps its state on
+    the Company row. Uses .update() (single SQL query, no per-object overhead),
+    then bumps the principal cache and recounts, as post_save would have.
+    """
+    from datetime import timedelta
+    from django.db.models import Q
+    from django.utils import timezone
+    from .models import Company
+    from .views.web.company import get_license_poll_timeout
+
+    stale_before = timezone.now() - timedelta(seconds=get_license_poll_timeout() + 60)
+    stuck = Company.objects.filter(
+        Q(license_poll_started_at__isnull=True) | Q(license_poll_started_at__lt=stale_before),
+        authentication_status=Company.AuthStatus.VALIDATING,
+    )
+    stuck_ids = list(stuck.values_list('pk', flat=True))
+    reverted = stuck.filter(pk__in=stuck_ids).update(
+        authentication_status=Company.AuthStatus.PENDING
+    )
+    if reverted:
+        from . import principal_cache
+        from .dashboard_counters import recount
+        for company_id in stuck_ids:
+            principal_cache.bump_company(company_id)
+        recount('company')
+    return reverted
+
+
 class TicketappbConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'TicketAppB'
@@ -15,14 +47,10 @@ class TicketappbConfig(AppConfig):
 
         import TicketAppB.signals
 
-        # Reset any companies stuck in VALIDATING from a previous crashed/killed process.
-        # Uses .update() (single SQL query, no per-object overhead).
+        # Reset companies stuck in VALIDATING by a poll that died with its process.
         # Wrapped in try/except so manage.py migrate/check never breaks if the
         # table doesn't exist yet (fresh install before first migration).
         try:
-            from .models import Company
-            Company.objects.filter(
-                authentication_status=Company.AuthStatus.VALIDATING
-            ).update(authentication_status=Company.AuthStatus.PENDING)
+            reset_stale_validations()
         except Exception as e:
             logger.error(f"Company stuck at VALIDATING couldn't be reverted due to signal registration failure: {e}", exc_info=True)
\ No newline at end of file
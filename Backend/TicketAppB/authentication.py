@@ -9,29 +9,42 @@ request.user  → the authenticated CustomUser instance
 request.auth  → SessionInfo(session_uid, device_type)
 
 Per-request cost (normal path):
-  1 x Redis GET  (cache hit → user_id)
-  1 x DB  GET    (User with select_related company/dealer — hot PK row)
-  1 x Redis SET  (TTL reset, only if >60s since last reset — see _maybe_extend_ttl)
+  1 x Redis EVALSHA (_TOUCH_LUA: revocation check, session GET → user_id,
+                     TTL reset, last-seen stamp — one round trip)
+  1 x Redis MGET    (principal snapshot versions — see principal_cache; the
+                     user, company and dealer rows come from the snapshot, no SQL)
+  last_seen_at is buffered in Redis and written in bulk by a beat task.
+
+  Cache backends without scripting (LocMemCache in tests/dev), or
+  SESSION_AUTH_USE_SCRIPT=False, run the same steps as separate calls.
+  `python manage.py bench_session_auth` times both paths.
 
 On Redis miss (cold start, cache eviction, Redis restart):
-  1 x DB  GET    (UserSession with is_active=True)
+  1 x DB  GET    (UserSession with is_active=True, user/company/dealer joined)
   1 x Redis SET  (repopulate cache)
-  1 x DB  GET    (User with select_related)
+  1 x Redis SET  (principal snapshot)
 
 On force-logout or natural expiry:
   Cache miss → DB lookup → is_active=False → 401. No stale state possible.
 """
 
+import datetime
+import logging
+import time
 from collections import namedtuple
 
 from django.conf import settings
-from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.db.models import Case, DateTimeField, Value, When
 from django.utils import timezone
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from redis.exceptions import ResponseError
 
 from .models import UserSession, UserRole, UserTier
+from . import principal_cache, session_slots
+
+logger = logging.getLogger(__name__)
 
 # Carried on request.auth for all authenticated requests.
 # session_uid  — the opaque session identifier (UUID string)
@@ -41,8 +54,6 @@ from .models import UserSession, UserRole, UserTier
 SessionInfo = namedtuple('SessionInfo', ['session_uid', 'device_type'])
 
 
-User=get_user_model()
-
 COOKIE_NAME = 'pqr_session'
 _CACHE_KEY_PREFIX = 'pqr:session:'
 _REVOKED_KEY_PREFIX = 'pqr:revoked:'
@@ -51,6 +62,9 @@ _REVOKED_KEY_PREFIX = 'pqr:revoked:'
 # Covers any in-flight requests that already passed the cache check.
 _REVOKED_TTL = 60  # seconds
 
+# Without Redis, last_seen_at is written at most once per this many seconds.
+_LAST_SEEN_DEBOUNCE = 300
+
 
 
 
@@ -114,12 +128,48 @@ def kill_session(session) -> None:
       1. DB: is_active = False  (source of truth — survives Redis restart)
       2. Revocation marker set  (blocks _maybe_extend_ttl resurrection for 60s)
       3. Cache key deleted      (instant 401 on next request)
+      4. Login slot freed       (session_slots)
     """
     session.is_active = False
     session.save(update_fields=['is_active'])
     uid = str(session.session_uid)
     set_session_revoked(uid)
     delete_session_cache(uid)
+    session_slots.release(session.user.company_id, [uid])
+
+
+# Revocation batch size: one pipelined SET batch + one DEL per chunk.
+_REVOKE_CHUNK = 1000
+
+
+def revoke_sessions(session_uids) -> None:
+    """
+    Bulk form of steps 2–3 of kill_session: revocation markers are written in
+    one pipeline and the session keys removed with one DEL, per _REVOKE_CHUNK
+    sessions — instead of two round trips per session.
+    """
+    uids = [str(u) for u in session_uids]
+    for i in range(0, len(uids), _REVOKE_CHUNK):
+        chunk = uids[i:i + _REVOKE_CHUNK]
+        cache.set_many({_revoked_key(u): '1' for u in chunk}, timeout=_REVOKED_TTL)
+        cache.delete_many([_cache_key(u) for u in chunk])
+
+
+def kill_sessions(sessions) -> int:
+    """
+    kill_session for every active session in a UserSession queryset, in bulk:
+    one SELECT, one UPDATE per chunk, pipelined Redis revocation and slot
+    release. Returns the number of sessions killed.
+    """
+    rows = list(sessions.filter(is_active=True).values_list('session_uid', 'user__company_id'))
+    uids = [uid for uid, _ in rows]
+    for i in range(0, len(uids), _REVOKE_CHUNK):
+        UserSession.objects.filter(
+            session_uid__in=uids[i:i + _REVOKE_CHUNK], is_active=True,
+        ).update(is_active=False)
+    revoke_sessions(uids)
+    session_slots.release_rows(rows)
+    return len(rows)
 
 def session_key_exists(session_uid: str) -> bool:
     """
@@ -131,6 +181,30 @@ def session_key_exists(session_uid: str) -> bool:
     return bool(cache.get(_cache_key(session_uid)))
 
 
+def live_session_uids(session_uids) -> set:
+    """
+    The subset of session_uids whose Redis cache key still exists. One
+    pipelined EXISTS batch (MGET via get_many on other cache backends).
+    Used by the stale-session sweeper and the key-expiry listener.
+    """
+    uids = [str(u) for u in session_uids]
+    if not uids:
+        return set()
+    client = _redis()
+    if client is None:
+        found = cache.get_many([_cache_key(u) for u in uids])
+        return {u for u in uids if found.get(_cache_key(u))}
+    pipe = client.pipeline(transaction=False)
+    for uid in uids:
+        pipe.exists(cache.make_key(_cache_key(uid)))
+    return {uid for uid, exists in zip(uids, pipe.execute()) if exists}
+
+
+def session_key_prefix() -> str:
+    """Full Redis key prefix of session entries, as seen in key-space events."""
+    return cache.make_key(_CACHE_KEY_PREFIX)
+
+
 def _maybe_extend_ttl(session_uid: str, user_id: int, device_type: str) -> None:
     """
     Reset the Redis TTL for this session using the correct timeout for its device type.
@@ -147,20 +221,198 @@ def _maybe_extend_ttl(session_uid: str, user_id: int, device_type: str) -> None:
 
 
 
+def _seen_key(session_uid: str) -> str:
+    return f'pqr:seen:{session_uid}'
+
+
+def _redis():
+    """Raw client, or None when the cache isn't django-redis."""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+# ── last_seen_at buffer ───────────────────────────────────────────────────────
+# Requests stamp the time into one Redis hash (session_uid → epoch seconds);
+# tasks.flush_session_last_seen writes the stamps to UserSession in bulk
+# every minute. Readers that show or compare last_seen_at merge the buffered
+# stamps in with buffered_last_seen(). Without django-redis the old debounced
+# per-session UPDATE is used instead.
+
+_LAST_SEEN_KEY = 'pqr:lastseen'
+_LAST_SEEN_FLUSHING_KEY = 'pqr:lastseen:flushing'
+_LAST_SEEN_FLUSH_BATCH = 500
+
+
 def _update_last_seen(session_uid: str) -> None:
     """
-    Debounced DB write for last_seen_at.
-    Updates at most once per 5 minutes per session to keep admin UI current
-    without a DB write on every request.
-    Called after a successful cache hit — we don't have the session object,
-    so we use update() on the queryset directly.
+    Debounced DB write for last_seen_at (no-Redis fallback).
+    Updates at most once per 5 minutes per session.
     """
-    debounce_key=f'pqr:seen:{session_uid}'
-    if cache.get(debounce_key):
+    if cache.add(_seen_key(session_uid), 1, timeout=_LAST_SEEN_DEBOUNCE):
+        UserSession.objects.filter(session_uid=session_uid, is_active=True,).update(last_seen_at=timezone.now())
+
+
+def stamp_last_seen(session_uid: str) -> None:
+    """Record activity for this session; persisted by the next flush."""
+    client = _redis()
+    if client is None:
+        _update_last_seen(session_uid)
         return
-    cache.set(debounce_key, 1, timeout=300)  # 5 minute debounce
+    client.hset(_LAST_SEEN_KEY, session_uid, int(time.time()))
+
+
+def buffered_last_seen(session_uids) -> dict:
+    """{session_uid: datetime} for the given sessions' not-yet-flushed stamps."""
+    uids = [str(u) for u in session_uids]
+    client = _redis()
+    if client is None or not uids:
+        return {}
+    found = {}
+    for key in (_LAST_SEEN_FLUSHING_KEY, _LAST_SEEN_KEY):
+        for uid, ts in zip(uids, client.hmget(key, uids)):
+            if ts is not None:
+                found[uid] = datetime.datetime.fromtimestamp(int(ts), tz=datetime.timezone.utc)
+    return found
+
+
+def last_seen(session) -> datetime.datetime:
+    """session.last_seen_at, or its buffered stamp if that is newer."""
+    stamp = buffered_last_seen([session.session_uid]).get(str(session.session_uid))
+    if stamp and (session.last_seen_at is None or stamp > session.last_seen_at):
+        return stamp
+    return session.last_seen_at
+
+
+def _write_last_seen(stamps: dict) -> int:
+    items = list(stamps.items())
+    updated = 0
+    for i in range(0, len(items), _LAST_SEEN_FLUSH_BATCH):
+        chunk = items[i:i + _LAST_SEEN_FLUSH_BATCH]
+        updated += UserSession.objects.filter(
+            session_uid__in=[uid for uid, _ in chunk], is_active=True,
+        ).update(last_seen_at=Case(
+            *[
+                When(session_uid=uid, then=Value(
+                    datetime.datetime.fromtimestamp(int(ts), tz=datetime.timezone.utc)
+                ))
+                for uid, ts in chunk
+            ],
+            output_field=DateTimeField(),
+        ))
+    return updated
+
+
+def flush_last_seen() -> int:
+    """
+    Move the buffered stamps to UserSession.last_seen_at, one UPDATE per
+    _LAST_SEEN_FLUSH_BATCH sessions. The hash is renamed before reading, so
+    stamps written during the flush land in a fresh hash; a flush that died
+    half-way is finished by the next run. Returns rows updated.
+    """
+    client = _redis()
+    if client is None:
+        return 0
+    updated = 0
+    for take in (False, True):
+        if take:
+            try:
+                client.rename(_LAST_SEEN_KEY, _LAST_SEEN_FLUSHING_KEY)
+            except ResponseError:
+                return updated  # nothing buffered since the last flush
+        stamps = {
+            uid.decode(): ts.decode()
+            for uid, ts in client.hgetall(_LAST_SEEN_FLUSHING_KEY).items()
+        }
+        if stamps:
+            updated += _write_last_seen(stamps)
+        client.delete(_LAST_SEEN_FLUSHING_KEY)
+    return updated
+
+
+# ── Cache-hit validation ──────────────────────────────────────────────────────
+
+_MISS, _HIT, _REVOKED = 0, 1, -1
+
+# KEYS: session, revocation marker (full Redis key names), last-seen hash
+# ARGV: web timeout, APK timeout, session_uid, now (epoch seconds)
+# Returns {state, value}. django-redis pickles the value, but a pickled str
+# keeps its text verbatim, so the APK device types can still be found in it
+# to pick the timeout.
+_TOUCH_LUA = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+  return {0, false}
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+  redis.call('DEL', KEYS[1])
+  return {-1, false}
+end
+local timeout = ARGV[1]
+if string.find(value, ':android', 1, true) or string.find(value, ':ios', 1, true) then
+  timeout = ARGV[2]
+end
+redis.call('EXPIRE', KEYS[1], timeout)
+redis.call('HSET', KEYS[3], ARGV[3], ARGV[4])
+return {1, value}
+"""
+
+_touch_script = None
+
+
+def _touch_scripted(client, session_uid: str):
+    global _touch_script
+    if _touch_script is None:
+        _touch_script = client.register_script(_TOUCH_LUA)
+    state, raw = _touch_script(
+        keys=[
+            cache.make_key(_cache_key(session_uid)),
+            cache.make_key(_revoked_key(session_uid)),
+            _LAST_SEEN_KEY,
+        ],
+        args=[
+            get_session_timeout('web_desktop'), get_session_timeout('android'),
+            session_uid, int(time.time()),
+        ],
+    )
+    return state, cache.client.decode(raw) if state == _HIT else None
 
-    UserSession.objects.filter(session_uid=session_uid, is_active=True,).update(last_seen_at=timezone.now())
+
+def _touch_sequential(session_uid: str):
+    value = cache.get(_cache_key(session_uid))
+    if not value:
+        return _MISS, None
+    # Revocation marker: set by kill_session for 60s after a force-logout.
+    # Prevents _maybe_extend_ttl from resurrecting the session on in-flight
+    # requests that already passed the cache check before the kill happened.
+    if cache.get(_revoked_key(session_uid)):
+        delete_session_cache(session_uid)
+        return _REVOKED, None
+    parts = str(value).split(':', 1)
+    _maybe_extend_ttl(session_uid, parts[0], parts[1] if len(parts) == 2 else 'web_desktop')
+    stamp_last_seen(session_uid)
+    return _HIT, value
+
+
+def touch_session(session_uid: str):
+    """
+    Validate a session against Redis, keep it alive and stamp last-seen, in
+    one round trip where the cache supports scripting.
+    Returns (state, cached value):
+      _MISS     no cache entry — fall back to the DB
+      _REVOKED  killed mid-flight; the cache entry has been deleted
+      _HIT      TTL reset and activity stamped
+    """
+    if getattr(settings, 'SESSION_AUTH_USE_SCRIPT', True):
+        client = _redis()
+        if client is not None:
+            try:
+                return _touch_scripted(client, session_uid)
+            except Exception as e:
+                logger.warning(f"Session script failed, using separate calls: {e}")
+    return _touch_sequential(session_uid)
 
 
 
@@ -178,8 +430,12 @@ class SessionAuthentication(BaseAuthentication):
             return None
         
         # ── Try Redis cache first ─────────────────────────────────────────────
-        cached_value = cache.get(_cache_key(session_uid))
-        if cached_value:
+        state, cached_value = touch_session(session_uid)
+        if state == _REVOKED:
+            # Return None (not AuthenticationFailed) so AllowAny views (login,
+            # logout) still work when a user retries with a killed-session cookie.
+            return None
+        if state == _HIT:
             # Parse composite value "user_id:device_type".
             # Backward compat: old-format entries contain only "user_id" (no colon).
             # Treat those as web_desktop so they get the web timeout.
@@ -187,26 +443,14 @@ class SessionAuthentication(BaseAuthentication):
             cached_user_id_str = parts[0]
             device_type = parts[1] if len(parts) == 2 else 'web_desktop'
 
-            # Revocation marker: set by kill_session for 60s after a force-logout.
-            # Prevents _maybe_extend_ttl from resurrecting the session on in-flight
-            # requests that already passed the cache check before the kill happened.
-            if cache.get(_revoked_key(session_uid)):
-                delete_session_cache(session_uid)
-                # Return None (not AuthenticationFailed) so AllowAny views (login,
-                # logout) still work when a user retries with a killed-session cookie.
-                return None
-
             try:
-                user = User.objects.select_related('company', 'dealer').get(
-                    pk=int(cached_user_id_str),
-                    is_active=True,
-                )
-            except (User.DoesNotExist, ValueError):
+                user = principal_cache.get_user(int(cached_user_id_str))
+            except ValueError:
+                user = None
+            if user is None:
                 delete_session_cache(session_uid)
                 return None
 
-            _maybe_extend_ttl(session_uid, int(cached_user_id_str), device_type)
-            _update_last_seen(session_uid)
             self._check_tier(user)
             return (user, SessionInfo(session_uid, device_type))
 
@@ -228,7 +472,8 @@ class SessionAuthentication(BaseAuthentication):
         # Repopulate cache
         device_type = str(session.device_type) if session.device_type else 'web_desktop'
         set_session_cache(session_uid, user.pk, device_type)
-        _update_last_seen(session_uid)
+        principal_cache.store(user)
+        stamp_last_seen(session_uid)
         self._check_tier(user)
         return (user, SessionInfo(session_uid, device_type))
 
@@ -0,0 +1,273 @@
+"""
+DashboardCounters
+=================
+Maintained registry counts (DashboardCounter) for the superadmin, dealer and
+executive dashboards, so they no longer COUNT(CASE ...) over Company, Dealer,
+ETMDevice and CustomUser on every load.
+
+Counters
+  global  company:total, company:<authentication_status>
+          dealer:total,  dealer:<authentication_status>
+          device:total,  device:<allocation_status>
+          user:total,    user:no_company          (non-superusers only)
+  company device:total, device:active, device:pending, device:suspended
+          user:total
+  Statuses are the stored TextChoices values ('Approve', 'DealerPool', ...).
+
+Maintenance
+  signals.py snapshots the tracked fields of a row in pre_save and applies
+  the difference in post_save / post_delete (F() increments, same
+  transaction as the write). Code that changes these fields with bulk
+  .update() / bulk_create() calls recount(kind) instead — those bypass
+  signals.
+
+  tasks.reconcile_dashboard_counters recomputes everything from the source
+  tables with one grouped query per kind and corrects any drift (rows
+  written by raw SQL, a crashed worker between save and signal, ...).
+
+Seeding
+  A ('global', 0, '_seeded') row is written by the first recount. Until it
+  exists, increments for missing rows are skipped and the first dashboard
+  read runs a full recount — a fresh deploy needs no data migration.
+"""
+
+import logging
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = 'global'
+COMPANY = 'company'
+
+_SEEDED_KEY = (GLOBAL, 0, '_seeded')
+
+# kind → fields (attnames) that decide which counters a row belongs to
+TRACKED_FIELDS = {
+    'company': ('authentication_status',),
+    'dealer':  ('authentication_status',),
+    'device':  ('allocation_status', 'is_active', 'company_id'),
+    'user':    ('is_superuser', 'company_id'),
+}
+
+
+def _model(kind):
+    from django.contrib.auth import get_user_model
+    from .models import Company, Dealer, ETMDevice
+
+    return {
+        'company': Company,
+        'dealer': Dealer,
+        'device': ETMDevice,
+        'user': get_user_model(),
+    }[kind]
+
+
+def _keys(kind, state):
+    """Counter keys a row in this state contributes 1 to."""
+    if state is None:
+        return []
+    if kind in ('company', 'dealer'):
+        return [
+            (GLOBAL, 0, f'{kind}:total'),
+            (GLOBAL, 0, f"{kind}:{state['authentication_status']}"),
+        ]
+    if kind == 'device':
+        from .models import ETMDevice
+
+        keys = [
+            (GLOBAL, 0, 'device:total'),
+            (GLOBAL, 0, f"device:{state['allocation_status']}"),
+        ]
+        company_id = state['company_id']
+        if company_id:
+            allocated = state['allocation_status'] == ETMDevice.AllocationStatus.ALLOCATED
+            keys.append((COMPANY, company_id, 'device:total'))
+            if allocated and state['is_active']:
+                keys.append((COMPANY, company_id, 'device:active'))
+            if state['allocation_status'] == ETMDevice.AllocationStatus.DEALER_POOL:
+                keys.append((COMPANY, company_id, 'device:pending'))
+            if not state['is_active']:
+                keys.append((COMPANY, company_id, 'device:suspended'))
+        return keys
+    if kind == 'user':
+        if state['is_superuser']:
+            return []
+        company_id = state['company_id']
+        return [
+            (GLOBAL, 0, 'user:total'),
+            (COMPANY, company_id, 'user:total') if company_id else (GLOBAL, 0, 'user:no_company'),
+        ]
+    raise ValueError(f'Unknown counter kind: {kind}')
+
+
+# ── Signal-side maintenance ───────────────────────────────────────────────────
+
+def state_of(kind, instance) -> dict:
+    return {field: getattr(instance, field) for field in TRACKED_FIELDS[kind]}
+
+
+def stored_state(kind, instance, update_fields=None):
+    """
+    Tracked fields as currently stored in the DB (pre_save), None for a new
+    row. Returns False when update_fields shows no tracked field can change —
+    the caller then skips the post_save work entirely.
+    """
+    if instance.pk is None or instance._state.adding:
+        return None
+    fields = TRACKED_FIELDS[kind]
+    if update_fields is not None and not {f.removesuffix('_id') for f in fields} & set(update_fields):
+        return False
+    return _model(kind).objects.filter(pk=instance.pk).values(*fields).first()
+
+
+def apply_change(kind, old_state, new_state) -> None:
+    """Move one row's contribution from old_state to new_state (either may be None)."""
+    if old_state is False:
+        return
+    deltas = Counter(_keys(kind, new_state))
+    deltas.subtract(_keys(kind, old_state))
+    for key, delta in deltas.items():
+        if delta:
+            _add(key, delta)
+
+
+def _add(key, delta) -> None:
+    from .models import DashboardCounter
+
+    scope, scope_id, metric = key
+    rows = DashboardCounter.objects.filter(scope=scope, scope_id=scope_id, metric=metric)
+    if rows.update(value=F('value') + delta):
+        return
+    # First row for this key. Before the first recount the true base value is
+    # unknown — leave it to the seeding recount rather than start from 0.
+    if not DashboardCounter.objects.filter(
+        scope=_SEEDED_KEY[0], scope_id=_SEEDED_KEY[1], metric=_SEEDED_KEY[2],
+    ).exists():
+        return
+    try:
+        with transaction.atomic():
+            DashboardCounter.objects.create(scope=scope, scope_id=scope_id, metric=metric, value=delta)
+    except IntegrityError:
+        rows.update(value=F('value') + delta)
+
+
+# ── Recount / reconcile ───────────────────────────────────────────────────────
+
+def _expected(kinds) -> Counter:
+    expected = Counter()
+    for kind in kinds:
+        fields = TRACKED_FIELDS[kind]
+        for row in _model(kind).objects.values(*fields).annotate(n=Count('pk')).order_by():
+            for key in _keys(kind, row):
+                expected[key] += row['n']
+    return expected
+
+
+def recount(*kinds) -> int:
+    """
+    Recompute the counters of the given kinds (all when none given) from the
+    source tables and store the corrected values. Returns how many counter
+    rows were wrong. One grouped query per kind.
+    """
+    from .models import DashboardCounter
+
+    kinds = kinds or tuple(TRACKED_FIELDS)
+    expected = _expected(kinds)
+    prefixes = Q()
+    for kind in kinds:
+        prefixes |= Q(metric__startswith=f'{kind}:')
+
+    with transaction.atomic():
+        existing = {
+            (row.scope, row.scope_id, row.metric): row
+            for row in DashboardCounter.objects.select_for_update().filter(prefixes)
+        }
+        changed, created = [], []
+        for key, row in existing.items():
+            value = expected.get(key, 0)
+            if row.value != value:
+                row.value = value
+                changed.append(row)
+        for key, value in expected.items():
+            if key not in existing:
+                created.append(DashboardCounter(scope=key[0], scope_id=key[1], metric=key[2], value=value))
+
+        if changed:
+            DashboardCounter.objects.bulk_update(changed, ['value'])
+        if created:
+            DashboardCounter.objects.bulk_create(created, ignore_conflicts=True)
+        DashboardCounter.objects.get_or_create(
+            scope=_SEEDED_KEY[0], scope_id=_SEEDED_KEY[1], metric=_SEEDED_KEY[2],
+            defaults={'value': 1},
+        )
+
+    drift = len(changed) + len(created)
+    if drift:
+        logger.info(f'Dashboard counters corrected: {drift} row(s) for {", ".join(kinds)}')
+    return drift
+
+
+def recount_on_commit(*kinds) -> None:
+    """recount() after the current transaction commits — for bulk write paths."""
+    transaction.on_commit(lambda: recount(*kinds))
+
+
+# ── Reads ─────────────────────────────────────────────────────────────────────
+
+def global_counts() -> dict:
+    """{metric: value} for the global scope. Seeds the table on first use."""
+    from .models import DashboardCounter
+
+    counts = dict(
+        DashboardCounter.objects.filter(scope=GLOBAL, scope_id=0).values_list('metric', 'value')
+    )
+    if _SEEDED_KEY[2] not in counts:
+        recount()
+        return global_counts()
+    return counts
+
+
+def company_counts(company_ids) -> dict:
+    """{company_pk: {metric: value}} — one query for any number of companies."""
+    from .models import DashboardCounter
+
+    company_ids = list(company_ids)
+    counts = {company_id: {} for company_id in company_ids}
+    seeded = False
+    for scope, scope_id, metric, value in DashboardCounter.objects.filter(
+        Q(scope=COMPANY, scope_id__in=company_ids)
+        | Q(scope=_SEEDED_KEY[0], scope_id=_SEEDED_KEY[1], metric=_SEEDED_KEY[2])
+    ).values_list('scope', 'scope_id', 'metric', 'value'):
+        if scope == GLOBAL:
+            seeded = True
+        else:
+            counts[scope_id][metric] = value
+    if not seeded and company_ids:
+        recount()
+        return company_counts(company_ids)
+    return counts
+
+
+def per_company(metric: str) -> dict:
+    """{company_pk: value} of one metric for every company where it is non-zero."""
+    from .models import DashboardCounter
+
+    global_counts()  # seeds on first use
+    return dict(
+        DashboardCounter.objects.filter(
+            scope=COMPANY, metric=metric, value__gt=0,
+        ).values_list('scope_id', 'value')
+    )
+
+
+def device_breakdown(counts: dict) -> dict:
+    """The per-company `devices` block the dealer/executive dashboards return."""
+    return {
+        'total':     counts.get('device:total', 0),
+        'active':    counts.get('device:active', 0),
+        'pending':   counts.get('device:pending', 0),
+        'suspended': counts.get('device:suspended', 0),
+    }
@@ -0,0 +1,295 @@
+"""
+DashboardSnapshot
+=================
+Company admin landing-page metrics (get_company_dashboard_metrics), built in
+a handful of combined conditional aggregates and cached per (company, date).
+
+Queries per build (was ~14 separate ones)
+  1. TransactionData  — daily cash / UPI / passengers: one SUM(... FILTER).
+                        Month and previous month totals are summed from
+                        per-day revenue via report_shards, so closed weeks
+                        are cache reads and only the current week is scanned.
+  2. TripData         — trips completed + buses with an open trip, grouped.
+  3. ScheduleData     — buses with an open schedule.
+  4. VehicleType + Route counts (one query each).
+  5. AggregatorTransaction — total / verified / pending / failed counts.
+  6. Recent closed trips and recent verified settlements (activity feed).
+
+Cache
+  pqr:dash:<company_pk>:<YYYY-MM-DD>:<day version>:<master version>
+  The versions are the report_cache data versions, so the ingest tasks,
+  master-data signals and settlement updates invalidate a day's snapshot as
+  soon as they commit. Month totals also read other days of the month; those
+  lag by at most DASHBOARD_SNAPSHOT_TTL (default 60s).
+
+  A snapshot where any section failed is returned but never cached.
+
+Pre-warm
+  tasks.warm_dashboard_snapshots (beat) builds today's snapshot for every
+  company with an active login, so the landing page is a single cache read.
+"""
+
+import logging
+from datetime import date as date_cls
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.utils import OperationalError, ProgrammingError
+
+from .report_cache import get_data_versions
+from . import ticket_archive
+from .report_shards import collect_sharded
+from .ticket_agg import to_money
+
+logger = logging.getLogger(__name__)
+
+_SNAPSHOT_KEY_PREFIX = 'pqr:dash:'
+
+
+def get_dashboard_snapshot_ttl() -> int:
+    return int(getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 60))
+
+
+def empty_snapshot() -> dict:
+    return {
+        "collections": {
+            "daily_cash": 0,
+            "daily_upi": 0,
+            "monthly_total": 0,
+            "prev_month_total": 0,
+        },
+        "operations": {
+            "buses_active": 0,
+            "buses_idle": 0,
+            "buses_running": 0,
+            "buses_total": 0,
+            "trips_completed": 0,
+            "trips_scheduled": 0,
+            "routes_active": 0,
+            "routes_total": 0,
+            "total_passengers": 0,
+        },
+        "settlements": {
+            "total_transactions": 0,
+            "verified": 0,
+            "pending_verification": 0,
+            "failed": 0,
+        },
+        "recent_activity": [],
+    }
+
+
+# ── Sections ──────────────────────────────────────────────────────────────────
+
+def _collect_daily_revenue(company, params, from_date, to_date, acc):
+    from .models import TransactionData
+
+    for r in TransactionData.objects.filter(
+        company_code=company,
+        ticket_date__range=[from_date, to_date],
+    ).values('ticket_date').annotate(total=Sum('ticket_amount')):
+        acc[str(r['ticket_date'])] = r['total'] or 0
+
+    archived = ticket_archive.frame(company, from_date, to_date, ('ticket_date', 'ticket_amount'))
+    if len(archived):
+        days, totals = archived.group_sum('ticket_date', archived['ticket_amount'])
+        for day, paise in zip(days, totals):
+            acc[str(day)] = acc.get(str(day), 0) + to_money(paise)
+    return acc
+
+
+def _collections(company, day, snapshot):
+    from .models import TransactionData
+
+    month_start = day.replace(day=1)
+    prev_start = month_start - relativedelta(months=1)
+    month_end = month_start + relativedelta(months=1, days=-1)
+
+    totals = TransactionData.objects.filter(
+        company_code=company,
+        ticket_date=day,
+    ).aggregate(
+        daily_cash=Sum('ticket_amount', filter=Q(ticket_status=TransactionData.PaymentMode.CASH)),
+        daily_upi=Sum('ticket_amount', filter=Q(ticket_status=TransactionData.PaymentMode.UPI)),
+        passengers=Sum('total_tickets'),
+    )
+    # Month totals: per-day revenue in week shards — closed weeks come from
+    # the shard cache, so only the current week is scanned.
+    daily_revenue = collect_sharded('daily_revenue', _collect_daily_revenue, company, {}, prev_start, month_end)
+    this_month = str(month_start)
+
+    snapshot["collections"] = {
+        "daily_cash": float(totals['daily_cash'] or 0),
+        "daily_upi": float(totals['daily_upi'] or 0),
+        "monthly_total": float(sum(v for d, v in daily_revenue.items() if d >= this_month)),
+        "prev_month_total": float(sum(v for d, v in daily_revenue.items() if d < this_month)),
+    }
+    snapshot["operations"]["total_passengers"] = int(totals['passengers'] or 0)
+
+
+def _trips(company, day, snapshot):
+    from .models import TripData, ScheduleData
+
+    operations = snapshot["operations"]
+    trips_completed = 0
+    open_trip_bus_ids = set()
+    for row in TripData.objects.filter(
+        company_code=company,
+        start_date=day,
+    ).values('bus_id', 'is_closed').annotate(n=Count('id')):
+        if row['is_closed']:
+            trips_completed += row['n']
+        elif row['bus_id'] is not None:
+            open_trip_bus_ids.add(row['bus_id'])
+
+    # Buses with an open schedule today, split into:
+    #   running = schedule open AND a trip currently open under it
+    #   idle    = schedule open, no trip currently open
+    open_schedule_bus_ids = set(
+        ScheduleData.objects.filter(
+            company_code=company,
+            start_date=day,
+            is_closed=False,
+            bus_id__isnull=False,
+        ).values_list('bus_id', flat=True).distinct()
+    )
+    running_bus_ids = open_trip_bus_ids & open_schedule_bus_ids
+
+    operations["trips_completed"] = trips_completed
+    operations["trips_scheduled"] = trips_completed
+    operations["buses_running"] = len(running_bus_ids)
+    operations["buses_idle"] = len(open_schedule_bus_ids - running_bus_ids)
+    operations["buses_active"] = len(open_schedule_bus_ids)
+
+
+def _fleet(company, day, snapshot):
+    from .models import Route, VehicleType
+
+    routes = Route.objects.filter(company=company).aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(is_deleted=False)),
+    )
+    snapshot["operations"]["buses_total"] = VehicleType.objects.filter(
+        company=company, is_deleted=False,
+    ).count()
+    snapshot["operations"]["routes_total"] = routes['total']
+    snapshot["operations"]["routes_active"] = routes['active']
+
+
+def _settlements(company, day, snapshot):
+    from .models import AggregatorTransaction
+
+    # AggregatorTransaction is counted through the ticket it reconciled to —
+    # unmatched payments have no reliable company yet.
+    VS = AggregatorTransaction.VerificationStatus
+    snapshot["settlements"] = AggregatorTransaction.objects.filter(
+        transaction_date=day,
+        related_ticket__company_code=company,
+    ).aggregate(
+        total_transactions=Count('id'),
+        verified=Count('id', filter=Q(verification_status=VS.VERIFIED)),
+        pending_verification=Count('id', filter=Q(verification_status__in=[VS.UNVERIFIED, VS.FLAGGED])),
+        failed=Count('id', filter=Q(verification_status__in=[VS.REJECTED, VS.DISPUTED])),
+    )
+
+
+def _recent_activity(company, day, snapshot):
+    from .models import AggregatorTransaction, TripData
+
+    recent_activity = []
+    closed_trips = TripData.objects.filter(
+        company_code=company,
+        start_date=day,
+        is_closed=True,
+        end_datetime__isnull=False,
+    ).select_related('route_id').order_by('-end_datetime')[:6]
+
+    for trip in closed_trips:
+        route_code = trip.route_id.route_code if trip.route_id else f"Sch {trip.schedule_no}"
+        recent_activity.append({
+            "type": "trip_close",
+            "label": f"Trip #{trip.trip_no} closed — {trip.palmtec_id}",
+            "route": route_code,
+            "time": trip.end_datetime.strftime("%H:%M") if trip.end_datetime else "",
+            "amount": float(trip.total_collection) if trip.total_collection else None,
+        })
+
+    recent_settlements = AggregatorTransaction.objects.filter(
+        transaction_date=day,
+        related_ticket__company_code=company,
+        verification_status=AggregatorTransaction.VerificationStatus.VERIFIED,
+    ).order_by('-created_at')[:2]
+
+    for s in recent_settlements:
+        recent_activity.append({
+            "type": "settlement",
+            "label": f"Payment verified — {s.transactionID or 'UPI'}",
+            "route": None,
+            "time": s.created_at.strftime("%H:%M") if s.created_at else "",
+            "amount": float(s.transactionAmount) if s.transactionAmount else None,
+        })
+
+    # Sort combined list by time desc, keep top 8
+    snapshot["recent_activity"] = sorted(recent_activity, key=lambda x: x["time"], reverse=True)[:8]
+
+
+_SECTIONS = (
+    ('Collection', _collections),
+    ('Trip', _trips),
+    ('Route/vehicle', _fleet),
+    ('Settlement', _settlements),
+    ('Recent activity', _recent_activity),
+)
+
+
+# ── Build / cache ─────────────────────────────────────────────────────────────
+
+def build_snapshot(company, day: date_cls):
+    """
+    Compute the dashboard for one company and date, uncached.
+    Returns (snapshot, complete) — complete is False if any section failed
+    (that section is left at zero, as the dashboard always did).
+    """
+    snapshot = empty_snapshot()
+    complete = True
+    for name, section in _SECTIONS:
+        try:
+            section(company, day, snapshot)
+        except (OperationalError, ProgrammingError) as e:
+            logger.warning(f"{name} metrics unavailable: {str(e)}")
+            complete = False
+        except Exception as e:
+            logger.exception(f"{name} metrics error: {str(e)}")
+            complete = False
+    return snapshot, complete
+
+
+def _snapshot_key(company_id, day) -> str:
+    day_version, master_version = get_data_versions(company_id, [str(day)])
+    return f'{_SNAPSHOT_KEY_PREFIX}{company_id}:{day}:{day_version}:{master_version}'
+
+
+def get_snapshot(company, day: date_cls) -> dict:
+    """Cached dashboard for (company, date); builds and stores it on a miss."""
+    key = _snapshot_key(company.pk, day)
+    snapshot = cache.get(key)
+    if snapshot is not None:
+        return snapshot
+    snapshot, complete = build_snapshot(company, day)
+    if complete:
+        cache.set(key, snapshot, timeout=get_dashboard_snapshot_ttl())
+    return snapshot
+
+
+def warm_snapshot(company, day: date_cls) -> bool:
+    """
+    Rebuild and store the snapshot, resetting its TTL. Run by beat slightly
+    more often than the TTL, so an active company's page never misses.
+    """
+    key = _snapshot_key(company.pk, day)
+    snapshot, complete = build_snapshot(company, day)
+    if complete:
+        cache.set(key, snapshot, timeout=get_dashboard_snapshot_ttl())
+    return complete
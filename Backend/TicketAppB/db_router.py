@@ -0,0 +1,164 @@
+"""
+DBRouter
+========
+Sends report, dashboard and report-job reads to the `reporting` database (a
+MySQL read replica) so heavy aggregates stop competing with device ingest
+and Celery writes on `default`.
+
+Opt-in
+  Nothing is routed unless the code is running inside reporting_reads() —
+  views opt in with @use_reporting_db, report jobs wrap their run. Writes
+  always go to `default`, and so do reads inside an atomic block opened on
+  `default` within the reporting block (read-your-writes, select_for_update
+  — e.g. the dashboard counter recount). Without a `reporting` entry in
+  DATABASES (REPORTING_DB_HOST unset) everything stays on `default`.
+
+Replication lag
+  tasks.write_replication_heartbeat stamps ReplicationHeartbeat on the
+  primary every few seconds; lag = now − the stamp read back from the
+  replica, checked at most every REPORTING_DB_LAG_CHECK_SECONDS per process.
+    lag unknown (replica down, no heartbeat yet)      → primary
+    lag > REPORTING_DB_MAX_LAG_SECONDS, span has today → primary
+    otherwise                                          → replica
+  Past days do not change under normal operation, so a lagging replica
+  keeps serving them. A request without a span (live dashboards) counts as
+  "today".
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+REPORTING = 'reporting'
+
+# None: reads stay on default. An int: route reads to the replica, as long as
+# no atomic block was opened on default beyond that many (the depth when
+# reporting_reads() was entered).
+_reporting_depth = ContextVar('reporting_depth', default=None)
+
+# (checked_at monotonic, lag seconds or None) — per process
+_lag_checked = [0.0, None]
+
+
+def reporting_configured() -> bool:
+    return REPORTING in settings.DATABASES
+
+
+def get_max_lag_seconds() -> float:
+    return float(getattr(settings, 'REPORTING_DB_MAX_LAG_SECONDS', 30))
+
+
+def _lag_check_interval() -> float:
+    return float(getattr(settings, 'REPORTING_DB_LAG_CHECK_SECONDS', 5))
+
+
+def _atomic_depth() -> int:
+    return len(connections[DEFAULT_DB_ALIAS].atomic_blocks)
+
+
+def reads_on_replica() -> bool:
+    depth = _reporting_depth.get()
+    return depth is not None and reporting_configured() and _atomic_depth() <= depth
+
+
+class ReportingRouter:
+    def db_for_read(self, model, **hints):
+        return REPORTING if reads_on_replica() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit: an instance loaded from the replica must still save to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Same data on both aliases.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+# ── Replication lag ───────────────────────────────────────────────────────────
+
+def _measure_lag():
+    from .models import ReplicationHeartbeat
+
+    try:
+        beat_at = ReplicationHeartbeat.objects.using(REPORTING).values_list(
+            'beat_at', flat=True,
+        ).first()
+    except Exception as e:
+        # Any failure to measure means "unknown" — serve from the primary.
+        logger.warning(f'Reporting replica lag unavailable, using primary: {e}')
+        return None
+    if beat_at is None:
+        return None
+    return max(0.0, (timezone.now() - beat_at).total_seconds())
+
+
+def replica_lag():
+    """Replica lag in seconds, or None if unknown. Cached briefly per process."""
+    now = time.monotonic()
+    if now - _lag_checked[0] >= _lag_check_interval():
+        _lag_checked[0], _lag_checked[1] = now, _measure_lag()
+    return _lag_checked[1]
+
+
+def replica_usable(days=None) -> bool:
+    """
+    Whether a read covering `days` (YYYY-MM-DD strings; None = includes
+    today) may be served by the replica right now.
+    """
+    if not reporting_configured():
+        return False
+    lag = replica_lag()
+    if lag is None:
+        return False
+    if lag <= get_max_lag_seconds():
+        return True
+    return days is not None and str(timezone.localdate()) not in days
+
+
+# ── Opt-in ────────────────────────────────────────────────────────────────────
+
+@contextmanager
+def reporting_reads(days=None):
+    """Route ORM reads in the block to the replica when replica_usable(days)."""
+    token = _reporting_depth.set(_atomic_depth() if replica_usable(days) else None)
+    try:
+        yield
+    finally:
+        _reporting_depth.reset(token)
+
+
+def use_reporting_db(span=None, skip_params=()):
+    """
+    View decorator (innermost, under @cached_report): run the view body with
+    reporting_reads().
+    span        — one of the report_cache date span helpers; without it, or
+                  when the params don't parse, the request counts as today
+    skip_params — any of these present keeps the request on the primary
+                  (e.g. the web reports' since= polling cursor, which must
+                  not skip rows the replica hasn't applied yet)
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            params = request.GET
+            if any(p in params for p in skip_params):
+                return view_func(request, *args, **kwargs)
+            with reporting_reads(span(params) if span else None):
+                response = view_func(request, *args, **kwargs)
+                # cached_report shortens the TTL of today's replica-built
+                # entries — they may be missing up to the replica's lag.
+                response._from_replica = reads_on_replica()
+                return response
+        return wrapper
+    return decorator
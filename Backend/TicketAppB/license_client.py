@@ -0,0 +1,160 @@
+"""
+LicenseClient
+=============
+One HTTP client for every call to the license server (company and dealer
+registration, authentication polling, license lookups).
+
+  register(payload)                 → registration response JSON
+  authenticate(customer_id)         → authentication response JSON
+  authenticate(customer_id, cached=True)
+
+Connections
+  A process-wide requests.Session with a pooled adapter
+  (LICENSE_HTTP_POOL_SIZE connections per host), so repeated calls — a
+  validation poll, the nightly TID sync across companies — reuse keep-alive
+  connections instead of paying a TCP + TLS handshake each time.
+
+Timeouts
+  (connect, read) per endpoint: LICENSE_CONNECT_TIMEOUT for both,
+  LICENSE_REGISTER_TIMEOUT / LICENSE_AUTH_TIMEOUT for the read. A dead host
+  fails on the connect timeout instead of holding a worker for 30s.
+
+Circuit breaker
+  Consecutive failures (connection error, timeout, 5xx) are counted in the
+  cache, shared by all workers. After LICENSE_BREAKER_THRESHOLD of them the
+  breaker opens for LICENSE_BREAKER_COOLDOWN seconds and calls raise
+  LicenseServerUnavailable at once. The first call after the cooldown goes
+  through; a success closes the breaker, a failure opens it again.
+  LicenseServerUnavailable is a requests ConnectionError, so callers' existing
+  "Cannot connect to license server" handling covers it.
+
+Response cache
+  cached=True serves an authentication lookup from pqr:license:auth:<id> for
+  LICENSE_AUTH_CACHE_TTL seconds (previews, sync diffs, the TID sync).
+  Every uncached call refreshes that entry, so a confirm step that fetches
+  fresh also updates what the next preview sees. Polling never uses it.
+
+Errors are raised (requests exceptions, including HTTPError for non-2xx);
+mapping them to user-facing messages stays with the callers.
+"""
+
+import logging
+import threading
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_FAILURES_KEY = 'pqr:license:failures'
+_OPEN_KEY = 'pqr:license:open'
+_AUTH_CACHE_PREFIX = 'pqr:license:auth:'
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class LicenseServerUnavailable(requests.exceptions.ConnectionError):
+    """Raised without a request while the circuit breaker is open."""
+
+
+def get_breaker_threshold() -> int:
+    return int(getattr(settings, 'LICENSE_BREAKER_THRESHOLD', 5))
+
+
+def get_breaker_cooldown() -> int:
+    return int(getattr(settings, 'LICENSE_BREAKER_COOLDOWN', 30))
+
+
+def get_auth_cache_ttl() -> int:
+    return int(getattr(settings, 'LICENSE_AUTH_CACHE_TTL', 60))
+
+
+def _timeout(read_setting, read_default) -> tuple:
+    connect = float(getattr(settings, 'LICENSE_CONNECT_TIMEOUT', 3.05))
+    return (connect, float(getattr(settings, read_setting, read_default)))
+
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = int(getattr(settings, 'LICENSE_HTTP_POOL_SIZE', 10))
+                session = requests.Session()
+                # No automatic retries: registration is not idempotent, and
+                # the breaker handles a server that keeps failing.
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+# ── Circuit breaker ───────────────────────────────────────────────────────────
+
+def breaker_open() -> bool:
+    return cache.get(_OPEN_KEY) is not None
+
+
+def _record_failure() -> None:
+    try:
+        failures = cache.incr(_FAILURES_KEY)
+    except ValueError:
+        cache.add(_FAILURES_KEY, 0, timeout=None)
+        failures = cache.incr(_FAILURES_KEY)
+    if failures >= get_breaker_threshold():
+        cache.set(_OPEN_KEY, 1, timeout=get_breaker_cooldown())
+        logger.error(f"License server circuit open for {get_breaker_cooldown()}s after {failures} consecutive failures")
+
+
+def _record_success() -> None:
+    cache.delete_many([_FAILURES_KEY, _OPEN_KEY])
+
+
+def reset_breaker() -> None:
+    _record_success()
+
+
+def _post(url, payload, timeout) -> dict:
+    if breaker_open():
+        raise LicenseServerUnavailable('License server circuit is open')
+    try:
+        response = _get_session().post(url, json=payload, timeout=timeout)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+        _record_failure()
+        raise
+    if response.status_code >= 500:
+        _record_failure()
+    else:
+        _record_success()
+    logger.debug(f"License server {url} [{response.status_code}]: {response.text}")
+    response.raise_for_status()
+    return response.json()
+
+
+# ── Public ────────────────────────────────────────────────────────────────────
+
+def register(payload: dict) -> dict:
+    """POST the registration payload; returns the response JSON."""
+    return _post(
+        settings.PRODUCT_REGISTRATION_URL, payload,
+        _timeout('LICENSE_REGISTER_TIMEOUT', 30),
+    )
+
+
+def authenticate(customer_id, cached: bool = False) -> dict:
+    """Authentication status and license details for a customer id."""
+    key = f'{_AUTH_CACHE_PREFIX}{customer_id}'
+    if cached:
+        data = cache.get(key)
+        if data is not None:
+            return data
+    data = _post(
+        settings.PRODUCT_AUTH_URL, {"CustomerId": customer_id},
+        _timeout('LICENSE_AUTH_TIMEOUT', 10),
+    )
+    cache.set(key, data, timeout=get_auth_cache_ttl())
+    return data
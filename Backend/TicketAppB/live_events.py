@@ -0,0 +1,169 @@
+"""
+LiveEvents
+==========
+Per-company push channel for the web report pages (tickets, trips,
+schedules), replacing the per-tab `since=` polling.
+
+Publish side (Celery workers, sync)
+  The ingest tasks call publish_row(kind, instance) inside their
+  transaction. After commit the row is serialized once with the same
+  serializer the report endpoint uses. It is then published to Redis
+  pub/sub on:
+      pqr:live:<company_pk>
+  Message: {"kind": "ticket"|"trip"|"schedule", "date": "YYYY-MM-DD", "row": {...}}
+  Publishing is best-effort: a Redis hiccup is logged and never fails the
+  ingest. The pages fall back to a single since= poll on reconnect.
+
+Subscribe side (ASGI process, async)
+  One LiveHub per process holds a single PSUBSCRIBE on pqr:live:*. It fans
+  messages out to per-connection asyncio queues, so 200 open tabs cost one
+  Redis connection, not 200. A listener whose queue is full (stalled tab)
+  gets a 'resync' marker instead of unbounded buffering.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.utils.encoders import JSONEncoder
+
+logger = logging.getLogger(__name__)
+
+_CHANNEL_PREFIX = 'pqr:live:'
+
+RESYNC = {'kind': 'resync'}
+
+# kind → (model field holding the report date, serializer, select_related)
+_KINDS = {
+    'ticket':   ('ticket_date', 'TicketDataSerializer',
+                 ('route_id', 'from_stage_id__stage', 'to_stage_id__stage',
+                  'trip_id', 'schedule_id', 'depot_id', 'company_code')),
+    'trip':     ('start_date', 'TripDataSerializer', ('route_id', 'company_code')),
+    'schedule': ('start_date', 'ScheduleDataSerializer', ('route_id', 'company_code')),
+}
+
+
+def _channel(company_id) -> str:
+    return f'{_CHANNEL_PREFIX}{company_id}'
+
+
+# ── Publish ───────────────────────────────────────────────────────────────────
+
+def _serialize(kind: str, pk: int):
+    from .models import TransactionData, TripData, ScheduleData
+    from .serializers import transactions as serializers
+
+    model = {'ticket': TransactionData, 'trip': TripData, 'schedule': ScheduleData}[kind]
+    date_field, serializer_name, related = _KINDS[kind]
+    obj = (
+        model.objects.select_related(*related)
+        .prefetch_related('route_id__route_depots__depot')
+        .filter(pk=pk).first()
+    )
+    if obj is None:
+        return None, None
+    row = getattr(serializers, serializer_name)(obj).data
+    return obj.company_code_id, {'kind': kind, 'date': str(getattr(obj, date_field)), 'row': row}
+
+
+def _publish(kind: str, pk: int) -> None:
+    try:
+        company_id, message = _serialize(kind, pk)
+        if message is None or not company_id:
+            return
+        from django_redis import get_redis_connection
+        get_redis_connection('default').publish(
+            _channel(company_id), json.dumps(message, cls=JSONEncoder),
+        )
+    except Exception as e:
+        logger.warning(f"Live event publish failed kind={kind} pk={pk}: {e}")
+
+
+def publish_row(kind: str, instance) -> None:
+    """
+    Push a new/updated ticket, trip or schedule row to connected report pages.
+    Deferred to on_commit so subscribers never see uncommitted rows.
+    """
+    if instance is None or instance.pk is None:
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: _publish(kind, pk))
+
+
+# ── Subscribe ─────────────────────────────────────────────────────────────────
+
+class LiveHub:
+    """Single pub/sub connection per process, fanned out to asyncio queues."""
+
+    QUEUE_SIZE = 500
+
+    def __init__(self):
+        self._listeners = defaultdict(set)
+        self._task = None
+
+    def subscribe(self, company_id) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self._listeners[str(company_id)].add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, company_id, queue) -> None:
+        listeners = self._listeners.get(str(company_id))
+        if listeners is None:
+            return
+        listeners.discard(queue)
+        if not listeners:
+            del self._listeners[str(company_id)]
+
+    def _dispatch(self, company_id: str, message: dict) -> None:
+        for queue in list(self._listeners.get(company_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Stalled consumer — drop its backlog and tell it to resync.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    async def _run(self) -> None:
+        import redis.asyncio as aioredis
+
+        while self._listeners:
+            client = aioredis.from_url(settings.CACHES['default']['LOCATION'])
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f'{_CHANNEL_PREFIX}*')
+                async for msg in pubsub.listen():
+                    if msg.get('type') != 'pmessage':
+                        continue
+                    channel = msg['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    try:
+                        message = json.loads(msg['data'])
+                    except (TypeError, ValueError):
+                        continue
+                    self._dispatch(channel[len(_CHANNEL_PREFIX):], message)
+                    if not self._listeners:
+                        break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Live event subscriber dropped, reconnecting: {e}")
+                # Anything published while we were down is lost — resync everyone.
+                for company_id in list(self._listeners):
+                    self._dispatch(company_id, RESYNC)
+                await asyncio.sleep(2)
+            finally:
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+
+
+hub = LiveHub()
@@ -0,0 +1,135 @@
+"""
+MailQueue
+=========
+Outbound mail without blocking the request on SMTP.
+
+  enqueue(subject, body, [to], purpose='password_reset')
+
+writes an OutboundEmail row and, after commit, triggers
+tasks.deliver_outbound_mail. The task claims up to MAIL_QUEUE_BATCH_SIZE due
+rows, opens one connection to the mail backend (EMAIL_BACKEND — SMTP in
+production, locmem in tests) and sends them all over it, so a batch pays for
+one handshake and TLS negotiation.
+
+Failures
+  A message that fails goes back to queued with exponential backoff
+  (1, 2, 4, 8 … minutes, capped at an hour) and is marked failed after
+  MAIL_QUEUE_MAX_ATTEMPTS. If the connection itself can't be opened the
+  whole batch is retried that way. Rows left in 'sending' by a worker that
+  died are re-queued after 10 minutes.
+
+  The same task runs from beat every minute, picking up retries and any
+  message whose on-commit trigger was lost.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+_STUCK_AFTER = timedelta(minutes=10)
+_MAX_BACKOFF_SECONDS = 3600
+
+
+def get_mail_batch_size() -> int:
+    return int(getattr(settings, 'MAIL_QUEUE_BATCH_SIZE', 50))
+
+
+def get_mail_max_attempts() -> int:
+    return int(getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', 5))
+
+
+def enqueue(subject: str, body: str, to, from_email: str = None, purpose: str = '') -> OutboundEmail:
+    """Queue a plain-text message; delivery starts once the transaction commits."""
+    from .tasks import deliver_outbound_mail
+
+    message = OutboundEmail.objects.create(
+        purpose=purpose,
+        from_email=from_email or getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@busmanagement.app'),
+        to=list(to),
+        subject=subject,
+        body=body,
+        next_attempt_at=timezone.now(),
+    )
+    transaction.on_commit(lambda: deliver_outbound_mail.delay())
+    return message
+
+
+def _claim(now) -> list:
+    """Move up to one batch of due messages to 'sending' and return them."""
+    OutboundEmail.objects.filter(
+        status=OutboundEmail.Status.SENDING, updated_at__lt=now - _STUCK_AFTER,
+    ).update(status=OutboundEmail.Status.QUEUED, updated_at=now)
+
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True).filter(
+                status=OutboundEmail.Status.QUEUED, next_attempt_at__lte=now,
+            ).order_by('next_attempt_at', 'id')[:get_mail_batch_size()]
+        )
+        OutboundEmail.objects.filter(id__in=[m.id for m in batch]).update(
+            status=OutboundEmail.Status.SENDING, updated_at=now,
+        )
+    return batch
+
+
+def _failed(message, error, now) -> None:
+    message.attempts += 1
+    message.last_error = str(error)[:2000]
+    if message.attempts >= get_mail_max_attempts():
+        message.status = OutboundEmail.Status.FAILED
+        logger.error(f"Mail {message.id} ({message.purpose}) to {message.to} failed for good: {error}")
+    else:
+        message.status = OutboundEmail.Status.QUEUED
+        backoff = min(60 * 2 ** (message.attempts - 1), _MAX_BACKOFF_SECONDS)
+        message.next_attempt_at = now + timedelta(seconds=backoff)
+        logger.warning(f"Mail {message.id} ({message.purpose}) attempt {message.attempts} failed: {error}")
+    message.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at', 'updated_at'])
+
+
+def deliver_batch() -> dict:
+    """Send one batch over a single connection. Returns {'sent': n, 'failed': n}."""
+    now = timezone.now()
+    batch = _claim(now)
+    result = {'sent': 0, 'failed': 0}
+    if not batch:
+        return result
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        for message in batch:
+            _failed(message, e, now)
+        result['failed'] = len(batch)
+        return result
+
+    try:
+        for message in batch:
+            email = EmailMessage(
+                message.subject, message.body, message.from_email, message.to,
+                connection=connection,
+            )
+            try:
+                email.send(fail_silently=False)
+            except Exception as e:
+                _failed(message, e, now)
+                result['failed'] += 1
+                continue
+            message.status = OutboundEmail.Status.SENT
+            message.attempts += 1
+            message.sent_at = timezone.now()
+            message.body = ''
+            message.last_error = ''
+            message.save(update_fields=['status', 'attempts', 'sent_at', 'body', 'last_error', 'updated_at'])
+            result['sent'] += 1
+    finally:
+        connection.close()
+    return result
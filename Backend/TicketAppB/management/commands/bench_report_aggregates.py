@@ -0,0 +1,97 @@
+"""
+Time the ORM aggregates the ticket reports used to issue against the
+TicketFrame path that replaced them (ticket_agg), on the same data, and
+check both give the same numbers.
+
+  python manage.py bench_report_aggregates --company 3 --bus KL07AB1234 \
+      --from 2026-09-01 --to 2026-09-30 --repeat 5
+"""
+
+import datetime
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
+
+from TicketAppB import od_matrix
+from TicketAppB.models import Company, TransactionData
+from TicketAppB.ticket_agg import TicketFrame
+
+_ORM_SUMS = {name: Sum(field) for name, field in zip(od_matrix.CATEGORIES, od_matrix.TICKET_FIELDS)}
+
+
+def _orm(qs):
+    fares = [
+        (r['ticket_amount'], r['ticket_count'], r['revenue'])
+        for r in qs.values('ticket_amount').annotate(
+            ticket_count=Count('id'), revenue=Sum('ticket_amount'),
+        ).order_by('ticket_amount')
+    ]
+    totals = {k: v or 0 for k, v in qs.aggregate(**_ORM_SUMS).items()}
+    per_trip = {
+        r['trip_id']: {name: r[name] or 0 for name in od_matrix.CATEGORIES}
+        for r in qs.values('trip_id').annotate(**_ORM_SUMS)
+        if r['trip_id'] is not None
+    }
+    stages = {
+        field: {
+            r[field]: {name: r[name] or 0 for name in od_matrix.CATEGORIES}
+            for r in qs.values(field).annotate(**_ORM_SUMS)
+            if r[field] is not None
+        }
+        for field in ('from_stage_id', 'to_stage_id')
+    }
+    return fares, totals, per_trip, stages
+
+
+def _frame(qs):
+    frame = TicketFrame.load(
+        qs, 'ticket_amount', 'trip_id', 'from_stage_id', 'to_stage_id', *od_matrix.TICKET_FIELDS,
+    )
+    return (
+        frame.fare_histogram(),
+        frame.category_totals(),
+        frame.category_totals_by('trip_id'),
+        {field: frame.category_totals_by(field) for field in ('from_stage_id', 'to_stage_id')},
+    )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark ORM GROUP BY aggregates against the NumPy ticket aggregation engine.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', required=True, help='Company primary key')
+        parser.add_argument('--bus', help='Restrict to one bus_no')
+        parser.add_argument('--from', dest='from_date', required=True, help='YYYY-MM-DD')
+        parser.add_argument('--to', dest='to_date', required=True, help='YYYY-MM-DD')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company'])
+            from_date = datetime.date.fromisoformat(options['from_date'])
+            to_date = datetime.date.fromisoformat(options['to_date'])
+        except (Company.DoesNotExist, ValueError) as e:
+            raise CommandError(str(e))
+
+        qs = TransactionData.objects.filter(company_code=company, ticket_date__range=[from_date, to_date])
+        if options['bus']:
+            qs = qs.filter(bus_no=options['bus'])
+        self.stdout.write(f'{qs.count()} tickets')
+
+        results = {}
+        for label, fn in (('orm', _orm), ('numpy', _frame)):
+            timings = []
+            for _ in range(max(1, options['repeat'])):
+                started = time.perf_counter()
+                results[label] = fn(qs)
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(
+                f'{label:>6}: best {min(timings) * 1000:.1f} ms, '
+                f'median {float(np.median(timings)) * 1000:.1f} ms over {len(timings)} runs'
+            )
+
+        if results['orm'] != results['numpy']:
+            raise CommandError('ORM and NumPy aggregates disagree')
+        self.stdout.write(self.style.SUCCESS('Results match'))
@@ -0,0 +1,57 @@
+"""
+Time SessionAuthentication on a cache hit with the single-script Redis path
+(authentication.touch_session) against the separate GET/SET calls it
+replaced, for one live session.
+
+  python manage.py bench_session_auth --session <session_uid> --repeat 2000
+
+Without --session the most recently active session is used. Run it against
+the real Redis — on LocMemCache both paths take the fallback.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+
+from TicketAppB.authentication import COOKIE_NAME, SessionAuthentication, session_key_exists
+from TicketAppB.models import UserSession
+
+
+class Command(BaseCommand):
+    help = 'Per-request auth overhead: Redis script vs separate calls.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session', help='session_uid (default: latest active session)')
+        parser.add_argument('--repeat', type=int, default=1000)
+
+    def _run(self, request, repeat):
+        auth = SessionAuthentication()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            if auth.authenticate(request) is None:
+                raise CommandError('Session did not authenticate (expired or revoked?)')
+        return (time.perf_counter() - start) / repeat * 1000
+
+    def handle(self, *args, **options):
+        session_uid = options['session']
+        if not session_uid:
+            session = UserSession.objects.filter(is_active=True).order_by('-last_seen_at').first()
+            if session is None:
+                raise CommandError('No active session — pass --session')
+            session_uid = str(session.session_uid)
+        if not session_key_exists(session_uid):
+            raise CommandError('Session has no Redis entry — log in again or pass another --session')
+
+        request = RequestFactory().get('/')
+        request.COOKIES[COOKIE_NAME] = session_uid
+        repeat = options['repeat']
+
+        self._run(request, min(repeat, 50))  # warm the principal snapshot
+        with override_settings(SESSION_AUTH_USE_SCRIPT=False):
+            sequential = self._run(request, repeat)
+        scripted = self._run(request, repeat)
+
+        self.stdout.write(f'separate calls  {sequential:.3f} ms/request')
+        self.stdout.write(f'one script      {scripted:.3f} ms/request')
+        self.stdout.write(self.style.SUCCESS(f'{sequential / scripted:.2f}x'))
@@ -0,0 +1,76 @@
+"""
+Deactivate UserSession rows as soon as their Redis key expires, instead of
+waiting for the next sweep_stale_sessions run.
+
+Subscribes to Redis key-space "expired" events for the cache DB and
+deactivates the matching sessions in batches. Redis only publishes these
+with notify-keyspace-events containing E and x; --configure adds them
+(needs CONFIG permission — otherwise set it in redis.conf).
+
+  python manage.py listen_session_expiry [--configure]
+
+Run it as a long-lived process next to the Celery workers. Events are
+fire-and-forget (nothing is replayed after a disconnect), so the sweep beat
+task stays on as the safety net.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from TicketAppB.authentication import live_session_uids, session_key_prefix
+from TicketAppB.tasks import deactivate_sessions
+
+_BATCH = 200
+_BATCH_SECONDS = 1.0
+
+
+class Command(BaseCommand):
+    help = 'Deactivate sessions when their Redis key expires (key-space notifications).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--configure', action='store_true',
+            help="Enable 'Ex' in notify-keyspace-events before subscribing",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from django_redis import get_redis_connection
+            client = get_redis_connection('default')
+        except (ImportError, NotImplementedError):
+            raise CommandError('The default cache is not django-redis')
+
+        if options['configure']:
+            flags = client.config_get('notify-keyspace-events').get('notify-keyspace-events', '')
+            missing = ''.join(f for f in 'Ex' if f not in flags and not (f == 'x' and 'A' in flags))
+            if missing:
+                client.config_set('notify-keyspace-events', flags + missing)
+
+        db = client.connection_pool.connection_kwargs.get('db', 0)
+        channel = f'__keyevent@{db}__:expired'
+        prefix = session_key_prefix()
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        self.stdout.write(f'Listening on {channel} for {prefix}*')
+
+        pending = []
+        flushed_at = time.monotonic()
+        while True:
+            message = pubsub.get_message(timeout=_BATCH_SECONDS)
+            if message is not None:
+                key = message['data']
+                key = key.decode() if isinstance(key, bytes) else str(key)
+                if key.startswith(prefix):
+                    pending.append(key[len(prefix):])
+
+            if pending and (len(pending) >= _BATCH or time.monotonic() - flushed_at >= _BATCH_SECONDS):
+                close_old_connections()
+                # A session re-cached since (login ghost recovery) keeps running.
+                live = live_session_uids(pending)
+                updated = deactivate_sessions([uid for uid in pending if uid not in live])
+                if updated:
+                    self.stdout.write(f'Deactivated {updated} expired sessions')
+                pending = []
+                flushed_at = time.monotonic()
@@ -0,0 +1,41 @@
+"""
+Show how many report requests were throttled (rate_limit) on a date, per
+company, endpoint and reason. Counters are kept for about a week.
+
+  python manage.py report_throttle_stats --date 2026-10-19
+"""
+
+import datetime
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from TicketAppB.rate_limit import throttle_stats
+
+
+class Command(BaseCommand):
+    help = 'Throttled report requests per company / endpoint / reason for one date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='YYYY-MM-DD (default today)')
+
+    def handle(self, *args, **options):
+        try:
+            day = datetime.date.fromisoformat(options['date']) if options['date'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('--date must be YYYY-MM-DD')
+
+        counts = throttle_stats(day)
+        if not counts:
+            self.stdout.write(f'No throttled requests on {day}')
+            return
+
+        per_company = defaultdict(int)
+        for field, n in sorted(counts.items()):
+            company_id, endpoint, reason = field.split(':', 2)
+            per_company[company_id] += n
+            self.stdout.write(f'company={company_id:<6} {endpoint:<24} {reason:<20} {n}')
+        self.stdout.write('')
+        for company_id, n in sorted(per_company.items(), key=lambda kv: -kv[1]):
+            self.stdout.write(f'company={company_id:<6} total={n}')
@@ -9,11 +9,63 @@ TicketAppB.permissions.LicensePermission (a DRF permission class) which runs
 after authentication resolves request.user, eliminating the redundant token
 decode and DB read that the old middleware performed.
 
-This file is kept to avoid import errors from any existing references but
-contains no active middleware classes. Remove any MIDDLEWARE entries in
-settings.py that reference TicketAppB.middleware.UserOnlineMiddleware or
+Remove any MIDDLEWARE entries in settings.py that reference
+TicketAppB.middleware.UserOnlineMiddleware or
 TicketAppB.middleware.LicenseExpiryMiddleware.
+
+CompressionMiddleware
+  Compresses large responses (report/dashboard JSON) negotiated via
+  Accept-Encoding: brotli when the client accepts it and the `brotli` package
+  is installed, gzip otherwise (Django's GZipMiddleware). Bodies smaller than
+  RESPONSE_COMPRESSION_MIN_BYTES are sent as-is — not worth the CPU.
 """
 
-# Both middleware classes have been removed. See TicketAppB/permissions.py for
-# the license check, and TicketAppB/authentication.py for per-request auth.
\ No newline at end of file
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional — gzip only
+    brotli = None
+
+_accepts_br = re.compile(r'\bbr\b').search
+
+
+class CompressionMiddleware(GZipMiddleware):
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_length = int(getattr(settings, 'RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+        self.brotli_quality = int(getattr(settings, 'RESPONSE_COMPRESSION_BROTLI_QUALITY', 5))
+
+    def process_response(self, request, response):
+        # SSE must reach the browser event by event — never buffer it in a compressor.
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        if not response.streaming and len(response.content) < self.min_length:
+            return response
+        if (
+            brotli is None
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or not _accepts_br(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=self.brotli_quality)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        # Same as gzip: the encoded body is no longer byte-identical, so weaken
+        # the ETag. report_cache compares If-None-Match with the W/ stripped.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
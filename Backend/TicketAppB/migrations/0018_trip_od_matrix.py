@@ -0,0 +1,32 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TicketAppB', '0017_remove_etmdevice_nfi_remove_etmdevice_upi'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripODMatrix',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField(blank=True, null=True)),
+                ('stage_count', models.PositiveSmallIntegerField(default=0)),
+                ('data', models.BinaryField(default=bytes)),
+                ('is_frozen', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('company_code', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='od_matrices', to='TicketAppB.company')),
+                ('route', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='od_matrices', to='TicketAppB.route')),
+                ('trip', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='od_matrix', to='TicketAppB.tripdata')),
+            ],
+            options={
+                'db_table': 'trip_od_matrix',
+                'indexes': [models.Index(fields=['company_code', 'route', 'start_date'], name='trip_od_mat_company_38ca0b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TicketAppB', '0018_trip_od_matrix'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactiondata',
+            index=models.Index(fields=['company_code', 'ticket_date'], name='transaction_company_f57e8e_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TicketAppB', '0019_transactiondata_company_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('global', 'Global'), ('company', 'Company')], max_length=10)),
+                ('scope_id', models.PositiveIntegerField(default=0)),
+                ('metric', models.CharField(max_length=50)),
+                ('value', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'dashboard_counter',
+                'constraints': [models.UniqueConstraint(fields=('scope', 'scope_id', 'metric'), name='uniq_dashboard_counter')],
+            },
+        ),
+    ]
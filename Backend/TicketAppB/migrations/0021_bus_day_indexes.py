@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TicketAppB', '0020_dashboard_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scheduledata',
+            index=models.Index(fields=['company_code', 'bus_no', 'start_date'], name='schedule_da_company_cda70f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactiondata',
+            index=models.Index(fields=['company_code', 'bus_no', 'ticket_date'], name='transaction_company_4d58e9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripdata',
+            index=models.Index(fields=['company_code', 'bus_no', 'start_date', 'schedule_no'], name='trip_data_company_bdcb7e_idx'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:32
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+
+BACKFILL_BATCH = 20000
+
+
+def backfill_report_dimensions(apps, schema_editor):
+    """
+    Stamp the new dimension columns on existing tickets from their FKs, one
+    pk range per transaction so a large transaction_data is never locked or
+    rewritten in one statement. The columns stay nullable; tickets ingested
+    while this runs are stamped by the ingest task, and a rerun only
+    repeats the same values.
+    """
+    TransactionData = apps.get_model('TicketAppB', 'TransactionData')
+    ScheduleData = apps.get_model('TicketAppB', 'ScheduleData')
+    TripData = apps.get_model('TicketAppB', 'TripData')
+    Route = apps.get_model('TicketAppB', 'Route')
+    RouteDepot = apps.get_model('TicketAppB', 'RouteDepot')
+
+    db = schema_editor.connection.alias
+    tickets = TransactionData.objects.using(db)
+    bounds = tickets.aggregate(lo=Min('pk'), hi=Max('pk'))
+    if bounds['lo'] is None:
+        return
+
+    schedule = ScheduleData.objects.using(db).filter(pk=OuterRef('schedule_id'))
+    trip_no = TripData.objects.using(db).filter(pk=OuterRef('trip_id')).values('trip_no')[:1]
+    route_code = Route.objects.using(db).filter(pk=OuterRef('route_id')).values('route_code')[:1]
+    depot = RouteDepot.objects.using(db).filter(route_id=OuterRef('route_id')).order_by('pk').values('depot_id')[:1]
+
+    for start in range(bounds['lo'], bounds['hi'] + 1, BACKFILL_BATCH):
+        batch = tickets.filter(pk__gte=start, pk__lt=start + BACKFILL_BATCH)
+        with transaction.atomic(using=db):
+            batch.filter(schedule_id__isnull=False).update(
+                schedule_start_date=Subquery(schedule.values('start_date')[:1]),
+                schedule_no=Subquery(schedule.values('schedule_no')[:1]),
+            )
+            batch.filter(trip_id__isnull=False).update(trip_no=Subquery(trip_no))
+            batch.filter(route_id__isnull=False).update(
+                route_code=Subquery(route_code), depot_id=Subquery(depot),
+            )
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    # The backfill commits batch by batch (see backfill_report_dimensions).
+    atomic = False
+
+    dependencies = [
+        ('TicketAppB', '0021_bus_day_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactiondata',
+            name='depot_id',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='TicketAppB.depot'),
+        ),
+        migrations.AddField(
+            model_name='transactiondata',
+            name='route_code',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='transactiondata',
+            name='schedule_no',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transactiondata',
+            name='schedule_start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transactiondata',
+            name='trip_no',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_report_dimensions, noop_reverse),
+        migrations.AddIndex(
+            model_name='transactiondata',
+            index=models.Index(fields=['company_code', 'schedule_start_date', 'bus_no'], name='transaction_company_407588_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactiondata',
+            index=models.Index(fields=['company_code', 'schedule_start_date', 'schedule_no', 'trip_no'], name='transaction_company_8da47c_idx'),
+        ),
+    ]
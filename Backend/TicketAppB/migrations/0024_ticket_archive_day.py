@@ -0,0 +1,30 @@
+# Generated by Django 5.2.9 on 2026-10-19 05:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TicketAppB', '0023_replication_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketArchiveDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('ticket_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('path', models.CharField(max_length=255)),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+                ('company_code', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ticket_archive_days', to='TicketAppB.company')),
+            ],
+            options={
+                'db_table': 'ticket_archive_day',
+                'constraints': [models.UniqueConstraint(fields=('company_code', 'day'), name='uniq_ticket_archive_company_day')],
+            },
+        ),
+    ]
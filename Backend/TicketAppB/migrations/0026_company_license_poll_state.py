@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-19 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TicketAppB', '0025_outbound_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='license_poll_attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='license_poll_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -11,9 +11,9 @@ COMPANY_MODELS = ['Company', 'Depot', 'Dealer', 'ETMDevice']
 
 
 # Audit / System models
-from .audit import GlobalSettings, AuditLog, DeviceRejectionLog
+from .audit import GlobalSettings, AuditLog, DeviceRejectionLog, DashboardCounter, ReplicationHeartbeat, OutboundEmail
 
-AUDIT_MODELS = ['GlobalSettings', 'AuditLog', 'DeviceRejectionLog']
+AUDIT_MODELS = ['GlobalSettings', 'AuditLog', 'DeviceRejectionLog', 'DashboardCounter', 'ReplicationHeartbeat', 'OutboundEmail']
 
 
 # Master data models
@@ -66,6 +66,8 @@ from .transactions import (
     TransactionData,
     ScheduleData,
     TripData,
+    TripODMatrix,
+    TicketArchiveDay,
     OdometerData,
     ExpenseData,
     RawDataLog,
@@ -73,7 +75,7 @@ from .transactions import (
 )
 
 TRANSACTION_MODELS = [
-    'TransactionData', 'ScheduleData', 'TripData',
+    'TransactionData', 'ScheduleData', 'TripData', 'TripODMatrix', 'TicketArchiveDay',
     'OdometerData', 'ExpenseData', 'RawDataLog', 'Direction',
 ]
 
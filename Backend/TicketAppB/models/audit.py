@@ -175,3 +175,95 @@ class DeviceRejectionLog(models.Model):
 
     def __str__(self):
         return f'Rejected palmtec={self.palmtec_id_claimed} reason={self.rejection_reason} @ {self.created_at}'
+
+
+# ── DashboardCounter ──────────────────────────────────────────────────────────
+
+class DashboardCounter(models.Model):
+    """
+    Maintained registry counts behind the superadmin, dealer and executive
+    dashboards — one row per (scope, scope_id, metric), e.g.
+    ('global', 0, 'company:Approve') or ('company', 12, 'device:active').
+    Kept current by TicketAppB/dashboard_counters.py; a beat task
+    reconciles it against the source tables.
+    """
+
+    class Scope(models.TextChoices):
+        GLOBAL  = 'global',  'Global'
+        COMPANY = 'company', 'Company'
+
+    scope      = models.CharField(max_length=10, choices=Scope.choices)
+    scope_id   = models.PositiveIntegerField(default=0)  # Company pk; 0 for global
+    metric     = models.CharField(max_length=50)
+    value      = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'dashboard_counter'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'scope_id', 'metric'], name='uniq_dashboard_counter'),
+        ]
+
+    def __str__(self):
+        return f'{self.scope}:{self.scope_id} {self.metric}={self.value}'
+
+
+# ── ReplicationHeartbeat ──────────────────────────────────────────────────────
+
+class ReplicationHeartbeat(models.Model):
+    """
+    Single row rewritten on the primary every few seconds by a beat task.
+    Reading it back from the reporting replica gives the replication lag
+    (see TicketAppB/db_router.py).
+    """
+
+    beat_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'replication_heartbeat'
+
+    def __str__(self):
+        return f'heartbeat {self.beat_at:%Y-%m-%d %H:%M:%S}'
+
+
+# ── OutboundEmail ─────────────────────────────────────────────────────────────
+
+class OutboundEmail(models.Model):
+    """
+    Queued outbound mail (see TicketAppB/mail_queue.py). Requests enqueue a
+    row; the deliver_outbound_mail task sends queued rows in batches over one
+    SMTP connection and records the outcome here.
+
+    body is blanked once the message is sent — it can carry a password reset
+    link, which should not outlive delivery in the DB.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED  = 'queued',  'Queued'
+        SENDING = 'sending', 'Sending'
+        SENT    = 'sent',    'Sent'
+        FAILED  = 'failed',  'Failed'
+
+    purpose    = models.CharField(max_length=50, blank=True, default='')
+    from_email = models.CharField(max_length=254)
+    to         = models.JSONField(default=list)
+    subject    = models.CharField(max_length=255)
+    body       = models.TextField(blank=True, default='')
+
+    status          = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts        = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField()
+    last_error      = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at    = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'outbound_email'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.purpose or "mail"} → {", ".join(self.to)} ({self.status})'
@@ -229,7 +229,8 @@ class UserSession(models.Model):
     # Middleware rejects requests where is_active=False (session was killed).
     is_active = models.BooleanField(default=True, db_index=True)
 
-    # Updated on every authenticated request (debounced — at most once per 5 min).
+    # Stamped in Redis on every authenticated request and written here in bulk
+    # every minute (authentication.flush_last_seen).
     last_seen_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     # MAC address / hardware UUID from APK login payload. Stored for future FCM use.
@@ -102,6 +102,10 @@ class Company(models.Model):
     # error_message: set when license validation hard-blocks (e.g. count inconsistency).
     # Cleared on successful authentication or sync.
     error_message           = models.CharField(max_length=500, null=True, blank=True)
+    # license_poll_*: state of the running validation (tasks.poll_company_license).
+    # started_at bounds the poll; attempts is the step the live task chain owns.
+    license_poll_started_at = models.DateTimeField(null=True, blank=True)
+    license_poll_attempts   = models.IntegerField(default=0)
 
     # ── Status ────────────────────────────────────────────────────────────────
     is_active = models.BooleanField(default=True, db_index=True)
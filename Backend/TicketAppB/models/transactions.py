@@ -57,11 +57,20 @@ class TransactionData(models.Model):
     palmtec_id  = models.CharField(max_length=20)
 
     # ── Route / Trip ─────────────────────────────────────────────────────────
-    # route_code = models.CharField(max_length=50, null=True, blank=True)
     route_id = models.ForeignKey('Route', on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
 
     trip_id       = models.ForeignKey('TripData',     on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
     schedule_id   = models.ForeignKey('ScheduleData', on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
+
+    # ── Report dimensions (stamped at ingest, never change afterwards) ───────
+    # Copies of the schedule / trip / route / depot values the reports filter
+    # and group on, so they don't join back to ScheduleData or RouteDepot.
+    schedule_start_date = models.DateField(null=True, blank=True)
+    schedule_no = models.IntegerField(null=True, blank=True)
+    trip_no     = models.IntegerField(null=True, blank=True)
+    route_code  = models.CharField(max_length=50, null=True, blank=True)
+    depot_id    = models.ForeignKey('Depot', on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions')
+
     ticket_number = models.CharField(max_length=20)
     ticket_date   = models.DateField()
     ticket_time   = models.TimeField()
@@ -161,6 +170,10 @@ class TransactionData(models.Model):
         indexes  = [
             models.Index(fields=['palmtec_id', 'ticket_date']),
             models.Index(fields=['company_code']),
+            models.Index(fields=['company_code', 'ticket_date']),
+            models.Index(fields=['company_code', 'bus_no', 'ticket_date']),
+            models.Index(fields=['company_code', 'schedule_start_date', 'bus_no']),
+            models.Index(fields=['company_code', 'schedule_start_date', 'schedule_no', 'trip_no']),
             models.Index(fields=['unique_code']),
             models.Index(fields=['ticket_date']),
         ]
@@ -280,6 +293,7 @@ class ScheduleData(models.Model):
             models.Index(fields=['palmtec_id', 'schedule_no']),
             models.Index(fields=['palmtec_id', 'start_date']),
             models.Index(fields=['company_code', 'start_date']),
+            models.Index(fields=['company_code', 'bus_no', 'start_date']),
             models.Index(fields=['company_code']),
             models.Index(fields=['start_date']),
             models.Index(fields=['is_closed']),
@@ -394,6 +408,8 @@ class TripData(models.Model):
             models.Index(fields=['palmtec_id', 'trip_no']),
             models.Index(fields=['palmtec_id', 'start_date']),
             models.Index(fields=['company_code', 'start_date']),
+            # bus-day drill-down: apk_trips (+ schedule_no) and apk_bus_timeline
+            models.Index(fields=['company_code', 'bus_no', 'start_date', 'schedule_no']),
             models.Index(fields=['company_code']),
             models.Index(fields=['start_date']),
             models.Index(fields=['schedule_id']),
@@ -411,6 +427,59 @@ class TripData(models.Model):
         return f"Trip {self.trip_no} - {self.palmtec_id} ({self.start_date})"
 
 
+class TripODMatrix(models.Model):
+    """
+    Origin–destination passenger counts for one trip, kept as a packed int32
+    array of shape (categories, stages, stages) — see TicketAppB/od_matrix.py.
+    Axis 1 is the boarding stage ordinal, axis 2 the alighting ordinal, both
+    0-based positions in the route's sequence_no order (device stage - 1).
+    Ticket counts are buffered and folded in every minute while the trip is
+    open; rebuilt from tickets and frozen on trip close.
+    """
+
+    trip         = models.OneToOneField(TripData, on_delete=models.CASCADE, related_name='od_matrix')
+    route        = models.ForeignKey('Route', on_delete=models.SET_NULL, null=True, blank=True, related_name='od_matrices')
+    company_code = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='od_matrices')
+    # Copied from the trip so range scans never join trip_data
+    start_date   = models.DateField(null=True, blank=True)
+    stage_count  = models.PositiveSmallIntegerField(default=0)
+    data         = models.BinaryField(default=bytes)
+    is_frozen    = models.BooleanField(default=False)
+    updated_at   = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'trip_od_matrix'
+        indexes  = [models.Index(fields=['company_code', 'route', 'start_date'])]
+
+    def __str__(self):
+        return f"OD {self.trip_id} ({self.stage_count} stages)"
+
+
+class TicketArchiveDay(models.Model):
+    """
+    One company-day of TransactionData moved to the columnar cold archive
+    (TicketAppB/ticket_archive.py). The rows live in the files under `path`
+    and are no longer in transaction_data; the totals are the ones the files
+    were verified against before the rows were deleted.
+    """
+
+    company_code  = models.ForeignKey(Company, on_delete=models.PROTECT, related_name='ticket_archive_days')
+    day           = models.DateField()
+    row_count     = models.PositiveIntegerField(default=0)
+    ticket_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    path          = models.CharField(max_length=255)
+    archived_at   = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table    = 'ticket_archive_day'
+        constraints = [
+            models.UniqueConstraint(fields=['company_code', 'day'], name='uniq_ticket_archive_company_day'),
+        ]
+
+    def __str__(self):
+        return f"Archive {self.company_code_id} {self.day} ({self.row_count} tickets)"
+
+
 class OdometerData(models.Model):
     class SourceType(models.TextChoices):
         API = 'api', 'API'
@@ -0,0 +1,267 @@
+"""
+ODMatrix
+========
+Per-trip origin–destination passenger matrix (TripODMatrix).
+
+Layout
+  int32 array, shape (len(CATEGORIES), n, n), C order, stored raw in
+  TripODMatrix.data. m[c, i, j] = passengers of category c boarding at
+  stage ordinal i and alighting at ordinal j. Ordinals are device stage
+  numbers minus one — the same position the ingest task uses to resolve
+  from_stage_id/to_stage_id in the route's sequence_no order.
+
+Lifecycle
+  add_ticket()   — ticket ingest. After the ticket commits, HINCRBYs its
+                   counts into the pqr:od:pending hash, one field per
+                   (trip, category, from, to); the matrix row is not touched.
+                   Without django-redis it falls back to a row-locked
+                   per-ticket update.
+  fold_pending() — tasks.fold_od_matrix_increments, every minute. Renames the
+                   hash and folds it trip by trip: one locked read-add-write
+                   per trip per run, however many tickets arrived. Grows n if
+                   a ticket names a stage past the current size.
+  rebuild()      — one query over the trip's tickets (ticket_agg). Called on
+                   trip close, where it also sets is_frozen and drops the
+                   trip's pending increments. A frozen matrix is
+                   authoritative; late tickets for it are folded by
+                   rebuilding it again, so an increment racing the close can
+                   never be counted twice.
+
+Reading
+  sum_matrices() adds any number of stored matrices (padded to the largest
+  n) in NumPy — month-long OD reports never touch transaction_data.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from redis.exceptions import ResponseError
+
+CATEGORIES = ('full', 'half', 'st', 'phy', 'lugg', 'ladies', 'senior')
+
+# TransactionData count field for each category, same order as CATEGORIES
+TICKET_FIELDS = (
+    'full_count', 'half_count', 'st_count', 'phy_count',
+    'lugg_count', 'ladies_count', 'senior_count',
+)
+
+_DTYPE = np.int32
+
+_PENDING_KEY = 'pqr:od:pending'
+_FOLDING_KEY = 'pqr:od:folding'
+
+
+def _redis():
+    """Raw client, or None when the cache isn't django-redis."""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def empty(n: int) -> np.ndarray:
+    return np.zeros((len(CATEGORIES), n, n), dtype=_DTYPE)
+
+
+def to_array(od) -> np.ndarray:
+    """Decode a TripODMatrix row. Returns a writable copy."""
+    n = od.stage_count
+    if not n or not od.data:
+        return empty(n)
+    return np.frombuffer(bytes(od.data), dtype=_DTYPE).reshape(len(CATEGORIES), n, n).copy()
+
+
+def _store(od, matrix: np.ndarray) -> None:
+    od.stage_count = matrix.shape[1]
+    od.data = np.ascontiguousarray(matrix, dtype=_DTYPE).tobytes()
+
+
+def _grow(matrix: np.ndarray, n: int) -> np.ndarray:
+    if n <= matrix.shape[1]:
+        return matrix
+    grown = empty(n)
+    size = matrix.shape[1]
+    grown[:, :size, :size] = matrix
+    return grown
+
+
+def _get_or_create_locked(trip, stage_count: int):
+    from .models import TripODMatrix
+
+    od = TripODMatrix.objects.select_for_update().filter(trip=trip).first()
+    if od is None:
+        od, _ = TripODMatrix.objects.get_or_create(
+            trip=trip,
+            defaults={
+                'route_id': trip.route_id_id,
+                'company_code_id': trip.company_code_id,
+                'start_date': trip.start_date,
+                'stage_count': stage_count,
+                'data': empty(stage_count).tobytes(),
+            },
+        )
+        od = TripODMatrix.objects.select_for_update().get(pk=od.pk)
+    return od
+
+
+def _add_locked(trip, from_stage, to_stage, counts, stage_count) -> None:
+    # No-Redis fallback: row-locked read-add-write per ticket.
+    od = _get_or_create_locked(trip, stage_count)
+    matrix = _grow(to_array(od), max(from_stage, to_stage, stage_count))
+    matrix[:, from_stage - 1, to_stage - 1] += np.asarray(list(counts), dtype=_DTYPE)
+    _store(od, matrix)
+    od.save(update_fields=['stage_count', 'data', 'updated_at'])
+
+
+def _buffer(client, fields: dict) -> None:
+    pipe = client.pipeline(transaction=False)
+    for field, n in fields.items():
+        pipe.hincrby(_PENDING_KEY, field, n)
+    pipe.execute()
+
+
+def add_ticket(trip, from_stage: int, to_stage: int, counts, stage_count: int = 0) -> None:
+    """
+    Add one ticket's passenger counts to the trip's matrix — buffered until
+    the next fold_pending().
+    from_stage/to_stage are raw device stage numbers (1-based); tickets with
+    a missing stage (0) are skipped, as they are in the stage-wise reports.
+    counts — iterable of 7 ints in CATEGORIES order.
+    """
+    if trip is None or from_stage < 1 or to_stage < 1:
+        return
+    client = _redis()
+    if client is None:
+        _add_locked(trip, from_stage, to_stage, counts, stage_count)
+        return
+    fields = {
+        f'{trip.pk}:{c}:{from_stage}:{to_stage}': int(n)
+        for c, n in enumerate(counts) if n
+    }
+    if fields:
+        # After commit, so a rolled-back ticket never reaches the matrix.
+        transaction.on_commit(lambda: _buffer(client, fields))
+
+
+def fold_trip(trip_pk, increments) -> bool:
+    """
+    Fold one trip's increments — (category, from_stage, to_stage, n) tuples —
+    into its matrix under one row lock. A frozen matrix is rebuilt from the
+    tickets instead. False if the trip no longer exists.
+    """
+    from .models import TripData
+
+    with transaction.atomic():
+        trip = TripData.objects.filter(pk=trip_pk).first()
+        if trip is None:
+            return False
+        od = _get_or_create_locked(trip, 0)
+        if od.is_frozen:
+            rebuild(trip, stage_count=od.stage_count, freeze=True)
+            return True
+        cats, src, dst, counts = (np.asarray(col) for col in zip(*increments))
+        matrix = _grow(to_array(od), int(max(src.max(), dst.max())))
+        np.add.at(matrix, (cats, src - 1, dst - 1), counts.astype(_DTYPE))
+        _store(od, matrix)
+        od.save(update_fields=['stage_count', 'data', 'updated_at'])
+    return True
+
+
+def _fold_hash(client) -> int:
+    by_trip = defaultdict(list)
+    for field, n in client.hgetall(_FOLDING_KEY).items():
+        trip_pk, cat, src, dst = field.decode().split(':')
+        by_trip[int(trip_pk)].append((field, (int(cat), int(src), int(dst), int(n))))
+    for trip_pk, entries in by_trip.items():
+        fold_trip(trip_pk, [inc for _, inc in entries])
+        # Per trip, so a fold that dies half-way does not re-add the trips
+        # it already committed when the next run finishes it.
+        client.hdel(_FOLDING_KEY, *[field for field, _ in entries])
+    client.delete(_FOLDING_KEY)
+    return len(by_trip)
+
+
+def fold_pending() -> int:
+    """
+    Fold the buffered increments into the trips' matrices. The hash is
+    renamed before reading, so tickets arriving during the fold land in a
+    fresh hash; a fold that died half-way is finished by the next run.
+    Returns the number of trips folded.
+    """
+    client = _redis()
+    if client is None:
+        return 0
+    folded = _fold_hash(client)
+    try:
+        client.rename(_PENDING_KEY, _FOLDING_KEY)
+    except ResponseError:
+        return folded  # nothing buffered since the last fold
+    return folded + _fold_hash(client)
+
+
+def _discard_pending(trip) -> None:
+    client = _redis()
+    if client is None:
+        return
+    for key in (_PENDING_KEY, _FOLDING_KEY):
+        fields = [field for field, _ in client.hscan_iter(key, match=f'{trip.pk}:*')]
+        if fields:
+            client.hdel(key, *fields)
+
+
+def rebuild(trip, stage_count: int = 0, freeze: bool = False) -> None:
+    """Recompute the matrix from the trip's tickets — one query, summed in NumPy."""
+    from .models import TransactionData
+    from .ticket_agg import TicketFrame
+
+    # Dropped before the tickets are read: every ticket the query can miss
+    # still has its increment queued. One that races in after the drop for an
+    # already-counted ticket is harmless — it folds as a rebuild of the
+    # now frozen matrix.
+    if freeze:
+        _discard_pending(trip)
+    frame = TicketFrame.load(
+        TransactionData.objects.filter(trip_id=trip, from_stage__gte=1, to_stage__gte=1),
+        'from_stage', 'to_stage', *TICKET_FIELDS,
+    )
+    n = max(stage_count, int(frame['from_stage'].max(initial=0)), int(frame['to_stage'].max(initial=0)))
+    matrix = empty(n)
+    np.add.at(
+        matrix,
+        (slice(None), frame['from_stage'] - 1, frame['to_stage'] - 1),
+        frame.categories().T.astype(_DTYPE),
+    )
+
+    od = _get_or_create_locked(trip, n)
+    _store(od, matrix)
+    od.route_id = trip.route_id_id
+    od.start_date = trip.start_date
+    od.is_frozen = od.is_frozen or freeze
+    od.save()
+
+
+def sum_matrices(rows) -> np.ndarray:
+    """
+    Sum TripODMatrix rows (or (stage_count, data) pairs) into one array,
+    padding smaller matrices into the top-left corner of the largest.
+    """
+    pairs = [
+        (r.stage_count, r.data) if hasattr(r, 'stage_count') else r
+        for r in rows
+    ]
+    n = max((count for count, _ in pairs), default=0)
+    total = empty(n)
+    for count, data in pairs:
+        if not count or not data:
+            continue
+        total[:, :count, :count] += np.frombuffer(bytes(data), dtype=_DTYPE).reshape(
+            len(CATEGORIES), count, count,
+        )
+    return total
+
+
+def stage_flows(matrix: np.ndarray):
+    """(boarded, alighted) per stage ordinal: shape (categories, n) each."""
+    return matrix.sum(axis=2), matrix.sum(axis=1)
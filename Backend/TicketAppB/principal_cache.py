@@ -0,0 +1,214 @@
+"""
+PrincipalCache
+==============
+Cached snapshot of the authenticated user, so SessionAuthentication and
+LicensePermission need no SQL on a warm request.
+
+Snapshot
+  The user row (every concrete field except password) plus the rows of the
+  user's company and dealer, as value lists. get_user() rebuilds a CustomUser
+  with company/dealer already attached — views and LicensePermission see the
+  same object the old select_related('company', 'dealer') query returned.
+  password is left deferred and loads on first access (password change).
+
+Layers
+  1. In-process LRU (PRINCIPAL_CACHE_LRU_SIZE entries, default 2048)
+  2. Redis  pqr:principal:<user_pk>   (PRINCIPAL_CACHE_TTL, default 300s)
+  3. DB     User.objects.select_related('company', 'dealer')
+
+Versions
+  pqr:pver:u:<user_pk>  pqr:pver:c:<company_pk>  pqr:pver:d:<dealer_pk>
+  A snapshot records the three versions it was built under and is only used
+  while all three still match — one MGET per request, whichever layer hits.
+  Signals bump them on user / company / dealer save and delete, so the
+  company and dealer deactivation cascades (which update users in bulk)
+  invalidate every member in one write. Bumps happen immediately and again
+  on commit, so a snapshot read from a not-yet-committed state is dropped
+  too. The TTL bounds what is left: a reader that loads the rows just before
+  a commit and the versions just after it.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+_SNAPSHOT_KEY_PREFIX = 'pqr:principal:'
+_VERSION_KEY_PREFIX = 'pqr:pver:'
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def get_principal_cache_ttl() -> int:
+    return int(getattr(settings, 'PRINCIPAL_CACHE_TTL', 300))
+
+
+def get_principal_lru_size() -> int:
+    return int(getattr(settings, 'PRINCIPAL_CACHE_LRU_SIZE', 2048))
+
+
+def _snapshot_key(user_id) -> str:
+    return f'{_SNAPSHOT_KEY_PREFIX}{user_id}'
+
+
+def _version_keys(user_id, company_id, dealer_id) -> list:
+    return [
+        f'{_VERSION_KEY_PREFIX}u:{user_id}',
+        f'{_VERSION_KEY_PREFIX}c:{company_id}' if company_id else None,
+        f'{_VERSION_KEY_PREFIX}d:{dealer_id}' if dealer_id else None,
+    ]
+
+
+def _seed() -> int:
+    return time.time_ns() // 1000
+
+
+def _bump_key(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, _seed(), timeout=None):
+            cache.incr(key)
+
+
+def _bump(key: str) -> None:
+    _bump_key(key)
+    transaction.on_commit(lambda: _bump_key(key))
+
+
+def bump_user(user_id) -> None:
+    if user_id:
+        _bump(_version_keys(user_id, None, None)[0])
+
+
+def bump_company(company_id) -> None:
+    if company_id:
+        _bump(f'{_VERSION_KEY_PREFIX}c:{company_id}')
+
+
+def bump_dealer(dealer_id) -> None:
+    if dealer_id:
+        _bump(f'{_VERSION_KEY_PREFIX}d:{dealer_id}')
+
+
+def _versions(user_id, company_id, dealer_id) -> tuple:
+    """Current (user, company, dealer) versions in one MGET; missing ones are seeded."""
+    keys = _version_keys(user_id, company_id, dealer_id)
+    found = cache.get_many([k for k in keys if k])
+    versions = []
+    for key in keys:
+        if key is None:
+            versions.append(None)
+            continue
+        value = found.get(key)
+        if value is None:
+            value = _seed()
+            if not cache.add(key, value, timeout=None):
+                value = cache.get(key, value)
+        versions.append(value)
+    return tuple(versions)
+
+
+# ── Snapshot <-> model instances ──────────────────────────────────────────────
+
+def _fields(model) -> list:
+    return [f for f in model._meta.concrete_fields if f.attname != 'password']
+
+
+def _row(instance):
+    if instance is None:
+        return None
+    return [getattr(instance, f.attname) for f in _fields(type(instance))]
+
+
+def _instance(model, row):
+    return model.from_db(DEFAULT_DB_ALIAS, [f.attname for f in _fields(model)], row)
+
+
+def _snapshot(user) -> dict:
+    return {
+        'company_id': user.company_id,
+        'dealer_id': user.dealer_id,
+        'user': _row(user),
+        'company': _row(user.company) if user.company_id else None,
+        'dealer': _row(user.dealer) if user.dealer_id else None,
+    }
+
+
+def _build(snapshot):
+    User = get_user_model()
+    user = _instance(User, snapshot['user'])
+    if snapshot['company'] is not None:
+        user.company = _instance(User.company.field.related_model, snapshot['company'])
+    if snapshot['dealer'] is not None:
+        user.dealer = _instance(User.dealer.field.related_model, snapshot['dealer'])
+    return user
+
+
+# ── LRU ───────────────────────────────────────────────────────────────────────
+
+def _lru_get(user_id):
+    with _lru_lock:
+        entry = _lru.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _lru[user_id]
+            return None
+        _lru.move_to_end(user_id)
+        return entry
+
+
+def _lru_put(user_id, versions, snapshot) -> None:
+    with _lru_lock:
+        _lru[user_id] = (time.monotonic() + get_principal_cache_ttl(), versions, snapshot)
+        _lru.move_to_end(user_id)
+        while len(_lru) > get_principal_lru_size():
+            _lru.popitem(last=False)
+
+
+def clear_local() -> None:
+    with _lru_lock:
+        _lru.clear()
+
+
+# ── Public ────────────────────────────────────────────────────────────────────
+
+def store(user) -> None:
+    """Cache a user loaded with select_related('company', 'dealer')."""
+    snapshot = _snapshot(user)
+    versions = _versions(user.pk, user.company_id, user.dealer_id)
+    cache.set(_snapshot_key(user.pk), (versions, snapshot), timeout=get_principal_cache_ttl())
+    _lru_put(user.pk, versions, snapshot)
+
+
+def get_user(user_id):
+    """
+    Active user with company and dealer attached, or None if the user does
+    not exist or is inactive. Zero SQL while a snapshot is current.
+    """
+    entry = _lru_get(user_id)
+    if entry is not None:
+        _, versions, snapshot = entry
+        if _versions(user_id, snapshot['company_id'], snapshot['dealer_id']) == versions:
+            return _build(snapshot)
+
+    cached = cache.get(_snapshot_key(user_id))
+    if cached is not None:
+        versions, snapshot = cached
+        if _versions(user_id, snapshot['company_id'], snapshot['dealer_id']) == versions:
+            _lru_put(user_id, versions, snapshot)
+            return _build(snapshot)
+
+    User = get_user_model()
+    try:
+        user = User.objects.select_related('company', 'dealer').get(pk=user_id, is_active=True)
+    except User.DoesNotExist:
+        return None
+    store(user)
+    return user
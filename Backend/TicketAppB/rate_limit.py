@@ -0,0 +1,327 @@
+"""
+RateLimit
+=========
+Per-company and per-user throttling for report and export endpoints, so one
+operator refreshing the APK dashboard on many phones (or running big web
+ranges) cannot monopolise MySQL for every other tenant.
+
+Two checks, both per user and per company:
+  Token bucket   requests per minute with a burst allowance.
+  In-flight cap  reports being computed at the same time.
+
+Per-user limits follow UserTier (_USER_LIMITS); the company-wide limits come
+from settings (REPORT_RATE_COMPANY_*). A request over any limit gets 429
+with Retry-After and is not run.
+
+Redis
+  pqr:rl:tb:u:<user_pk>      user bucket      (hash: tokens, ts)
+  pqr:rl:tb:c:<company_pk>   company bucket
+  pqr:rl:if:u:<user_pk>      user in-flight   (zset: request token -> start ms)
+  pqr:rl:if:c:<company_pk>   company in-flight
+  pqr:rl:stats:<YYYY-MM-DD>  throttle counters (hash: <company>:<endpoint>:<reason>)
+
+  Check, consume and the throttle counter are one Lua script, so concurrent
+  workers can't both take the last token. In-flight entries older than
+  REPORT_RATE_LEASE_SECONDS are dropped on the next check — a worker killed
+  mid-report can't hold a slot forever.
+
+  Without django-redis (tests, local dev on LocMemCache) the same logic runs
+  against the cache under a process lock; limits are then per process. If
+  Redis is unreachable the request is allowed — throttling never takes
+  reports down.
+
+Usage (below @cached_report, so cache hits and 304s are never throttled):
+    @cached_report('farewise', date_range())
+    @rate_limited('farewise')
+    @use_reporting_db(date_range())
+    def farewise_report(request): ...
+
+Throttle counts: `python manage.py report_throttle_stats [--date YYYY-MM-DD]`.
+"""
+
+import logging
+import math
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = 'pqr:rl:'
+_STATS_TTL = 8 * 86400
+
+# Per-user limits by UserTier: (requests per minute, burst, in flight).
+# Company admins have no tier (role-based access) and get the top row.
+_USER_LIMITS = {
+    'basic':        (20, 6, 1),
+    'intermediate': (40, 12, 2),
+    'premium':      (90, 24, 3),
+    'none':         (90, 24, 3),
+}
+
+THROTTLE_ERROR = "Too many report requests. Please retry shortly."
+
+
+def is_rate_limit_enabled() -> bool:
+    return bool(getattr(settings, 'REPORT_RATE_LIMIT_ENABLED', True))
+
+
+def get_company_limits() -> tuple:
+    """(requests per minute, burst, in flight) shared by all users of a company."""
+    return (
+        int(getattr(settings, 'REPORT_RATE_COMPANY_PER_MINUTE', 240)),
+        int(getattr(settings, 'REPORT_RATE_COMPANY_BURST', 60)),
+        int(getattr(settings, 'REPORT_RATE_COMPANY_CONCURRENCY', 8)),
+    )
+
+
+def get_lease_seconds() -> int:
+    """Longest a report may hold an in-flight slot (default 120s)."""
+    return int(getattr(settings, 'REPORT_RATE_LEASE_SECONDS', 120))
+
+
+def user_limits(user) -> tuple:
+    return _USER_LIMITS.get(user.tier or 'basic', _USER_LIMITS['basic'])
+
+
+@dataclass
+class Slot:
+    allowed: bool
+    reason: str = ''
+    retry_after: int = 0        # seconds
+    keys: tuple = ()            # in-flight keys to release
+    token: str = ''
+
+
+# ── Redis (atomic) ────────────────────────────────────────────────────────────
+
+# KEYS: user bucket, company bucket, user in-flight, company in-flight, stats
+# ARGV: now_ms, token, lease_ms, u_rate, u_burst, u_conc, c_rate, c_burst,
+#       c_conc, stats field prefix, stats ttl
+_ACQUIRE_LUA = """
+local now = tonumber(ARGV[1])
+local lease = tonumber(ARGV[3])
+
+local function refill(key, rate, burst)
+  local b = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(b[1]) or burst
+  local ts = tonumber(b[2]) or now
+  return math.min(burst, tokens + math.max(0, now - ts) * rate / 60000)
+end
+
+local u_rate, u_burst, u_conc = tonumber(ARGV[4]), tonumber(ARGV[5]), tonumber(ARGV[6])
+local c_rate, c_burst, c_conc = tonumber(ARGV[7]), tonumber(ARGV[8]), tonumber(ARGV[9])
+local ut = refill(KEYS[1], u_rate, u_burst)
+local ct = refill(KEYS[2], c_rate, c_burst)
+
+local reason, retry = '', 0
+if ut < 1 then
+  reason, retry = 'user_rate', (1 - ut) * 60000 / u_rate
+elseif ct < 1 then
+  reason, retry = 'company_rate', (1 - ct) * 60000 / c_rate
+else
+  redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now - lease)
+  redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', now - lease)
+  if redis.call('ZCARD', KEYS[3]) >= u_conc then
+    reason, retry = 'user_concurrency', 1000
+  elseif redis.call('ZCARD', KEYS[4]) >= c_conc then
+    reason, retry = 'company_concurrency', 1000
+  end
+end
+
+if reason ~= '' then
+  redis.call('HINCRBY', KEYS[5], ARGV[10] .. reason, 1)
+  redis.call('EXPIRE', KEYS[5], tonumber(ARGV[11]))
+  return {0, reason, math.ceil(retry)}
+end
+
+redis.call('HSET', KEYS[1], 'tokens', ut - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(u_burst * 60000 / u_rate) + 1000)
+redis.call('HSET', KEYS[2], 'tokens', ct - 1, 'ts', now)
+redis.call('PEXPIRE', KEYS[2], math.ceil(c_burst * 60000 / c_rate) + 1000)
+redis.call('ZADD', KEYS[3], now, ARGV[2])
+redis.call('PEXPIRE', KEYS[3], lease)
+redis.call('ZADD', KEYS[4], now, ARGV[2])
+redis.call('PEXPIRE', KEYS[4], lease)
+return {1, '', 0}
+"""
+
+_script = None
+_script_lock = threading.Lock()
+
+
+def _redis():
+    """Raw client, or None when the cache isn't django-redis."""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def _acquire_script(client):
+    global _script
+    with _script_lock:
+        if _script is None:
+            _script = client.register_script(_ACQUIRE_LUA)
+        return _script
+
+
+# ── Cache fallback (per process) ──────────────────────────────────────────────
+
+_local_lock = threading.Lock()
+
+
+def _local_refill(key, now, rate, burst):
+    state = cache.get(key) or {'tokens': burst, 'ts': now}
+    return min(burst, state['tokens'] + max(0, now - state['ts']) * rate / 60000)
+
+
+def _local_acquire(keys, now, token, lease, user_lim, company_lim, field):
+    ub, cb, ui, ci, stats = keys
+    u_rate, u_burst, u_conc = user_lim
+    c_rate, c_burst, c_conc = company_lim
+    with _local_lock:
+        ut = _local_refill(ub, now, u_rate, u_burst)
+        ct = _local_refill(cb, now, c_rate, c_burst)
+        inflight = {
+            k: {t: ts for t, ts in (cache.get(k) or {}).items() if ts > now - lease}
+            for k in (ui, ci)
+        }
+        reason, retry = '', 0
+        if ut < 1:
+            reason, retry = 'user_rate', (1 - ut) * 60000 / u_rate
+        elif ct < 1:
+            reason, retry = 'company_rate', (1 - ct) * 60000 / c_rate
+        elif len(inflight[ui]) >= u_conc:
+            reason, retry = 'user_concurrency', 1000
+        elif len(inflight[ci]) >= c_conc:
+            reason, retry = 'company_concurrency', 1000
+
+        if reason:
+            counts = cache.get(stats) or {}
+            counts[field + reason] = counts.get(field + reason, 0) + 1
+            cache.set(stats, counts, timeout=_STATS_TTL)
+            return 0, reason, math.ceil(retry)
+
+        cache.set(ub, {'tokens': ut - 1, 'ts': now}, timeout=math.ceil(u_burst * 60 / u_rate) + 1)
+        cache.set(cb, {'tokens': ct - 1, 'ts': now}, timeout=math.ceil(c_burst * 60 / c_rate) + 1)
+        for k in (ui, ci):
+            inflight[k][token] = now
+            cache.set(k, inflight[k], timeout=math.ceil(lease / 1000))
+        return 1, '', 0
+
+
+def _local_release(keys, token):
+    with _local_lock:
+        for k in keys:
+            inflight = cache.get(k)
+            if inflight and inflight.pop(token, None) is not None:
+                cache.set(k, inflight, timeout=get_lease_seconds())
+
+
+# ── Acquire / release ─────────────────────────────────────────────────────────
+
+def _stats_key(day) -> str:
+    return f'{_KEY_PREFIX}stats:{day}'
+
+
+def acquire(user, endpoint: str) -> Slot:
+    """Take a token and an in-flight slot for user and their company."""
+    company_id = user.company_id
+    keys = (
+        f'{_KEY_PREFIX}tb:u:{user.pk}',
+        f'{_KEY_PREFIX}tb:c:{company_id}',
+        f'{_KEY_PREFIX}if:u:{user.pk}',
+        f'{_KEY_PREFIX}if:c:{company_id}',
+        _stats_key(timezone.localdate()),
+    )
+    now = int(time.time() * 1000)
+    token = uuid.uuid4().hex
+    lease = get_lease_seconds() * 1000
+    user_lim, company_lim = user_limits(user), get_company_limits()
+    field = f'{company_id}:{endpoint}:'
+
+    client = _redis()
+    try:
+        if client is None:
+            allowed, reason, retry_ms = _local_acquire(keys, now, token, lease, user_lim, company_lim, field)
+        else:
+            allowed, reason, retry_ms = _acquire_script(client)(
+                keys=list(keys),
+                args=[now, token, lease, *user_lim, *company_lim, field, _STATS_TTL],
+            )
+    except Exception as e:
+        logger.warning(f"Rate limit check failed, allowing request ({endpoint}): {e}")
+        return Slot(allowed=True)
+
+    if isinstance(reason, bytes):
+        reason = reason.decode()
+    if not allowed:
+        retry_after = max(1, math.ceil(int(retry_ms) / 1000))
+        logger.info(
+            f"Report throttled: company={company_id} user={user.pk} "
+            f"endpoint={endpoint} reason={reason} retry_after={retry_after}s"
+        )
+        return Slot(allowed=False, reason=reason, retry_after=retry_after)
+    return Slot(allowed=True, keys=keys[2:4], token=token)
+
+
+def release(slot: Slot) -> None:
+    if not slot.token:
+        return
+    client = _redis()
+    try:
+        if client is None:
+            _local_release(slot.keys, slot.token)
+        else:
+            pipe = client.pipeline(transaction=False)
+            for k in slot.keys:
+                pipe.zrem(k, slot.token)
+            pipe.execute()
+    except Exception as e:
+        # The lease expires the slot anyway.
+        logger.warning(f"Rate limit release failed: {e}")
+
+
+def throttle_stats(day) -> dict:
+    """{'<company>:<endpoint>:<reason>': count} for one date."""
+    key = _stats_key(day)
+    client = _redis()
+    if client is None:
+        return dict(cache.get(key) or {})
+    return {f.decode(): int(n) for f, n in client.hgetall(key).items()}
+
+
+def throttled_response(slot: Slot) -> Response:
+    return Response(
+        {'error': THROTTLE_ERROR, 'reason': slot.reason, 'retry_after': slot.retry_after},
+        status=429,
+        headers={'Retry-After': str(slot.retry_after)},
+    )
+
+
+def rate_limited(endpoint: str):
+    """Throttle a company-scoped report view; see the module docstring."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            user = request.user
+            if not getattr(user, 'company_id', None) or not is_rate_limit_enabled():
+                return view_func(request, *args, **kwargs)
+            slot = acquire(user, endpoint)
+            if not slot.allowed:
+                return throttled_response(slot)
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                release(slot)
+        return wrapper
+    return decorator
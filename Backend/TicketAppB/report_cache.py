@@ -0,0 +1,280 @@
+"""
+ReportCache
+===========
+Server-side cache for report endpoints, keyed by
+(company, endpoint, tier, normalized params, data version).
+
+Data version
+  Every (company, date) pair has a counter in Redis:
+      pqr:rptver:<company_pk>:<YYYY-MM-DD>
+  The ingest tasks bump the counter for every date a processed ticket, trip
+  or schedule touches (see tasks._bump_report_versions). A cached report
+  embeds the versions of all dates it covers in its key, so a bump makes
+  the old entry unreachable — no scan/delete needed, it just ages out.
+
+  A second per-company counter (pqr:rptver:<company_pk>:master) is bumped
+  from signals when master data shown in reports changes (buses, routes,
+  stages, depots).
+
+  Missing counters are seeded with a microsecond timestamp instead of 0, so
+  a counter lost to eviction or a Redis restart can never line up with an
+  entry written under the old value.
+
+Result: past days are served straight from Redis until something for that
+day actually arrives; today's views are invalidated on the next ingest.
+
+Usage (between @permission_classes and the view):
+    @api_view(['GET'])
+    @permission_classes([IsAuthenticated, LicensePermission])
+    @cached_report('duty', single_date('date'))
+    def duty_report(request): ...
+
+Tier is part of the key, so a cache hit is only possible for a tier that the
+view has already accepted — tier gates inside the view stay authoritative.
+Only 200 responses are cached (DRF Response data or a JsonResponse body).
+
+The key digest is also the response ETag, so clients that send it back in
+If-None-Match get a 304 as long as no covered date has been bumped.
+"""
+
+import datetime
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.response import Response
+
+_VERSION_KEY_PREFIX = 'pqr:rptver:'
+_REPORT_KEY_PREFIX = 'pqr:rpt:'
+
+# Reports spanning more days than this bypass the cache — one version
+# lookup per day stops being cheap past a quarter.
+MAX_CACHED_SPAN_DAYS = 92
+
+
+def _version_key(company_id, day) -> str:
+    return f'{_VERSION_KEY_PREFIX}{company_id}:{day}'
+
+
+def _master_key(company_id) -> str:
+    return f'{_VERSION_KEY_PREFIX}{company_id}:master'
+
+
+def _seed() -> int:
+    return time.time_ns() // 1000
+
+
+def get_report_cache_ttl() -> int:
+    """Entries are versioned, so the TTL only bounds Redis memory (default 6h)."""
+    return int(getattr(settings, 'REPORT_CACHE_TTL', 21600))
+
+
+def _bump(key: str) -> None:
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Counter missing (first write for this date, or evicted) — a fresh
+        # seed is already distinct from any earlier value.
+        if not cache.add(key, _seed(), timeout=None):
+            cache.incr(key)
+
+
+def bump_data_version(company_id, *days) -> None:
+    """
+    Invalidate cached reports for the given company and dates.
+    Accepts date objects or YYYY-MM-DD strings; None values are ignored.
+    Called from the ingest tasks after commit.
+    """
+    if not company_id:
+        return
+    for day in {str(d) for d in days if d}:
+        _bump(_version_key(company_id, day))
+
+
+def bump_master_version(company_id) -> None:
+    """Invalidate every cached report for the company (master data changed)."""
+    if company_id:
+        _bump(_master_key(company_id))
+
+
+def get_data_versions(company_id, days) -> list:
+    """
+    Current version for each date, plus the master version as the last item.
+    One MGET; missing counters are seeded on the spot.
+    """
+    keys = [_version_key(company_id, d) for d in days] + [_master_key(company_id)]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        value = found.get(key)
+        if value is None:
+            value = _seed()
+            if not cache.add(key, value, timeout=None):
+                value = cache.get(key, value)
+        versions.append(value)
+    return versions
+
+
+def report_cache_key(company_id, endpoint: str, tier: str, params, versions) -> str:
+    """
+    Build the cache key. params is a QueryDict/dict; values are sorted so
+    ?a=1&b=2 and ?b=2&a=1 share an entry.
+    """
+    if hasattr(params, 'lists'):
+        items = sorted((k, sorted(v)) for k, v in params.lists())
+    else:
+        items = sorted((k, [str(v)]) for k, v in params.items())
+    digest = hashlib.sha1(
+        json.dumps([tier, items, versions], default=str, separators=(',', ':')).encode()
+    ).hexdigest()
+    return f'{_REPORT_KEY_PREFIX}{company_id}:{endpoint}:{digest}'
+
+
+# ── Date span helpers ─────────────────────────────────────────────────────────
+# Each returns a callable(params) → list of YYYY-MM-DD strings the report reads,
+# or None when the params are missing/invalid (the view then runs uncached
+# and returns its own 400).
+
+def _parse(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def single_date(param='date'):
+    def span(params):
+        day = _parse(params.get(param))
+        return [str(day)] if day else None
+    return span
+
+
+def date_range(from_param='from_date', to_param='to_date'):
+    def span(params):
+        start, end = _parse(params.get(from_param)), _parse(params.get(to_param))
+        if not start or not end or end < start:
+            return None
+        days = (end - start).days + 1
+        if days > MAX_CACHED_SPAN_DAYS:
+            return None
+        return [str(start + datetime.timedelta(days=i)) for i in range(days)]
+    return span
+
+
+def week_of(param='date'):
+    """Mon–Sun week containing the anchor date (APK dashboard weekly chart)."""
+    def span(params):
+        anchor = _parse(params.get(param))
+        if not anchor:
+            return None
+        week_start = anchor - datetime.timedelta(days=anchor.weekday())
+        return [str(week_start + datetime.timedelta(days=i)) for i in range(7)]
+    return span
+
+
+# ── Conditional GET ───────────────────────────────────────────────────────────
+# The cache key already encodes every data version the report depends on, so
+# its digest doubles as a strong ETag: a matching If-None-Match means nothing
+# the report reads has changed and we answer 304 without touching MySQL.
+# Last-Modified is the time the cached entry was built.
+
+def _etag_for(key: str) -> str:
+    return '"%s"' % key.rsplit(':', 1)[-1]
+
+
+def _etag_matches(request, etag: str) -> bool:
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    # GZip/brotli weaken the ETag on the way out (W/"..."), so compare opaque tags.
+    tags = {t.strip().removeprefix('W/') for t in header.split(',')}
+    return etag in tags or '*' in tags
+
+
+def _not_modified_since(request, generated_at) -> bool:
+    header = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if not header or request.META.get('HTTP_IF_NONE_MATCH'):
+        return False
+    since = parse_http_date_safe(header)
+    return since is not None and int(generated_at) <= since
+
+
+def _with_validators(response, etag: str, generated_at=None):
+    response['ETag'] = etag
+    if generated_at is not None:
+        response['Last-Modified'] = http_date(generated_at)
+    # Let browsers keep the body but revalidate every time.
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _not_modified(etag: str, generated_at=None):
+    return _with_validators(HttpResponseNotModified(), etag, generated_at)
+
+
+# ── Decorator ─────────────────────────────────────────────────────────────────
+
+def cached_report(endpoint: str, span, skip_params=()):
+    """
+    Cache a company-scoped GET report view.
+    span        — one of the date span helpers above
+    skip_params — any of these present in the query string bypasses the cache
+                  (e.g. the web reports' since= polling cursor)
+
+    Responses carry ETag/Last-Modified; a matching If-None-Match or
+    If-Modified-Since gets 304 without running the view.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            user = request.user
+            company_id = getattr(user, 'company_id', None)
+            params = request.GET
+            days = span(params) if company_id else None
+            if days is None or any(p in params for p in skip_params):
+                return view_func(request, *args, **kwargs)
+
+            key = report_cache_key(
+                company_id, endpoint, user.tier, params,
+                get_data_versions(company_id, days),
+            )
+            etag = _etag_for(key)
+            if _etag_matches(request, etag):
+                return _not_modified(etag)
+
+            entry = cache.get(key)
+            if entry is not None:
+                generated_at, payload = entry
+                if _not_modified_since(request, generated_at):
+                    return _not_modified(etag, generated_at)
+                if isinstance(payload, bytes):
+                    response = HttpResponse(payload, content_type='application/json')
+                else:
+                    response = Response(payload)
+                return _with_validators(response, etag, generated_at)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            generated_at = time.time()
+            timeout = get_report_cache_ttl()
+            if getattr(response, '_from_replica', False) and str(timezone.localdate()) in days:
+                # Built from the reporting replica (db_router): today's latest
+                # ingests may not have replicated yet, so don't keep it for long.
+                timeout = min(timeout, int(getattr(settings, 'REPORTING_DB_MAX_LAG_SECONDS', 30)))
+            if isinstance(response, Response):
+                cache.set(key, (generated_at, response.data), timeout=timeout)
+            elif isinstance(response, JsonResponse):
+                # Some web views return JsonResponse — keep the rendered body.
+                cache.set(key, (generated_at, response.content), timeout=timeout)
+            else:
+                return response
+            return _with_validators(response, etag, generated_at)
+        return wrapper
+    return decorator
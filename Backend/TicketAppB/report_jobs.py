@@ -0,0 +1,332 @@
+"""
+ReportJobs
+==========
+Long date-range reports computed by a Celery worker instead of inside the
+request (multi-month payment-type / farewise / expense reports and the full
+ticket export regularly ran past the proxy timeout).
+
+Flow
+  POST reports/jobs                    {report, from_date, to_date, ...}
+                                       → 202 {job_id, status, progress}
+  GET  reports/jobs/<job_id>           → status + progress
+  GET  reports/jobs/<job_id>/result    → report body (JSON) or file download
+
+State (Redis, every key expires after REPORT_JOB_TTL, default 1h)
+  pqr:rjob:<job_id>                 job dict — report, company, params,
+                                    status, progress {done, total}, error
+  pqr:rjob:<job_id>:result          {content_type, filename, payload}
+                                    (file reports: path instead of payload)
+  pqr:rjob:sig:<company_pk>:<hash>  job_id for an identical submission
+
+Files
+  File reports are written to <REPORT_JOB_FILE_ROOT>/<job_id><ext> (default
+  MEDIA_ROOT/report_jobs) — never into Redis, whatever the range's size.
+  The root must be shared by the workers and the web processes.
+  tasks.cleanup_report_job_files deletes files older than REPORT_JOB_TTL;
+  get_result treats a missing file as an expired result.
+
+Coalescing
+  The signature hashes (report, params, report_cache data version of every
+  day in the range). The first submitter claims it with cache.add and
+  queues the job (its record is written first, so the claim never points at
+  a job that is not there yet); identical submissions get the same job_id
+  back — while it is still running and, until the TTL, after it finished. An ingest for any
+  covered day bumps its version, so a new submission computes a fresh job
+  rather than reusing a stale result. A failed job is replaced on resubmit.
+
+Streaming
+  The worker walks the range in REPORT_JOB_CHUNK_DAYS pieces, folding each
+  into an accumulator (see the _collect_* / _render_* pairs in
+  views/apk/reports.py) and writing progress after every chunk. File
+  reports write CSV rows straight into a gzip file, renamed into place
+  once complete.
+"""
+
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .db_router import reporting_reads
+from .report_cache import get_data_versions
+
+logger = logging.getLogger(__name__)
+
+_JOB_KEY_PREFIX = 'pqr:rjob:'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# collect/render — see views/apk/reports.py; render is None for file reports,
+# which write `columns` as the CSV header and rows through a csv.writer.
+JobReport = namedtuple(
+    'JobReport', 'collect render tier required optional columns filename',
+)
+
+
+def _reports() -> dict:
+    from .views.apk import reports as apk_reports
+    from .views.web import ticket_reports
+
+    return {
+        'payment_type': JobReport(
+            apk_reports._collect_payment_type, apk_reports._render_payment_type,
+            'intermediate', ('bus_no',), ('payment_mode',), None, None,
+        ),
+        'farewise': JobReport(
+            apk_reports._collect_farewise, apk_reports._render_farewise,
+            'intermediate', ('bus_no',), (), None, None,
+        ),
+        'expense': JobReport(
+            apk_reports._collect_expense, apk_reports._render_expense,
+            'intermediate', ('bus_no',), (), None, None,
+        ),
+        'tickets_csv': JobReport(
+            ticket_reports._collect_ticket_export, None,
+            None, (), (), ticket_reports.TICKET_EXPORT_COLUMNS,
+            'tickets_{from_date}_{to_date}.csv.gz',
+        ),
+    }
+
+
+def get_report(name):
+    """JobReport for a report name, or None if it cannot run as a job."""
+    return _reports().get(name)
+
+
+def get_report_job_ttl() -> int:
+    return int(getattr(settings, 'REPORT_JOB_TTL', 3600))
+
+
+def get_report_job_chunk_days() -> int:
+    return max(1, int(getattr(settings, 'REPORT_JOB_CHUNK_DAYS', 31)))
+
+
+def get_report_job_max_days() -> int:
+    return int(getattr(settings, 'REPORT_JOB_MAX_DAYS', 366))
+
+
+def get_report_job_file_root() -> str:
+    return str(getattr(
+        settings, 'REPORT_JOB_FILE_ROOT', os.path.join(settings.MEDIA_ROOT, 'report_jobs'),
+    ))
+
+
+def _job_key(job_id) -> str:
+    return f'{_JOB_KEY_PREFIX}{job_id}'
+
+
+def _result_key(job_id) -> str:
+    return f'{_JOB_KEY_PREFIX}{job_id}:result'
+
+
+def _signature_key(company_id, report, params, versions) -> str:
+    digest = hashlib.sha1(
+        json.dumps([report, sorted(params.items()), versions], default=str, separators=(',', ':')).encode()
+    ).hexdigest()
+    return f'{_JOB_KEY_PREFIX}sig:{company_id}:{digest}'
+
+
+def _parse(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _chunks(start, end, size):
+    while start <= end:
+        chunk_end = min(start + datetime.timedelta(days=size - 1), end)
+        yield start, chunk_end
+        start = chunk_end + datetime.timedelta(days=1)
+
+
+# ── Submit / read ─────────────────────────────────────────────────────────────
+
+def clean_params(spec, params):
+    """
+    The job's parameters as a plain dict of strings, restricted to the ones the
+    report reads. Raises ValueError with a client-facing message when invalid.
+    """
+    missing = [p for p in ('from_date', 'to_date', *spec.required) if not params.get(p)]
+    if missing:
+        raise ValueError(f"{', '.join(missing)} required")
+    start, end = _parse(params['from_date']), _parse(params['to_date'])
+    if not start or not end:
+        raise ValueError('from_date and to_date must be YYYY-MM-DD')
+    if end < start:
+        raise ValueError('to_date must not be before from_date')
+    if (end - start).days + 1 > get_report_job_max_days():
+        raise ValueError(f'Date range cannot exceed {get_report_job_max_days()} days')
+
+    cleaned = {'from_date': str(start), 'to_date': str(end)}
+    for p in (*spec.required, *spec.optional):
+        if params.get(p):
+            cleaned[p] = str(params[p])
+    return cleaned
+
+
+def submit(company_id, report, params):
+    """
+    Queue a job, or return the live/finished job for an identical submission.
+    params must come from clean_params(). Returns (job, created).
+    """
+    start, end = _parse(params['from_date']), _parse(params['to_date'])
+    days = [str(start + datetime.timedelta(days=i)) for i in range((end - start).days + 1)]
+    sig_key = _signature_key(company_id, report, params, get_data_versions(company_id, days))
+    ttl = get_report_job_ttl()
+
+    job_id = uuid.uuid4().hex
+    job = {
+        'job_id': job_id,
+        'report': report,
+        'company_id': company_id,
+        'params': params,
+        'status': QUEUED,
+        'progress': {'done': 0, 'total': len(list(_chunks(start, end, get_report_job_chunk_days())))},
+        'error': None,
+        'created_at': time.time(),
+        'finished_at': None,
+    }
+    # The job record is written before the signature is claimed, so a claim
+    # always points at a readable job; one with no job behind it has expired.
+    cache.set(_job_key(job_id), job, timeout=ttl)
+
+    if not cache.add(sig_key, job_id, timeout=ttl):
+        existing = get_job(cache.get(sig_key))
+        if existing is not None and existing['status'] != FAILED:
+            cache.delete(_job_key(job_id))
+            return existing, False
+        cache.set(sig_key, job_id, timeout=ttl)
+
+    from .tasks import run_report_job
+    run_report_job.delay(job_id)
+    return job, True
+
+
+def get_job(job_id):
+    if not job_id:
+        return None
+    return cache.get(_job_key(job_id))
+
+
+def get_result(job_id):
+    """
+    {content_type, filename, payload} of a finished job — for file reports
+    {content_type, filename, path} — or None once expired.
+    """
+    result = cache.get(_result_key(job_id))
+    if result is not None and 'path' in result and not os.path.exists(result['path']):
+        return None
+    return result
+
+
+def _save(job, **fields) -> None:
+    job.update(fields)
+    cache.set(_job_key(job['job_id']), job, timeout=get_report_job_ttl())
+
+
+# ── Worker ────────────────────────────────────────────────────────────────────
+
+def run(job_id) -> str:
+    """
+    Compute a queued job (tasks.run_report_job). A RUNNING job is picked up
+    again — with acks_late that is a redelivery after a worker died mid-run.
+    Reads go to the reporting replica when it is usable (db_router).
+    Returns the final status.
+    """
+    job = get_job(job_id)
+    if job is None:
+        logger.warning(f'Report job {job_id} expired before it ran')
+        return FAILED
+    if job['status'] in (DONE, FAILED):
+        return job['status']
+
+    params = job['params']
+    start, end = _parse(params['from_date']), _parse(params['to_date'])
+    chunks = list(_chunks(start, end, get_report_job_chunk_days()))
+    days = [str(start + datetime.timedelta(days=i)) for i in range((end - start).days + 1)]
+    _save(job, status=RUNNING, progress={'done': 0, 'total': len(chunks)})
+
+    try:
+        with reporting_reads(days):
+            result = _compute(job, get_report(job['report']), params, chunks)
+    except Exception as e:
+        logger.exception(f'Report job {job_id} ({job["report"]}) failed')
+        _save(job, status=FAILED, error=str(e), finished_at=time.time())
+        return FAILED
+
+    cache.set(_result_key(job_id), result, timeout=get_report_job_ttl())
+    _save(job, status=DONE, finished_at=time.time())
+    return DONE
+
+
+def _compute(job, spec, params, chunks) -> dict:
+    from .models import Company
+
+    company = Company.objects.get(pk=job['company_id'])
+    total = len(chunks)
+
+    if spec.render is not None:
+        acc = {}
+        for done, (start, end) in enumerate(chunks, 1):
+            spec.collect(company, params, start, end, acc)
+            _save(job, progress={'done': done, 'total': total})
+        return {
+            'content_type': 'application/json',
+            'filename': None,
+            'payload': spec.render(acc, params),
+        }
+
+    root = get_report_job_file_root()
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"{job['job_id']}.csv.gz")
+    partial = f'{path}.part'
+    try:
+        with gzip.open(partial, 'wt', encoding='utf-8', newline='') as text:
+            writer = csv.writer(text)
+            writer.writerow(spec.columns)
+            for done, (start, end) in enumerate(chunks, 1):
+                spec.collect(company, params, start, end, writer)
+                _save(job, progress={'done': done, 'total': total})
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return {
+        'content_type': 'application/gzip',
+        'filename': spec.filename.format(**params),
+        'path': path,
+    }
+
+
+def cleanup_files(max_age=None) -> int:
+    """
+    Deletes report job files (and abandoned partial files) older than
+    max_age seconds, REPORT_JOB_TTL by default. Returns the number removed.
+    """
+    root = get_report_job_file_root()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - (get_report_job_ttl() if max_age is None else max_age)
+    removed = 0
+    for entry in os.scandir(root):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
@@ -0,0 +1,167 @@
+"""
+ReportShards
+============
+Sharded execution of multi-month range reports. Instead of one scan over the
+whole range, the range is split into shards that are cached on their own, so
+a 90-day report mostly costs the cache lookups plus the shard holding today.
+
+Shards
+  'day'   one shard per date
+  'week'  Mon–Sun weeks, the first and last clipped to the range
+
+  A shard runs the report's collect function
+  (collect(company, params, start, end, acc), see views/apk/reports.py) into
+  an empty dict. Shards cover disjoint dates, so collect functions used here
+  must key acc by date — the shard results are merged with dict.update.
+
+Cache
+  pqr:rshard:<company_pk>:<name>:<start>:<end>:<digest>
+  digest = sha1(key params, report_cache data version of every day in the
+  shard + master version). Only closed shards (ending before today) are
+  stored; a late ingest for a past day bumps that day's version, so its shard
+  is recomputed on the next request. Today's shard always runs.
+
+Execution
+  One MGET for the range's versions, one get_many for the shard entries.
+  Missing shards run concurrently on a process-wide pool of
+  REPORT_SHARD_WORKERS threads (default 4). Django connections are per
+  thread, so each shard queries on its own connection, closed when the shard
+  is done; the caller's db_router context (reporting replica) is carried into
+  the thread. Inside a transaction the shards run inline instead — another
+  connection cannot see its uncommitted rows.
+"""
+
+import contextvars
+import datetime
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from .report_cache import get_data_versions
+
+_SHARD_KEY_PREFIX = 'pqr:rshard:'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_report_shard_workers() -> int:
+    return max(1, int(getattr(settings, 'REPORT_SHARD_WORKERS', 4)))
+
+
+def get_report_shard_ttl() -> int:
+    """Entries are versioned, so the TTL only bounds Redis memory (default 24h)."""
+    return int(getattr(settings, 'REPORT_SHARD_TTL', 86400))
+
+
+def _to_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+
+def _days(start, end):
+    return [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def shards(start, end, size='day'):
+    """[(shard_start, shard_end)] covering start..end in order."""
+    result = []
+    while start <= end:
+        if size == 'week':
+            shard_end = min(start + datetime.timedelta(days=6 - start.weekday()), end)
+        else:
+            shard_end = start
+        result.append((start, shard_end))
+        start = shard_end + datetime.timedelta(days=1)
+    return result
+
+
+def _shard_key(company_id, name, start, end, key_params, versions) -> str:
+    digest = hashlib.sha1(
+        json.dumps([sorted(key_params.items()), versions], default=str, separators=(',', ':')).encode()
+    ).hexdigest()
+    return f'{_SHARD_KEY_PREFIX}{company_id}:{name}:{start}:{end}:{digest}'
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_report_shard_workers(), thread_name_prefix='report-shard',
+            )
+        return _executor
+
+
+def _run_shard(collect, company, params, start, end):
+    try:
+        return collect(company, params, start, end, {})
+    finally:
+        # Pool threads outlive the request — don't leave their connection open.
+        connections.close_all()
+
+
+def _compute(collect, company, params, missing) -> list:
+    if len(missing) == 1 or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return [collect(company, params, start, end, {}) for start, end in missing]
+    futures = [
+        _pool().submit(contextvars.copy_context().run, _run_shard, collect, company, params, start, end)
+        for start, end in missing
+    ]
+    return [f.result() for f in futures]
+
+
+def collect_sharded(name, collect, company, params, from_date, to_date, size='week', key_params=(), acc=None):
+    """
+    Run collect over from_date..to_date shard by shard and merge into acc.
+    name       — cache namespace (one per collect function)
+    key_params — the params collect actually reads; they go into the shard key
+    Dates may be date objects or YYYY-MM-DD strings (ValueError if invalid).
+    Returns acc.
+    """
+    acc = {} if acc is None else acc
+    start, end = _to_date(from_date), _to_date(to_date)
+    if end < start:
+        return acc
+
+    parts = shards(start, end, size)
+    days = [str(d) for d in _days(start, end)]
+    *day_versions, master = get_data_versions(company.pk, days)
+    versions = dict(zip(days, day_versions))
+    key_values = {p: params.get(p) for p in key_params}
+    today = timezone.localdate()
+
+    keys = {}
+    for shard_start, shard_end in parts:
+        if shard_end < today:
+            shard_versions = [versions[str(d)] for d in _days(shard_start, shard_end)] + [master]
+            keys[(shard_start, shard_end)] = _shard_key(
+                company.pk, name, shard_start, shard_end, key_values, shard_versions,
+            )
+    found = cache.get_many(list(keys.values())) if keys else {}
+
+    results = {}
+    missing = []
+    for part in parts:
+        key = keys.get(part)
+        if key is not None and key in found:
+            results[part] = found[key]
+        else:
+            missing.append(part)
+
+    computed = dict(zip(missing, _compute(collect, company, params, missing)))
+    to_store = {keys[part]: result for part, result in computed.items() if part in keys}
+    if to_store:
+        cache.set_many(to_store, timeout=get_report_shard_ttl())
+    results.update(computed)
+
+    for part in parts:
+        acc.update(results[part])
+    return acc
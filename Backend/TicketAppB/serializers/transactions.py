@@ -99,18 +99,28 @@ class TicketDataSerializer(serializers.ModelSerializer):
             return obj.to_stage_id.stage.stage_name
         return obj.to_stage
 
+    # trip_no / schedule_no / route_code / depot are stamped on the ticket at
+    # ingest; the joins below are only for rows written before that.
     def get_trip_no(self, obj):
+        if obj.trip_no is not None:
+            return obj.trip_no
         return obj.trip_id.trip_no if obj.trip_id else None
 
     def get_schedule_no(self, obj):
+        if obj.schedule_no is not None:
+            return obj.schedule_no
         return obj.schedule_id.schedule_no if obj.schedule_id else None
 
     def get_route_code(self, obj):
+        if obj.route_code:
+            return obj.route_code
         if obj.route_id:
             return obj.route_id.route_code
         return None
 
     def get_depot_code(self, obj):
+        if obj.depot_id_id:
+            return obj.depot_id.depot_code
         if not obj.route_id:
             return None
         rd = obj.route_id.route_depots.first()
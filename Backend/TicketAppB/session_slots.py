@@ -0,0 +1,224 @@
+"""
+SessionSlots
+============
+Active-session counts per company and tier for the login slot limits
+(Company.total_user_count / premium_user_count / intermediate_user_count),
+kept in Redis so login and device approval run no COUNT(*) over UserSession.
+
+Redis
+  pqr:sessions:<company_pk>:all           set of active session_uids
+  pqr:sessions:<company_pk>:premium       … of premium users
+  pqr:sessions:<company_pk>:intermediate  … of intermediate users
+  pqr:sessions:<company_pk>:ready         present once the sets were built
+
+  Sets rather than INCR/DECR counters: a session deactivated twice (sweep
+  and expiry listener, or kill after a sweep) is only removed once.
+
+  reserve() checks the limits and adds the new session in one Lua script, so
+  two logins racing for the last slot can't both get it. A company without
+  the ready marker (first use, Redis restart) is rebuilt from the DB first.
+
+Maintenance
+  Added on login (reserve), removed wherever sessions are deactivated
+  (kill_session, cascades, password reset, sweeper / expiry listener).
+  tasks.reconcile_session_slots rebuilds every company from the DB every
+  10 minutes, correcting drift such as a tier change on a logged-in user.
+
+Without django-redis (tests, local dev) the counts come from one grouped
+query, as before.
+"""
+
+from collections import defaultdict
+
+from django.db.models import Count, Q
+
+from .models import Company, UserSession, UserTier
+
+_KEY_PREFIX = 'pqr:sessions:'
+_TRACKED_TIERS = (UserTier.PREMIUM, UserTier.INTERMEDIATE)
+
+# reserve() / check() results
+TOTAL_FULL = 'total'
+PREMIUM_FULL = 'premium'
+INTERMEDIATE_FULL = 'intermediate'
+
+# KEYS: all, tier set (or all again when the tier isn't limited), ready marker
+# ARGV: session_uid, total limit, tier limit (0 = unlimited), enforce (1/0)
+# Returns -1 not built, 0 added, 1 total full, 2 tier full
+_RESERVE_LUA = """
+if redis.call('EXISTS', KEYS[3]) == 0 then
+  return -1
+end
+if ARGV[4] == '1' then
+  local total, tier = tonumber(ARGV[2]), tonumber(ARGV[3])
+  if total > 0 and redis.call('SCARD', KEYS[1]) >= total then
+    return 1
+  end
+  if tier > 0 and redis.call('SCARD', KEYS[2]) >= tier then
+    return 2
+  end
+end
+redis.call('SADD', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[1])
+return 0
+"""
+
+_reserve_script = None
+
+
+def _redis():
+    """Raw client, or None when the cache isn't django-redis."""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def _key(company_id, name) -> str:
+    return f'{_KEY_PREFIX}{company_id}:{name}'
+
+
+def _limits(company, tier):
+    """(total limit, tier limit, tier set name or None) — 0 means no limit."""
+    if tier == UserTier.PREMIUM:
+        return company.total_user_count or 0, company.premium_user_count or 0, 'premium'
+    if tier == UserTier.INTERMEDIATE:
+        return company.total_user_count or 0, company.intermediate_user_count or 0, 'intermediate'
+    return company.total_user_count or 0, 0, None
+
+
+def _full(counts, company, tier):
+    total_limit, tier_limit, tier_name = _limits(company, tier)
+    if total_limit and counts['all'] >= total_limit:
+        return TOTAL_FULL
+    if tier_limit and counts[tier_name] >= tier_limit:
+        return tier_name
+    return None
+
+
+def _db_counts(company_id) -> dict:
+    return UserSession.objects.filter(
+        user__company_id=company_id, is_active=True,
+    ).aggregate(
+        all=Count('id'),
+        premium=Count('id', filter=Q(user__tier=UserTier.PREMIUM)),
+        intermediate=Count('id', filter=Q(user__tier=UserTier.INTERMEDIATE)),
+    )
+
+
+# ── Build ─────────────────────────────────────────────────────────────────────
+
+def _write(pipe, company_id, sessions) -> None:
+    """Queue the replacement of one company's sets; sessions = [(uid, tier)]."""
+    names = ('all',) + tuple(str(t) for t in _TRACKED_TIERS)
+    pipe.delete(*[_key(company_id, n) for n in names])
+    members = defaultdict(list)
+    for uid, tier in sessions:
+        members['all'].append(str(uid))
+        if tier in _TRACKED_TIERS:
+            members[str(tier)].append(str(uid))
+    for name, uids in members.items():
+        pipe.sadd(_key(company_id, name), *uids)
+    pipe.set(_key(company_id, 'ready'), 1)
+
+
+def rebuild(company_id) -> None:
+    client = _redis()
+    if client is None:
+        return
+    sessions = UserSession.objects.filter(
+        user__company_id=company_id, is_active=True,
+    ).values_list('session_uid', 'user__tier')
+    pipe = client.pipeline(transaction=True)
+    _write(pipe, company_id, sessions)
+    pipe.execute()
+
+
+def reconcile() -> int:
+    """Rebuild every company's sets from one query over active sessions. Returns companies written."""
+    client = _redis()
+    if client is None:
+        return 0
+    by_company = defaultdict(list)
+    for company_id, uid, tier in UserSession.objects.filter(
+        is_active=True, user__company__isnull=False,
+    ).values_list('user__company_id', 'session_uid', 'user__tier'):
+        by_company[company_id].append((uid, tier))
+
+    company_ids = list(Company.objects.values_list('pk', flat=True))
+    for i in range(0, len(company_ids), 200):
+        pipe = client.pipeline(transaction=True)
+        for company_id in company_ids[i:i + 200]:
+            _write(pipe, company_id, by_company.get(company_id, ()))
+        pipe.execute()
+    return len(company_ids)
+
+
+# ── Public ────────────────────────────────────────────────────────────────────
+
+def counts(company) -> dict:
+    """{'all', 'premium', 'intermediate'} active sessions for the company."""
+    client = _redis()
+    if client is None:
+        return _db_counts(company.pk)
+    if not client.exists(_key(company.pk, 'ready')):
+        rebuild(company.pk)
+    pipe = client.pipeline(transaction=False)
+    for name in ('all', 'premium', 'intermediate'):
+        pipe.scard(_key(company.pk, name))
+    return dict(zip(('all', 'premium', 'intermediate'), pipe.execute()))
+
+
+def check(company, tier):
+    """TOTAL_FULL / PREMIUM_FULL / INTERMEDIATE_FULL if a new session wouldn't fit, else None."""
+    return _full(counts(company), company, tier)
+
+
+def reserve(company, tier, session_uid, enforce=True):
+    """
+    Take a slot for a new session (call before creating the UserSession).
+    enforce=False only records it — company admins count towards the total
+    but are never refused. Returns None on success or the *_FULL reason.
+    """
+    client = _redis()
+    if client is None:
+        return _full(_db_counts(company.pk), company, tier) if enforce else None
+
+    global _reserve_script
+    if _reserve_script is None:
+        _reserve_script = client.register_script(_RESERVE_LUA)
+    total_limit, tier_limit, tier_name = _limits(company, tier)
+    keys = [
+        _key(company.pk, 'all'),
+        _key(company.pk, tier_name or 'all'),
+        _key(company.pk, 'ready'),
+    ]
+    args = [str(session_uid), total_limit, tier_limit, 1 if enforce else 0]
+    result = _reserve_script(keys=keys, args=args)
+    if result == -1:
+        rebuild(company.pk)
+        result = _reserve_script(keys=keys, args=args)
+    return {1: TOTAL_FULL, 2: tier_name}.get(result)
+
+
+def release(company_id, session_uids) -> None:
+    """Remove deactivated sessions from the company's sets."""
+    uids = [str(u) for u in session_uids]
+    client = _redis()
+    if client is None or not company_id or not uids:
+        return
+    pipe = client.pipeline(transaction=False)
+    for name in ('all', 'premium', 'intermediate'):
+        pipe.srem(_key(company_id, name), *uids)
+    pipe.execute()
+
+
+def release_rows(rows) -> None:
+    """release() for [(session_uid, company_id)] rows spanning companies."""
+    by_company = defaultdict(list)
+    for uid, company_id in rows:
+        if company_id:
+            by_company[company_id].append(uid)
+    for company_id, uids in by_company.items():
+        release(company_id, uids)
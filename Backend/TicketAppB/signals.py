@@ -1,13 +1,44 @@
+import logging
+
+from django.conf import settings
 from django.utils import timezone
+from django.db import transaction
 from django.dispatch import receiver
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.contrib.auth import get_user_model
-from .models import Route, Fare, Company, Dealer, UserSession
-from .authentication import delete_session_cache, set_session_revoked
+from .models import (
+    Route, Fare, Company, Dealer, UserSession,
+    VehicleType, Stage, RouteStage, RouteDepot, Depot, ExpenseData,
+    AggregatorTransaction, ETMDevice, CustomUser,
+)
+from .authentication import kill_sessions
+from .report_cache import bump_data_version, bump_master_version
+from . import dashboard_counters, principal_cache
+
+logger = logging.getLogger(__name__)
 
 
 # COMPANY / DEALER ACTIVE STATUS CASCADE
 
+def _kill_entity_sessions(field, pk):
+    """
+    Kill every active session of a deactivated company's / dealer's users.
+    Up to SESSION_REVOKE_ASYNC_THRESHOLD sessions are killed in the request
+    (kill_sessions — a few bulk round trips); larger sets go to Celery after
+    commit. Those users are already locked out meanwhile: the cascade made
+    them inactive and principal_cache drops their snapshots.
+    """
+    sessions = UserSession.objects.filter(**{f'user__{field}': pk}, is_active=True)
+    if sessions.count() > int(getattr(settings, 'SESSION_REVOKE_ASYNC_THRESHOLD', 200)):
+        from .tasks import kill_entity_sessions
+        transaction.on_commit(lambda: kill_entity_sessions.delay(field, pk))
+        logger.info(f"Queued session revocation for {field} pk={pk}")
+        return
+    killed = kill_sessions(sessions)
+    if killed:
+        logger.info(f"Killed {killed} session(s) for deactivated {field} pk={pk}")
+
+
 @receiver(post_save, sender=Company)
 def cascade_company_active_status(sender, instance, created, **kwargs):
     if created:
@@ -21,15 +52,7 @@ def cascade_company_active_status(sender, instance, created, **kwargs):
     # sessions still appear as active in the admin session listing and can generate
     # confusing audit noise. Killing them here makes deactivation clean and instant.
     if not instance.is_active:
-        active_sessions = UserSession.objects.filter(
-            user__company=instance, is_active=True,
-        )
-        session_uids = list(active_sessions.values_list('session_uid', flat=True))
-        active_sessions.update(is_active=False)
-        for uid in session_uids:
-            uid_str = str(uid)
-            set_session_revoked(uid_str)
-            delete_session_cache(uid_str)
+        _kill_entity_sessions('company', instance.pk)
 
 
 @receiver(post_save, sender=Dealer)
@@ -41,15 +64,31 @@ def cascade_dealer_active_status(sender, instance, created, **kwargs):
 
     # Fix 3: same as company cascade — kill sessions immediately on deactivation.
     if not instance.is_active:
-        active_sessions = UserSession.objects.filter(
-            user__dealer=instance, is_active=True,
-        )
-        session_uids = list(active_sessions.values_list('session_uid', flat=True))
-        active_sessions.update(is_active=False)
-        for uid in session_uids:
-            uid_str = str(uid)
-            set_session_revoked(uid_str)
-            delete_session_cache(uid_str)
+        _kill_entity_sessions('dealer', instance.pk)
+
+
+# PRINCIPAL CACHE INVALIDATION
+# SessionAuthentication serves request.user from a snapshot of the user,
+# company and dealer rows (principal_cache). Any save or delete of one of them
+# drops the snapshots built on it — including the bulk user updates in the
+# cascades above, which a user-level signal would never see.
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_principal_on_user_change(sender, instance, **kwargs):
+    principal_cache.bump_user(instance.pk)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_principal_on_company_change(sender, instance, **kwargs):
+    principal_cache.bump_company(instance.pk)
+
+
+@receiver(post_save, sender=Dealer)
+@receiver(post_delete, sender=Dealer)
+def invalidate_principal_on_dealer_change(sender, instance, **kwargs):
+    principal_cache.bump_dealer(instance.pk)
 
 
 # ROUTE SIGNALS
@@ -104,4 +143,74 @@ def sync_fare_route_name(sender, instance, created, **kwargs):
         )
         print(f"✅ Synced route_name '{instance.route_name}' across {updated_count} Fare records")
     else:
-        print(f"ℹ️ Route name unchanged - no Fare records updated")
\ No newline at end of file
+        print(f"ℹ️ Route name unchanged - no Fare records updated")
+
+
+# REPORT CACHE INVALIDATION
+# Reports show bus numbers, route/stage names and depot names — any change to
+# those invalidates every cached report for the company. Expense rows and
+# aggregator settlements are written outside the ingest tasks, so they bump
+# their own date here.
+
+@receiver(post_save, sender=VehicleType)
+@receiver(post_delete, sender=VehicleType)
+@receiver(post_save, sender=Stage)
+@receiver(post_delete, sender=Stage)
+@receiver(post_save, sender=Route)
+@receiver(post_delete, sender=Route)
+@receiver(post_save, sender=RouteStage)
+@receiver(post_delete, sender=RouteStage)
+@receiver(post_save, sender=RouteDepot)
+@receiver(post_delete, sender=RouteDepot)
+@receiver(post_save, sender=Depot)
+@receiver(post_delete, sender=Depot)
+def invalidate_report_cache_on_master_change(sender, instance, **kwargs):
+    bump_master_version(instance.company_id)
+
+
+@receiver(post_save, sender=ExpenseData)
+@receiver(post_delete, sender=ExpenseData)
+def invalidate_report_cache_on_expense(sender, instance, **kwargs):
+    bump_data_version(instance.company_code_id, instance.expense_date)
+
+
+@receiver(post_save, sender=AggregatorTransaction)
+def invalidate_report_cache_on_settlement(sender, instance, **kwargs):
+    bump_data_version(instance.company_id, instance.transaction_date)
+
+
+# DASHBOARD COUNTERS
+# Admin/dealer/executive dashboards read DashboardCounter instead of counting
+# the registry tables. pre_save captures the stored status fields, post_save
+# and post_delete move the row's contribution (see dashboard_counters.py).
+
+_COUNTER_KINDS = {Company: 'company', Dealer: 'dealer', ETMDevice: 'device', CustomUser: 'user'}
+
+
+@receiver(pre_save, sender=Company)
+@receiver(pre_save, sender=Dealer)
+@receiver(pre_save, sender=ETMDevice)
+@receiver(pre_save, sender=CustomUser)
+def capture_counter_state(sender, instance, update_fields=None, **kwargs):
+    instance._counter_state = dashboard_counters.stored_state(
+        _COUNTER_KINDS[sender], instance, update_fields,
+    )
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Dealer)
+@receiver(post_save, sender=ETMDevice)
+@receiver(post_save, sender=CustomUser)
+def update_counters_on_save(sender, instance, created, **kwargs):
+    kind = _COUNTER_KINDS[sender]
+    old_state = None if created else getattr(instance, '_counter_state', None)
+    dashboard_counters.apply_change(kind, old_state, dashboard_counters.state_of(kind, instance))
+
+
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Dealer)
+@receiver(post_delete, sender=ETMDevice)
+@receiver(post_delete, sender=CustomUser)
+def update_counters_on_delete(sender, instance, **kwargs):
+    kind = _COUNTER_KINDS[sender]
+    dashboard_counters.apply_change(kind, dashboard_counters.state_of(kind, instance), None)
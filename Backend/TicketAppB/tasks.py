@@ -1,15 +1,19 @@
 from celery import shared_task
+from django.conf import settings
 from django.db import IntegrityError, transaction
 from django.db.models import Q
 from django.utils import timezone
 from decimal import Decimal, ROUND_HALF_UP
 from datetime import datetime, timedelta, date, time
 from .models import (
-    RawDataLog, TransactionData, Direction, RouteStage,
+    RawDataLog, TransactionData, Direction, RouteStage, RouteDepot,
     ScheduleData, TripData, Employee, VehicleType,
     ETMDevice, DeviceRejectionLog, Company, AggregatorTransaction,
 )
 from .views.utils import _get_route_for_palmtec
+from .report_cache import bump_data_version
+from .live_events import publish_row
+from . import od_matrix
 
 
 
@@ -19,6 +23,21 @@ def _fail(log, msg):
     log.save()
 
 
+def _freeze_od_matrix(trip, route):
+    # Trip closed: rebuild its OD matrix from the tickets once and mark it
+    # final, so any increment lost to a crashed worker is corrected here.
+    route_id = trip.route_id_id or (route.pk if route else None)
+    stage_count = RouteStage.objects.filter(route_id=route_id).count() if route_id else 0
+    od_matrix.rebuild(trip, stage_count=stage_count, freeze=True)
+
+
+def _bump_report_versions(company, *days):
+    # Invalidate cached reports for every date this record touches — after
+    # commit, so a report rebuilt on the new version always sees the new rows.
+    company_id = company.id
+    transaction.on_commit(lambda: bump_data_version(company_id, *days))
+
+
 def _parse_date(s, fmt="%Y-%m-%d"):
     """Parse date string; corrects 2-digit year stored as %04d (e.g. 0026 → 2026)."""
     if not s:
@@ -113,6 +132,13 @@ def _resolve_vehicle(bus_reg_num, company_id):
     ).first()
 
 
+def _resolve_route_depot_id(route):
+    # Same depot TicketDataSerializer used to show: the route's first mapping.
+    if not route:
+        return None
+    return RouteDepot.objects.filter(route=route).order_by('pk').values_list('depot_id', flat=True).first()
+
+
 def _get_or_create_ghost_schedule(palmtec_id, company, schedule_no, schedule_start_date,
                                    schedule_start_time, ghost_note):
     """
@@ -407,12 +433,17 @@ def process_transaction_data(self, log_id):
 
             try:
                 with transaction.atomic():
-                    TransactionData.objects.create(
+                    ticket = TransactionData.objects.create(
                         unique_code          = _p(1),
                         palmtec_id           = _p(2),
                         route_id             = route,
                         trip_id              = trip_obj,
                         schedule_id          = schedule_obj,
+                        schedule_start_date  = schedule_obj.start_date if schedule_obj else schedule_start_date,
+                        schedule_no          = schedule_obj.schedule_no if schedule_obj else schedule_no,
+                        trip_no              = trip_no,
+                        route_code           = route.route_code,
+                        depot_id_id          = _resolve_route_depot_id(route),
                         ticket_number        = _p(5),
                         ticket_date          = ticket_date,
                         ticket_time          = ticket_time,
@@ -468,6 +499,17 @@ def process_transaction_data(self, log_id):
                 log.save()
                 return
 
+            # Stage-wise OD counts for the trip — buffered in Redis and folded
+            # into the matrix by fold_od_matrix_increments, so parallel
+            # workers on the same trip never wait on its row.
+            od_matrix.add_ticket(
+                trip_obj, from_raw, to_raw,
+                (full_count, half_count, st_count, phy_count, lugg_count, ladies_count, senior_count),
+                stage_count=len(stages),
+            )
+
+            publish_row('ticket', ticket)
+            _bump_report_versions(company, ticket_date, schedule_start_date, trip_start_date)
             log.status = RawDataLog.statusChoices.PROCESSED
             log.processed_at = timezone.now()
             log.save()
@@ -609,7 +651,7 @@ def process_trip_open_data(self, log_id):
             else:
                 try:
                     with transaction.atomic():
-                        TripData.objects.create(
+                        existing = TripData.objects.create(
                             open_unique_code    = _p(1),
                             palmtec_id          = _p(2),
                             route_id            = route,
@@ -639,6 +681,8 @@ def process_trip_open_data(self, log_id):
                     log.save()
                     return
 
+            publish_row('trip', existing)
+            _bump_report_versions(company, start_date, schedule_start_date)
             log.status = RawDataLog.statusChoices.PROCESSED
             log.processed_at = timezone.now()
             log.save()
@@ -800,7 +844,7 @@ def process_trip_close_data(self, log_id):
             else:
                 try:
                     with transaction.atomic():
-                        TripData.objects.create(
+                        existing = TripData.objects.create(
                             palmtec_id          = _p(2),
                             route_id            = route,
                             trip_no             = trip_no,
@@ -818,6 +862,9 @@ def process_trip_close_data(self, log_id):
                     log.save()
                     return
 
+            _freeze_od_matrix(existing, route)
+            publish_row('trip', existing)
+            _bump_report_versions(company, start_date, end_date, schedule_start_date)
             log.status = RawDataLog.statusChoices.PROCESSED
             log.processed_at = timezone.now()
             log.save()
@@ -926,7 +973,7 @@ def process_schedule_open_data(self, log_id):
             else:
                 try:
                     with transaction.atomic():
-                        ScheduleData.objects.create(
+                        existing = ScheduleData.objects.create(
                             open_unique_code  = _p(1),
                             palmtec_id        = _p(2),
                             schedule_no       = schedule_no,
@@ -950,6 +997,8 @@ def process_schedule_open_data(self, log_id):
                     log.save()
                     return
 
+            publish_row('schedule', existing)
+            _bump_report_versions(company, start_date)
             log.status = RawDataLog.statusChoices.PROCESSED
             log.processed_at = timezone.now()
             log.save()
@@ -1102,7 +1151,7 @@ def process_schedule_close_data(self, log_id):
                 # Ghost: ShdCls arrived without ShdOpn
                 try:
                     with transaction.atomic():
-                        ScheduleData.objects.create(
+                        existing = ScheduleData.objects.create(
                             palmtec_id  = _p(2),
                             schedule_no = schedule_no,
                             start_date  = schedule_start_date,
@@ -1122,6 +1171,8 @@ def process_schedule_close_data(self, log_id):
                     log.save()
                     return
 
+            publish_row('schedule', existing)
+            _bump_report_versions(company, schedule_start_date, end_date)
             log.status = RawDataLog.statusChoices.PROCESSED
             log.processed_at = timezone.now()
             log.save()
@@ -1268,7 +1319,7 @@ def process_trip_close_summary_data(self, log_id):
             else:
                 try:
                     with transaction.atomic():
-                        TripData.objects.create(
+                        existing = TripData.objects.create(
                             palmtec_id   = _p(2),
                             route_id     = route,
                             trip_no      = trip_no,
@@ -1286,6 +1337,9 @@ def process_trip_close_summary_data(self, log_id):
                     log.save()
                     return
 
+            _freeze_od_matrix(existing, route)
+            publish_row('trip', existing)
+            _bump_report_versions(company, start_date, end_date, schedule_start_date)
             log.status = RawDataLog.statusChoices.PROCESSED
             log.processed_at = timezone.now()
             log.save()
@@ -1420,7 +1474,7 @@ def process_schedule_close_summary_data(self, log_id):
             else:
                 try:
                     with transaction.atomic():
-                        ScheduleData.objects.create(
+                        existing = ScheduleData.objects.create(
                             palmtec_id  = _p(2),
                             schedule_no = schedule_no,
                             start_date  = schedule_start_date,
@@ -1440,6 +1494,8 @@ def process_schedule_close_summary_data(self, log_id):
                     log.save()
                     return
 
+            publish_row('schedule', existing)
+            _bump_report_versions(company, schedule_start_date, end_date)
             log.status = RawDataLog.statusChoices.PROCESSED
             log.processed_at = timezone.now()
             log.save()
@@ -1500,9 +1556,132 @@ def cleanup_processed_raw_logs():
     return deleted_count
 
 
+@shared_task
+def warm_dashboard_snapshots():
+    """
+    Beat task. Rebuilds today's company dashboard snapshot for every company
+    with an active login, so admins landing on the dashboard hit the cache.
+    Runs a little more often than DASHBOARD_SNAPSHOT_TTL.
+    """
+    from .models import Company, UserSession
+    from .dashboard_snapshot import warm_snapshot
+    from .db_router import reporting_reads
+
+    today = timezone.localdate()
+    company_ids = UserSession.objects.filter(
+        is_active=True,
+        user__company__isnull=False,
+    ).values_list('user__company', flat=True).distinct()
+
+    warmed = 0
+    with reporting_reads([str(today)]):
+        for company in Company.objects.filter(id__in=list(company_ids)):
+            if warm_snapshot(company, today):
+                warmed += 1
+    return warmed
+
+
+@shared_task
+def reconcile_dashboard_counters():
+    """
+    Beat task. Recomputes the superadmin/dealer/executive dashboard counters
+    from Company, Dealer, ETMDevice and CustomUser and fixes any drift.
+    Returns the number of counter rows that were wrong.
+    """
+    from .dashboard_counters import recount
+
+    return recount()
+
+
+@shared_task
+def run_report_job(job_id):
+    """
+    Computes a background report job submitted through reports/jobs, writing
+    progress and the result to Redis, file reports to REPORT_JOB_FILE_ROOT
+    (see report_jobs.py).
+    """
+    from .report_jobs import run
+
+    return run(job_id)
+
+
+@shared_task
+def fold_od_matrix_increments():
+    """
+    Beat task. Folds the OD counts buffered by ticket ingest into each trip's
+    TripODMatrix, one locked update per trip (see od_matrix.fold_pending).
+    """
+    return od_matrix.fold_pending()
+
+
+@shared_task
+def cleanup_report_job_files():
+    """
+    Beat task. Deletes report job files older than REPORT_JOB_TTL — their
+    Redis entries have expired by then (see report_jobs.py).
+    """
+    from .report_jobs import cleanup_files
+
+    return cleanup_files()
+
+
+@shared_task
+def write_replication_heartbeat():
+    """
+    Beat task. Stamps the primary's ReplicationHeartbeat row; db_router reads
+    it back from the reporting replica to measure replication lag.
+    """
+    from .db_router import reporting_configured
+    from .models import ReplicationHeartbeat
+
+    if not reporting_configured():
+        return None
+    ReplicationHeartbeat.objects.update_or_create(pk=1, defaults={'beat_at': timezone.now()})
+    return True
+
+
+@shared_task
+def archive_ticket_days():
+    """
+    Beat task (nightly). Moves closed company-days older than
+    TICKET_ARCHIVE_AFTER_DAYS out of transaction_data into the columnar
+    archive (see ticket_archive.py). Returns the number of tickets moved.
+    """
+    from .ticket_archive import archive_due
+
+    return archive_due()
+
+
 import logging as _logging
 _sweep_logger = _logging.getLogger(__name__)
 
+_SWEEP_CHUNK = 1000
+
+# Sessions younger than this are skipped: login writes the DB row just before
+# the Redis key, and the sweep must not catch a session in between.
+_SWEEP_MIN_AGE_SECONDS = 60
+
+
+def deactivate_sessions(session_uids) -> int:
+    """
+    Mark the given sessions inactive in the DB and free their login slots.
+    Returns rows updated.
+    """
+    from .models import UserSession
+    from . import session_slots
+
+    rows = list(UserSession.objects.filter(
+        session_uid__in=list(session_uids), is_active=True,
+    ).values_list('session_uid', 'user__company_id'))
+    if not rows:
+        return 0
+    updated = UserSession.objects.filter(
+        session_uid__in=[uid for uid, _ in rows], is_active=True,
+    ).update(is_active=False)
+    session_slots.release_rows(rows)
+    return updated
+
+
 @shared_task
 def sweep_stale_sessions():
     """
@@ -1510,55 +1689,156 @@ def sweep_stale_sessions():
     cache key no longer exists has expired naturally (TTL elapsed) or was
     force-logged out. Mark those sessions inactive in the DB so the admin
     session listing stays accurate.
+
+    Active sessions are walked in primary-key order, _SWEEP_CHUNK at a time;
+    each chunk is one pipelined EXISTS batch and at most one UPDATE. With
+    `manage.py listen_session_expiry` running, most sessions are already
+    deactivated when their key expires and this is only the safety net.
     """
-    from django.core.cache import cache
     from .models import UserSession
-    from .authentication import _CACHE_KEY_PREFIX
+    from .authentication import live_session_uids
+
+    cutoff = timezone.now() - timedelta(seconds=_SWEEP_MIN_AGE_SECONDS)
+    last_pk = 0
+    updated = 0
+    while True:
+        chunk = list(
+            UserSession.objects.filter(
+                is_active=True, pk__gt=last_pk, created_at__lt=cutoff,
+            ).order_by('pk').values_list('pk', 'session_uid')[:_SWEEP_CHUNK]
+        )
+        if not chunk:
+            break
+        last_pk = chunk[-1][0]
+        live = live_session_uids(uid for _, uid in chunk)
+        stale = [uid for _, uid in chunk if str(uid) not in live]
+        if stale:
+            updated += deactivate_sessions(stale)
+
+    if updated:
+        _sweep_logger.info(f'sweep_stale_sessions: marked {updated} sessions inactive.')
 
-    active_sessions = UserSession.objects.filter(is_active=True).values_list(
-        'session_uid', flat=True,
-    )
 
-    stale_ids = []
-    for session_uid in active_sessions:
-        key = f'{_CACHE_KEY_PREFIX}{session_uid}'
-        if not cache.get(key):
-            stale_ids.append(session_uid)
+@shared_task
+def kill_entity_sessions(field: str, pk: int) -> int:
+    """
+    Kill all active sessions of a deactivated company's or dealer's users
+    (field = 'company' | 'dealer'). Queued by the deactivation cascade in
+    signals.py for large session sets. Returns the number killed.
+    """
+    from .models import UserSession
+    from .authentication import kill_sessions
+
+    killed = kill_sessions(UserSession.objects.filter(**{f'user__{field}': pk}))
+    _sweep_logger.info(f'kill_entity_sessions: killed {killed} sessions for {field} pk={pk}.')
+    return killed
+
+
+@shared_task
+def reconcile_session_slots():
+    """Rebuild the Redis login-slot sets from the DB (see session_slots)."""
+    from . import session_slots
+
+    session_slots.reconcile()
 
-    if stale_ids:
-        updated = UserSession.objects.filter(session_uid__in=stale_ids).update(
-            is_active=False,
-        )
-        _sweep_logger.info(f'sweep_stale_sessions: marked {updated} sessions inactive.')
+
+@shared_task
+def flush_session_last_seen():
+    """
+    Write the last-seen stamps buffered in Redis by SessionAuthentication to
+    UserSession.last_seen_at in bulk (see authentication.flush_last_seen).
+    """
+    from .authentication import flush_last_seen
+
+    updated = flush_last_seen()
+    if updated:
+        _sweep_logger.info(f'flush_session_last_seen: updated {updated} sessions.')
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # License server polling
 # Moved from company.py threading.Thread to Celery.
-# Called via .delay(company_id) from validate_company_license view.
-# Retries up to 3 times on unexpected failure (not on deliberate status resets).
+# Called via .delay(company_id, 0) from validate_company_license view.
+# Each run makes one check and re-schedules itself with a countdown while the
+# license is still pending — no worker sleeps waiting on the license server.
+# State lives on the Company row: authentication_status (VALIDATING while the
+# poll runs), license_poll_started_at (deadline) and license_poll_attempts
+# (the step the live task chain owns).
 # ─────────────────────────────────────────────────────────────────────────────
 
 import logging as _license_logger
 _lic_log = logging.getLogger(__name__) if 'logging' in dir() else __import__('logging').getLogger(__name__)
 
 
-@shared_task(bind=True, max_retries=3)
-def poll_company_license(self, company_id: int) -> None:
-    """
-    Poll the external license server for a company and update its status.
-    Replaces the background threading.Thread in validate_company_license view.
+def _apply_license_approval(company, auth_data, log) -> bool:
+    """Copy the approved license onto company (not saved). False on a count config error."""
+    from .views.web.company import _parse_license_date
 
-    On Celery worker restart mid-poll: the task is re-queued from the broker
-    (unlike a daemon thread which dies silently on process exit). The `finally`
-    block resets VALIDATING → PENDING so the company is never stuck.
+    def _safe_int(val, default=0):
+        try:
+            return int(val or default)
+        except (ValueError, TypeError):
+            return default
+
+    number_of_licences      = _safe_int(auth_data.get('NumberOfLicence'))
+    palmtec_count           = _safe_int(auth_data.get('PalmtecCount'))
+    total_user_count        = _safe_int(auth_data.get('TotalUserCount'))
+    premium_user_count      = _safe_int(auth_data.get('PremiumUserCount'))
+    intermediate_user_count = _safe_int(auth_data.get('IntermediateUserCount'))
+
+    if number_of_licences > 0 and (palmtec_count + total_user_count) > number_of_licences:
+        log.error(
+            f'[poll_company_license] License config error for {company.company_name}: '
+            f'palmtec({palmtec_count}) + users({total_user_count}) > '
+            f'NumberOfLicence({number_of_licences})'
+        )
+        company.authentication_status = Company.AuthStatus.PENDING
+        company.error_message = (
+            f'License config error: device slots ({palmtec_count}) + '
+            f'user slots ({total_user_count}) = {palmtec_count + total_user_count} '
+            f'exceeds total licensed units ({number_of_licences}). '
+            'Contact the license server administrator.'
+        )
+        return False
+
+    company.authentication_status    = Company.AuthStatus.APPROVED
+    company.is_active                = True
+    company.product_registration_id = auth_data.get('ProductRegistrationId')
+    company.unique_identifier        = auth_data.get('UniqueIDentifier')
+    company.product_from_date        = _parse_license_date(auth_data.get('ProductFromDate'))
+    company.product_to_date          = _parse_license_date(auth_data.get('ProductToDate'))
+    company.number_of_licences       = number_of_licences
+    company.palmtec_count            = palmtec_count
+    company.total_user_count         = total_user_count
+    company.premium_user_count       = premium_user_count
+    company.intermediate_user_count  = intermediate_user_count
+    company.error_message            = None
+    return True
+
+
+@shared_task
+def poll_company_license(company_id: int, attempt: int = 0) -> None:
+    """
+    One step of license validation for a company: check the license server
+    once, then either record the outcome or re-schedule the next step after
+    LICENSE_POLL_INTERVAL_SECONDS.
+
+    Stops (status → PENDING) once LICENSE_POLL_TIMEOUT_SECONDS have passed
+    since validation started, or on a non-retryable error. Connection errors,
+    timeouts and 5xx are retried until then; while the license client's
+    circuit breaker is open the step waits out the cooldown instead.
+
+    A step only continues while the company is still VALIDATING and its
+    license_poll_attempts equals `attempt` — the conditional update that
+    advances it means a duplicate or superseded chain stops at its next step.
     """
     import logging
     log = logging.getLogger(__name__)
 
-    from .views.web.company import poll_license_authentication, _parse_license_date
-
-    log.info(f'[poll_company_license] Starting for company_id={company_id}')
+    from . import license_client
+    from .views.web.company import (
+        check_license_authentication, get_license_poll_interval, get_license_poll_timeout,
+    )
 
     try:
         company = Company.objects.get(id=company_id)
@@ -1566,86 +1846,66 @@ def poll_company_license(self, company_id: int) -> None:
         log.error(f'[poll_company_license] Company {company_id} not found — aborting')
         return
 
-    try:
-        auth_result = poll_license_authentication(company.company_id)
+    if (company.authentication_status != Company.AuthStatus.VALIDATING
+            or company.license_poll_attempts != attempt):
+        log.info(f'[poll_company_license] Company {company_id} step {attempt} superseded — stopping')
+        return
 
-        if not auth_result['success']:
-            log.error(f'[poll_company_license] Polling failed for {company_id}: {auth_result.get("error")}')
-            company.authentication_status = Company.AuthStatus.PENDING
-            company.save(update_fields=['authentication_status'])
-            return
+    def _give_up(reason):
+        log.error(f'[poll_company_license] Validation of company {company_id} stopped: {reason}')
+        # save(), not .update(): the dashboard counters and principal cache
+        # follow Company post_save.
+        with transaction.atomic():
+            current = Company.objects.select_for_update().filter(
+                id=company_id, authentication_status=Company.AuthStatus.VALIDATING,
+            ).first()
+            if current is not None:
+                current.authentication_status = Company.AuthStatus.PENDING
+                current.save(update_fields=['authentication_status'])
+
+    started_at = company.license_poll_started_at or timezone.now()
+    elapsed = (timezone.now() - started_at).total_seconds()
+    if elapsed >= get_license_poll_timeout():
+        _give_up(f'timeout after {int(elapsed)}s and {attempt} checks')
+        return
+
+    try:
+        auth_result = check_license_authentication(company.company_id)
+    except Exception as exc:
+        log.exception(f'[poll_company_license] Unexpected error for company {company_id}: {exc}')
+        _give_up('unexpected error')
+        return
 
-        auth_data   = auth_result.get('data', {})
+    if auth_result['success'] and auth_result['status'] != 'Pending':
         auth_status = auth_result['status']
         log.info(f'[poll_company_license] Result: {auth_status} for company {company.company_name}')
-
         if auth_status == 'Approve':
-            company.authentication_status = Company.AuthStatus.APPROVED
-            company.is_active = True
+            _apply_license_approval(company, auth_result.get('data', {}), log)
         elif auth_status == 'Expired':
             company.authentication_status = Company.AuthStatus.EXPIRED
         elif auth_status == 'Block':
             company.authentication_status = Company.AuthStatus.BLOCKED
-
-        if auth_status == 'Approve':
-            def _safe_int(val, default=0):
-                try:
-                    return int(val or default)
-                except (ValueError, TypeError):
-                    return default
-
-            number_of_licences      = _safe_int(auth_data.get('NumberOfLicence'))
-            palmtec_count           = _safe_int(auth_data.get('PalmtecCount'))
-            total_user_count        = _safe_int(auth_data.get('TotalUserCount'))
-            premium_user_count      = _safe_int(auth_data.get('PremiumUserCount'))
-            intermediate_user_count = _safe_int(auth_data.get('IntermediateUserCount'))
-
-            if number_of_licences > 0 and (palmtec_count + total_user_count) > number_of_licences:
-                log.error(
-                    f'[poll_company_license] License config error for {company.company_name}: '
-                    f'palmtec({palmtec_count}) + users({total_user_count}) > '
-                    f'NumberOfLicence({number_of_licences})'
-                )
-                company.authentication_status = Company.AuthStatus.PENDING
-                company.error_message = (
-                    f'License config error: device slots ({palmtec_count}) + '
-                    f'user slots ({total_user_count}) = {palmtec_count + total_user_count} '
-                    f'exceeds total licensed units ({number_of_licences}). '
-                    'Contact the license server administrator.'
-                )
-                company.save()
-                return
-
-            company.product_registration_id = auth_data.get('ProductRegistrationId')
-            company.unique_identifier        = auth_data.get('UniqueIDentifier')
-            company.product_from_date        = _parse_license_date(auth_data.get('ProductFromDate'))
-            company.product_to_date          = _parse_license_date(auth_data.get('ProductToDate'))
-            company.number_of_licences       = number_of_licences
-            company.palmtec_count            = palmtec_count
-            company.total_user_count         = total_user_count
-            company.premium_user_count       = premium_user_count
-            company.intermediate_user_count  = intermediate_user_count
-            company.error_message            = None
-
         company.save()
         log.info(f'[poll_company_license] Updated company {company_id} → {company.authentication_status}')
+        return
 
-    except Exception as exc:
-        log.exception(f'[poll_company_license] Unexpected error for company {company_id}: {exc}')
-        raise self.retry(exc=exc, countdown=120)
+    if not auth_result['success'] and not auth_result.get('retry'):
+        _give_up(auth_result.get('error'))
+        return
 
-    finally:
-        # Safety net: if the task ends for any reason while status is still
-        # VALIDATING, reset to PENDING so admins can retry. This also covers
-        # the case where a Celery worker is killed mid-task (on next heartbeat
-        # Celery marks the task as failed and this finally runs on the retry).
-        try:
-            company = Company.objects.get(id=company_id)
-            if company.authentication_status == Company.AuthStatus.VALIDATING:
-                company.authentication_status = Company.AuthStatus.PENDING
-                company.save(update_fields=['authentication_status'])
-        except Exception as e:
-            log.error(f'[poll_company_license] Could not reset VALIDATING for {company_id}: {e}')
+    # Still pending (or a transient failure) — claim the next step and re-schedule.
+    claimed = Company.objects.filter(
+        id=company_id,
+        authentication_status=Company.AuthStatus.VALIDATING,
+        license_poll_attempts=attempt,
+    ).update(license_poll_attempts=attempt + 1)
+    if not claimed:
+        return
+
+    countdown = get_license_poll_interval()
+    if license_client.breaker_open():
+        countdown = max(countdown, license_client.get_breaker_cooldown())
+    poll_company_license.apply_async((company_id, attempt + 1), countdown=countdown)
 
 
 import logging as _recon_logger
@@ -1811,6 +2071,9 @@ def reconcile_aggregator_transaction(self, transaction_id):
                 reconciled_at=timezone.now(),
                 processing_status=AggregatorTransaction.ProcessingStatus.PENDING_VERIFICATION,
             )
+            # .update() skips the post_save signal — the match moves this
+            # payment into the company's settlement counts for its date.
+            _bump_report_versions(company, txn.transaction_date)
         _recon_log.info('[reconcile_aggregator] Auto-matched TXN-%s ↔ Ticket-%s', txn.transactionID, ticket.ticket_number)
 
     except Exception as exc:
@@ -1873,8 +2136,42 @@ def scan_unmatched_aggregator_transactions():
 
 import json as _json
 import logging as _tid_logger
+import time as _time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 _tid_log = _tid_logger.getLogger(__name__)
 
+# Devices per bulk_update transaction in auto_populate_aggregator_tids.
+_TID_UPDATE_BATCH = 500
+
+def _fetch_terminal_map(customer_id):
+    """
+    Worker-thread half of auto_populate_aggregator_tids: one license server
+    call, no DB access. Returns (ser_to_tid or None, error or None, seconds).
+    """
+    from .views.web.company import fetch_company_from_license_server
+
+    started = _time.monotonic()
+    try:
+        result = fetch_company_from_license_server(customer_id)
+        if not result.get('success'):
+            return None, result.get('error'), _time.monotonic() - started
+
+        terminal_map_raw = result['data'].get('TerminalMap')
+        if not terminal_map_raw:
+            return {}, None, _time.monotonic() - started
+
+        try:
+            terminal_map = _json.loads(terminal_map_raw) if isinstance(terminal_map_raw, str) else terminal_map_raw
+            ser_to_tid = {e['SER']: e['TER'] for e in terminal_map if e.get('SER') and e.get('TER')}
+        except (_json.JSONDecodeError, TypeError, AttributeError):
+            return None, 'Invalid TerminalMap', _time.monotonic() - started
+        return ser_to_tid, None, _time.monotonic() - started
+    except Exception as exc:
+        _tid_log.exception('[auto_populate_aggregator_tids] Error fetching company %s: %s', customer_id, exc)
+        return None, str(exc), _time.monotonic() - started
+
+
 @shared_task
 def auto_populate_aggregator_tids():
     """
@@ -1883,58 +2180,135 @@ def auto_populate_aggregator_tids():
     by matching TerminalMap SER to ETMDevice.serial_number.
     Skips companies where all devices already have TID set.
     Never overwrites an already-set TID.
-    """
-    from .views.web.company import fetch_company_from_license_server
 
-    companies_with_gaps = Company.objects.filter(
-        etmdevice__aggregator_tid__isnull=True,
-        etmdevice__allocation_status=ETMDevice.AllocationStatus.ALLOCATED,
-    ).distinct() | Company.objects.filter(
-        etmdevice__aggregator_tid='',
-        etmdevice__allocation_status=ETMDevice.AllocationStatus.ALLOCATED,
-    ).distinct()
+    TerminalMaps are fetched concurrently on a pool of
+    AGGREGATOR_TID_SYNC_WORKERS threads (network only; the DB work stays on
+    this thread). TID conflicts for all devices are resolved with one query and
+    the updates are written with bulk_update, _TID_UPDATE_BATCH devices per
+    transaction. A batch that hits a TID assigned concurrently is retried row
+    by row, so only the conflicting devices are skipped.
 
-    total_updated = 0
+    Returns {'updated', 'conflicts', 'seconds', 'companies': {company_id:
+    {'devices', 'matched', 'updated', 'seconds', 'error'}}}.
+    """
+    run_started = _time.monotonic()
+
+    # One query for every device missing a TID, grouped by company.
+    gaps = defaultdict(list)
+    customer_ids = {}
+    for pk, serial_number, company_pk, customer_id in ETMDevice.objects.filter(
+        allocation_status=ETMDevice.AllocationStatus.ALLOCATED,
+        company__isnull=False,
+    ).filter(
+        Q(aggregator_tid__isnull=True) | Q(aggregator_tid='')
+    ).values_list('pk', 'serial_number', 'company_id', 'company__company_id'):
+        gaps[company_pk].append((pk, serial_number))
+        customer_ids[company_pk] = customer_id
+
+    companies = {}
+    candidates = []   # (device_pk, serial_number, tid, company_pk)
+    workers = max(1, int(getattr(settings, 'AGGREGATOR_TID_SYNC_WORKERS', 8)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_fetch_terminal_map, customer_ids[company_pk]): company_pk
+            for company_pk in gaps
+        }
+        for future in as_completed(futures):
+            company_pk = futures[future]
+            ser_to_tid, error, seconds = future.result()
+            stats = {
+                'devices': len(gaps[company_pk]), 'matched': 0, 'updated': 0,
+                'seconds': round(seconds, 3), 'error': error,
+            }
+            companies[customer_ids[company_pk]] = stats
+            if error:
+                _tid_log.warning('[auto_populate_aggregator_tids] License server failed for company %s: %s', customer_ids[company_pk], error)
+                continue
+            for pk, serial_number in gaps[company_pk]:
+                tid = ser_to_tid.get(serial_number)
+                if tid:
+                    candidates.append((pk, serial_number, tid, company_pk))
+                    stats['matched'] += 1
+
+    # Set-based conflict check: a TID already held by any device, or wanted
+    # by more than one device in this run (first device by pk wins), is skipped.
+    candidates.sort()
+    taken = set(ETMDevice.objects.filter(
+        aggregator_tid__in={tid for _, _, tid, _ in candidates},
+    ).values_list('aggregator_tid', flat=True))
 
-    for company in companies_with_gaps:
+    now = timezone.now()
+    to_update = []    # (ETMDevice, serial_number, company_pk)
+    conflicts = 0
+    for pk, serial_number, tid, company_pk in candidates:
+        if tid in taken:
+            _tid_log.warning('[auto_populate_aggregator_tids] TID %s already taken, skipping %s', tid, serial_number)
+            conflicts += 1
+            continue
+        taken.add(tid)
+        to_update.append((ETMDevice(pk=pk, aggregator_tid=tid, updated_at=now), serial_number, company_pk))
+
+    updated = 0
+    for i in range(0, len(to_update), _TID_UPDATE_BATCH):
+        batch = to_update[i:i + _TID_UPDATE_BATCH]
         try:
-            result = fetch_company_from_license_server(company.company_id)
-            if not result.get('success'):
-                _tid_log.warning('[auto_populate_aggregator_tids] License server failed for company %s: %s', company.company_id, result.get('error'))
-                continue
+            with transaction.atomic():
+                ETMDevice.objects.bulk_update([d for d, _, _ in batch], ['aggregator_tid', 'updated_at'])
+            written = batch
+        except IntegrityError as exc:
+            # A TID assigned concurrently (sync_aggregator_tids view) — write
+            # this batch row by row, only onto devices still missing a TID.
+            _tid_log.warning('[auto_populate_aggregator_tids] Batch update failed, retrying per device: %s', exc)
+            written = []
+            for entry in batch:
+                device, serial_number, _ = entry
+                try:
+                    with transaction.atomic():
+                        rows = ETMDevice.objects.filter(pk=device.pk).filter(
+                            Q(aggregator_tid__isnull=True) | Q(aggregator_tid='')
+                        ).update(aggregator_tid=device.aggregator_tid, updated_at=now)
+                except IntegrityError:
+                    rows = 0
+                if rows:
+                    written.append(entry)
+                else:
+                    _tid_log.warning('[auto_populate_aggregator_tids] TID %s taken concurrently, skipping %s', device.aggregator_tid, serial_number)
+                    conflicts += 1
+        for _, _, company_pk in written:
+            companies[customer_ids[company_pk]]['updated'] += 1
+        updated += len(written)
+
+    _tid_log.info(
+        '[auto_populate_aggregator_tids] Done. %d device(s) updated across %d company(ies) in %.1fs.',
+        updated, len(companies), _time.monotonic() - run_started,
+    )
+    return {
+        'updated': updated,
+        'conflicts': conflicts,
+        'seconds': round(_time.monotonic() - run_started, 3),
+        'companies': companies,
+    }
 
-            terminal_map_raw = result['data'].get('TerminalMap')
-            if not terminal_map_raw:
-                continue
 
-            try:
-                terminal_map = _json.loads(terminal_map_raw) if isinstance(terminal_map_raw, str) else terminal_map_raw
-            except (_json.JSONDecodeError, TypeError):
-                _tid_log.warning('[auto_populate_aggregator_tids] Invalid TerminalMap for company %s', company.company_id)
-                continue
+# ─────────────────────────────────────────────────────────────────────────────
+# Outbound mail
+# Triggered after commit by mail_queue.enqueue and by beat every minute
+# (retries with backoff, lost triggers). See mail_queue.py.
+# ─────────────────────────────────────────────────────────────────────────────
 
-            ser_to_tid = {e['SER']: e['TER'] for e in terminal_map if e.get('SER') and e.get('TER')}
+_MAIL_MAX_BATCHES_PER_RUN = 10
 
-            devices = ETMDevice.objects.filter(
-                company=company,
-                allocation_status=ETMDevice.AllocationStatus.ALLOCATED,
-            ).filter(
-                Q(aggregator_tid__isnull=True) | Q(aggregator_tid='')
-            )
 
-            for device in devices:
-                tid = ser_to_tid.get(device.serial_number)
-                if not tid:
-                    continue
-                if ETMDevice.objects.filter(aggregator_tid=tid).exclude(pk=device.pk).exists():
-                    _tid_log.warning('[auto_populate_aggregator_tids] TID %s already taken, skipping %s', tid, device.serial_number)
-                    continue
-                device.aggregator_tid = tid
-                device.save(update_fields=['aggregator_tid', 'updated_at'])
-                total_updated += 1
-
-        except Exception as exc:
-            _tid_log.exception('[auto_populate_aggregator_tids] Error processing company %s: %s', company.company_id, exc)
-
-    _tid_log.info('[auto_populate_aggregator_tids] Done. %d device(s) updated.', total_updated)
-    return total_updated
+@shared_task
+def deliver_outbound_mail():
+    """Send queued OutboundEmail rows, one SMTP connection per batch."""
+    from . import mail_queue
+
+    totals = {'sent': 0, 'failed': 0}
+    for _ in range(_MAIL_MAX_BATCHES_PER_RUN):
+        result = mail_queue.deliver_batch()
+        totals['sent'] += result['sent']
+        totals['failed'] += result['failed']
+        if result['sent'] + result['failed'] < mail_queue.get_mail_batch_size():
+            break
+    return totals
@@ -4,13 +4,37 @@ Tests for get_etm_initial_data view.
 Run with: python manage.py test yourapp.tests.GetEtmInitialDataTests
 """
 
+import asyncio
+import csv
+import io
+import json
+import threading
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest import skipUnless
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
 from unittest.mock import patch
-from django.test import TestCase
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
-from rest_framework.test import APIClient
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
 from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
 
-from .models import ETMDevice, DeviceRejectionLog, Company
+from . import authentication, dashboard_counters, db_router, license_client, mail_queue, od_matrix, principal_cache, rate_limit, report_cache, report_jobs, report_shards, session_slots, tasks, ticket_archive
+from .authentication import COOKIE_NAME, SessionAuthentication, session_key_exists, set_session_cache, set_session_revoked
+from .live_events import LiveHub, RESYNC
+from .models import ETMDevice, DeviceRejectionLog, Company, OutboundEmail, ScheduleData, TripData, TripODMatrix, TransactionData, ReplicationHeartbeat, AggregatorTransaction, TicketArchiveDay, UserSession
 
 
 class GetEtmInitialDataTests(TestCase):
@@ -173,4 +197,1134 @@ class GetEtmInitialDataTests(TestCase):
     @patch.dict("os.environ", {"LICENSE_SERVER_BASE_URL": "http://my-license-server.com"})
     def test_license_url_uses_env_variable_when_set(self):
         response = self.client.get(self.url, {"serialnumber": "SN-001"})
-        self.assertEqual(response.data["data"]["cLicenseURL"], "http://my-license-server.com")
\ No newline at end of file
+        self.assertEqual(response.data["data"]["cLicenseURL"], "http://my-license-server.com")
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ReportCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def _key(self, params, days):
+        return report_cache.report_cache_key(
+            7, 'duty', 'advanced', params, report_cache.get_data_versions(7, days),
+        )
+
+    def test_param_order_does_not_change_key(self):
+        days = ['2025-01-01']
+        self.assertEqual(
+            self._key({'bus_no': 'KL1', 'date': '2025-01-01'}, days),
+            self._key({'date': '2025-01-01', 'bus_no': 'KL1'}, days),
+        )
+
+    def test_bump_invalidates_only_that_date(self):
+        before_1 = self._key({'date': '2025-01-01'}, ['2025-01-01'])
+        before_2 = self._key({'date': '2025-01-02'}, ['2025-01-02'])
+
+        report_cache.bump_data_version(7, date(2025, 1, 1))
+
+        self.assertNotEqual(before_1, self._key({'date': '2025-01-01'}, ['2025-01-01']))
+        self.assertEqual(before_2, self._key({'date': '2025-01-02'}, ['2025-01-02']))
+
+    def test_master_bump_invalidates_every_date(self):
+        before = self._key({'date': '2025-01-01'}, ['2025-01-01'])
+        report_cache.bump_master_version(7)
+        self.assertNotEqual(before, self._key({'date': '2025-01-01'}, ['2025-01-01']))
+
+    def test_date_range_span(self):
+        span = report_cache.date_range()
+        self.assertEqual(
+            span({'from_date': '2025-01-30', 'to_date': '2025-02-01'}),
+            ['2025-01-30', '2025-01-31', '2025-02-01'],
+        )
+        self.assertIsNone(span({'from_date': '2025-02-01', 'to_date': '2025-01-30'}))
+        self.assertIsNone(span({'from_date': '2024-01-01', 'to_date': '2025-01-01'}))
+
+    def test_etag_round_trip_returns_304_without_running_view(self):
+        calls = []
+
+        @api_view(['GET'])
+        @permission_classes([AllowAny])
+        @report_cache.cached_report('test', report_cache.single_date('date'))
+        def view(request):
+            calls.append(1)
+            return Response({'ok': True})
+
+        factory = APIRequestFactory()
+        user = SimpleNamespace(company_id=7, tier='advanced', is_authenticated=True)
+
+        request = factory.get('/r', {'date': '2025-01-01'})
+        force_authenticate(request, user=user)
+        first = view(request)
+        self.assertEqual(first.status_code, 200)
+
+        request = factory.get('/r', {'date': '2025-01-01'}, HTTP_IF_NONE_MATCH='W/' + first['ETag'])
+        force_authenticate(request, user=user)
+        self.assertEqual(view(request).status_code, 304)
+        self.assertEqual(len(calls), 1)
+
+        report_cache.bump_data_version(7, '2025-01-01')
+        request = factory.get('/r', {'date': '2025-01-01'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        force_authenticate(request, user=user)
+        self.assertEqual(view(request).status_code, 200)
+        self.assertEqual(len(calls), 2)
+
+
+class LiveHubTests(SimpleTestCase):
+
+    def test_dispatch_fans_out_per_company_and_resyncs_stalled_listener(self):
+        hub = LiveHub()
+        fast, slow, other = asyncio.Queue(), asyncio.Queue(maxsize=1), asyncio.Queue()
+        hub._listeners['1'].update({fast, slow})
+        hub._listeners['2'].add(other)
+
+        hub._dispatch('1', {'kind': 'ticket', 'row': {'id': 1}})
+        hub._dispatch('1', {'kind': 'ticket', 'row': {'id': 2}})
+
+        self.assertEqual(fast.qsize(), 2)
+        self.assertIs(slow.get_nowait(), RESYNC)
+        self.assertTrue(other.empty())
+
+        hub.unsubscribe(1, fast)
+        hub.unsubscribe(1, slow)
+        self.assertNotIn('1', hub._listeners)
+
+    def test_stream_logs_out_revoked_session_under_steady_traffic(self):
+        from .views.web import live
+
+        queue = asyncio.Queue()
+        fake_hub = SimpleNamespace(subscribe=lambda company_id: queue, unsubscribe=lambda *args: None)
+        revoked = threading.Event()
+
+        async def run():
+            stream = live._stream(1, 'uid', {'ticket'}, None)
+            self.assertIn('ready', await stream.__anext__())
+
+            async def traffic():
+                # Dropped by the kind filter, but never lets the queue sit idle.
+                while True:
+                    queue.put_nowait({'kind': 'trip', 'row': {}})
+                    await asyncio.sleep(0.005)
+
+            producer = asyncio.create_task(traffic())
+            revoked.set()
+            try:
+                async def first_event():
+                    async for chunk in stream:
+                        if not chunk.startswith(':'):
+                            return chunk
+                return await asyncio.wait_for(first_event(), timeout=2)
+            finally:
+                producer.cancel()
+                await stream.aclose()
+
+        with patch.object(live, 'HEARTBEAT', 0.05), patch.object(live, 'hub', fake_hub), \
+                patch.object(live, 'session_key_exists', lambda uid: not revoked.is_set()):
+            self.assertIn('logout', asyncio.run(run()))
+
+    def test_live_updates_refused_under_wsgi(self):
+        response = self.client.get(reverse('live_updates'))
+
+        self.assertEqual(response.status_code, 503)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class DutyReportTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            company_id="2001", company_name="Duty Corp", contact_person="Jane",
+        )
+        self.user = get_user_model().objects.create_user(
+            username="duty", email="duty@example.com", password="x",
+            company=self.company, tier='premium',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _trip(self, trip_no, **kwargs):
+        return TripData.objects.create(
+            palmtec_id="P1", trip_no=trip_no, schedule_no=1, bus_no="KL01",
+            start_date=date(2025, 1, 1), company_code=self.company, **kwargs,
+        )
+
+    def _ticket(self, trip, number, at, amount):
+        return TransactionData.objects.create(
+            palmtec_id="P1", ticket_number=number, ticket_date=date(2025, 1, 1),
+            ticket_time=at, ticket_amount=amount, trip_id=trip,
+            company_code=self.company, raw_payload="",
+        )
+
+    def test_bus_timeline_groups_trips_by_schedule(self):
+        schedule = ScheduleData.objects.create(
+            palmtec_id="P1", schedule_no=1, bus_no="KL01",
+            start_date=date(2025, 1, 1), company_code=self.company,
+        )
+        self._trip(1, schedule_id=schedule, is_closed=True, total_collection='50.00')
+        for no in (2, 3):
+            trip = self._trip(no, schedule_id=schedule)
+            self._ticket(trip, f"{no}01", "08:00:00", '10.00')
+
+        with self.assertNumQueries(3):  # schedules, trips, live totals
+            response = self.client.get(
+                reverse('apk_bus_timeline'), {'bus_no': 'KL01', 'date': '2025-01-01'},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        [sched] = response.data['schedules']
+        self.assertEqual([t['trip_no'] for t in sched['trips']], [1, 2, 3])
+        self.assertEqual(response.data['totals']['open_trips'], 2)
+        self.assertEqual(Decimal(response.data['totals']['revenue']), Decimal('70'))
+
+    def test_dashboard_keys_open_revenue_on_stamped_schedule_date(self):
+        trip = self._trip(1)
+        # Ticket issued after midnight on a schedule that opened the day before.
+        TransactionData.objects.create(
+            palmtec_id="P1", ticket_number="101", ticket_date=date(2025, 1, 2),
+            ticket_time="00:30:00", ticket_amount='10.00', trip_id=trip,
+            schedule_start_date=date(2025, 1, 1), bus_no="KL01",
+            company_code=self.company, raw_payload="",
+        )
+
+        response = self.client.get(reverse('apk_dashboard'), {'date': '2025-01-01'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['total_revenue']), Decimal('10'))
+        self.assertEqual(response.data['weekly_chart'][0]['date'], '2025-01-01')
+
+    def test_open_trips_use_fixed_query_count(self):
+        self._trip(1, is_closed=True, end_ticket_no=10, total_collection='50.00')
+        for no in (2, 3, 4):
+            trip = self._trip(no)
+            self._ticket(trip, f"{no}01", "08:00:00", '10.00')
+            self._ticket(trip, f"{no}02", "09:00:00", '15.00')
+
+        with self.assertNumQueries(3):  # trips, grouped SUM, latest ticket per trip
+            response = self.client.get(
+                reverse('apk_duty_report'), {'bus_no': 'KL01', 'date': '2025-01-01'},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        trips = {t['trip_no']: t for t in response.data['trips']}
+        self.assertEqual(trips[1]['end_ticket'], 10)
+        self.assertEqual(trips[1]['collection'], '50.00')
+        for no in (2, 3, 4):
+            self.assertEqual(trips[no]['end_ticket'], f"{no}02")
+            self.assertEqual(Decimal(trips[no]['collection']), Decimal('25'))
+
+    def test_farewise_and_passengers_aggregate_one_ticket_query(self):
+        schedule = ScheduleData.objects.create(
+            palmtec_id="P1", schedule_no=1, bus_no="KL01",
+            start_date=date(2025, 1, 1), company_code=self.company,
+        )
+        trip = self._trip(1, schedule_id=schedule)
+        for number, (day, at, amount, full, half) in enumerate([
+            (1, "08:00:00", '10.00', 1, 0),
+            (1, "09:00:00", '10.00', 2, 1),
+            (1, "10:00:00", '15.50', 1, 0),
+            (2, "00:30:00", '10.00', 1, 0),  # after midnight, same open trip
+        ]):
+            TransactionData.objects.create(
+                palmtec_id="P1", ticket_number=str(number), ticket_date=date(2025, 1, day),
+                ticket_time=at, ticket_amount=amount, full_count=full, half_count=half,
+                passenger_count=number + 1, bus_no="KL01", trip_id=trip,
+                company_code=self.company, raw_payload="",
+            )
+
+        with self.assertNumQueries(3):  # trips, tickets, archived days
+            farewise = self.client.get(reverse('apk_farewise'), {
+                'bus_no': 'KL01', 'from_date': '2025-01-01', 'to_date': '2025-01-01',
+            })
+        self.assertEqual(
+            [(f['fare'], f['ticket_count'], f['revenue']) for f in farewise.data['fares']],
+            [('10.00', 2, '20.00'), ('15.50', 1, '15.50')],
+        )
+        [counts] = farewise.data['passenger_counts']
+        self.assertEqual((counts['full'], counts['half']), (5, 1))
+
+        with self.assertNumQueries(3):  # trip, tickets, OD matrix
+            passengers = self.client.get(reverse('apk_passengers'), {
+                'bus_no': 'KL01', 'schedule_no': 1, 'trip_no': 1, 'date': '2025-01-01',
+            })
+        self.assertEqual(passengers.data['header']['passengers_in_bus'], 3)  # 10:00 is the latest time
+        self.assertEqual(passengers.data['header']['total_collection'], '45.50')
+        self.assertEqual(passengers.data['passenger_totals']['full'], 5)
+
+
+class ODMatrixTests(TestCase):
+
+    def setUp(self):
+        self.company = Company.objects.create(
+            company_id="2002", company_name="OD Corp", contact_person="Jane",
+        )
+        self.trip = TripData.objects.create(
+            palmtec_id="P1", trip_no=1, schedule_no=1, bus_no="KL01",
+            start_date=date(2025, 1, 1), company_code=self.company,
+        )
+
+    def _ticket(self, number, from_stage, to_stage, full):
+        TransactionData.objects.create(
+            palmtec_id="P1", ticket_number=number, ticket_date=date(2025, 1, 1),
+            ticket_time="08:00:00", ticket_amount='10.00', trip_id=self.trip,
+            from_stage=from_stage, to_stage=to_stage, full_count=full,
+            company_code=self.company, raw_payload="",
+        )
+
+    def test_incremental_matches_rebuild(self):
+        for number, (src, dst, full) in enumerate([(1, 3, 2), (1, 3, 1), (2, 5, 4), (0, 2, 9)]):
+            self._ticket(str(number), src, dst, full)
+            od_matrix.add_ticket(self.trip, src, dst, (full, 0, 0, 0, 0, 0, 0), stage_count=3)
+
+        incremental = od_matrix.to_array(TripODMatrix.objects.get(trip=self.trip))
+        self.assertEqual(incremental.shape, (7, 5, 5))  # grown past stage_count
+        self.assertEqual(incremental[0, 0, 2], 3)
+        self.assertEqual(incremental[0].sum(), 7)       # stage 0 ticket skipped
+
+        od_matrix.rebuild(self.trip, stage_count=3, freeze=True)
+        rebuilt = TripODMatrix.objects.get(trip=self.trip)
+        self.assertTrue(rebuilt.is_frozen)
+        self.assertTrue((od_matrix.to_array(rebuilt) == incremental).all())
+
+    def test_fold_trip_adds_increments_and_rebuilds_frozen(self):
+        self._ticket('1', 1, 3, 2)
+        self._ticket('2', 2, 4, 1)
+        self.assertTrue(od_matrix.fold_trip(self.trip.pk, [(0, 1, 3, 2), (0, 2, 4, 1)]))
+        folded = od_matrix.to_array(TripODMatrix.objects.get(trip=self.trip))
+        self.assertEqual(folded.shape, (7, 4, 4))
+        self.assertEqual(folded[0, 0, 2], 2)
+
+        od_matrix.rebuild(self.trip, freeze=True)
+        self.assertTrue((od_matrix.to_array(TripODMatrix.objects.get(trip=self.trip)) == folded).all())
+
+        # A stale increment for a ticket the freeze already counted rebuilds
+        # the frozen matrix instead of adding to it.
+        od_matrix.fold_trip(self.trip.pk, [(0, 1, 3, 2)])
+        self.assertTrue((od_matrix.to_array(TripODMatrix.objects.get(trip=self.trip)) == folded).all())
+        self.assertFalse(od_matrix.fold_trip(0, [(0, 1, 3, 2)]))
+
+    def test_sum_matrices_pads_smaller(self):
+        small, large = od_matrix.empty(2), od_matrix.empty(4)
+        small[0, 0, 1] = 1
+        large[0, 0, 1] = 2
+        large[1, 3, 0] = 5
+        total = od_matrix.sum_matrices([(2, small.tobytes()), (4, large.tobytes())])
+        self.assertEqual(total.shape, (7, 4, 4))
+        self.assertEqual(total[0, 0, 1], 3)
+        self.assertEqual(total[1, 3, 0], 5)
+
+
+class CompanyDashboardSnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            company_id="2003", company_name="Dash Corp", contact_person="Jane",
+        )
+        self.user = get_user_model().objects.create_user(
+            username="dash", email="dash@example.com", password="x",
+            company=self.company, tier='premium',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _ticket(self, number, day, amount, mode=TransactionData.PaymentMode.CASH):
+        TransactionData.objects.create(
+            palmtec_id="P1", ticket_number=number, ticket_date=day,
+            ticket_time="08:00:00", ticket_amount=amount, ticket_status=mode,
+            total_tickets=1, company_code=self.company, raw_payload="",
+        )
+
+    def _get(self):
+        return self.client.get(reverse('company_dashboard_data'), {'date': '2025-02-10'})
+
+    def test_snapshot_totals_and_cache(self):
+        self._ticket("1", date(2025, 2, 10), '10.00')
+        self._ticket("2", date(2025, 2, 10), '5.00', TransactionData.PaymentMode.UPI)
+        self._ticket("3", date(2025, 2, 3), '7.00')
+        self._ticket("4", date(2025, 1, 31), '20.00')
+
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        collections = response.data['data']['collections']
+        self.assertEqual(collections['daily_cash'], 10.0)
+        self.assertEqual(collections['daily_upi'], 5.0)
+        self.assertEqual(collections['monthly_total'], 22.0)
+        self.assertEqual(collections['prev_month_total'], 20.0)
+        self.assertEqual(response.data['data']['operations']['total_passengers'], 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get().data, response.data)
+
+        self._ticket("5", date(2025, 2, 10), '3.00')
+        report_cache.bump_data_version(self.company.pk, '2025-02-10')
+        self.assertEqual(self._get().data['data']['collections']['daily_cash'], 13.0)
+
+
+class DashboardCounterTests(TestCase):
+
+    def setUp(self):
+        self.company = Company.objects.create(
+            company_id="2004", company_name="Count Corp", contact_person="Jane",
+        )
+        dashboard_counters.recount()
+
+    def test_signals_track_status_changes(self):
+        device = ETMDevice.objects.create(
+            serial_number="SN-1", allocation_status=ETMDevice.AllocationStatus.STOCK,
+        )
+        self.assertEqual(dashboard_counters.global_counts()['device:Stock'], 1)
+
+        device.company = self.company
+        device.allocation_status = ETMDevice.AllocationStatus.ALLOCATED
+        device.save()
+        counts = dashboard_counters.global_counts()
+        self.assertEqual(counts['device:Stock'], 0)
+        self.assertEqual(counts['device:Allocated'], 1)
+        company = dashboard_counters.company_counts([self.company.pk])[self.company.pk]
+        self.assertEqual(company['device:active'], 1)
+
+        self.company.authentication_status = Company.AuthStatus.APPROVED
+        self.company.save()
+        counts = dashboard_counters.global_counts()
+        self.assertEqual(counts['company:Approve'], 1)
+        self.assertEqual(counts['company:total'], 1)
+
+        device.delete()
+        self.assertEqual(dashboard_counters.global_counts()['device:total'], 0)
+
+    def test_recount_corrects_bulk_updates(self):
+        ETMDevice.objects.create(serial_number="SN-2", allocation_status=ETMDevice.AllocationStatus.STOCK)
+        ETMDevice.objects.update(allocation_status=ETMDevice.AllocationStatus.DEALER_POOL)
+
+        self.assertEqual(dashboard_counters.recount('device'), 2)
+        counts = dashboard_counters.global_counts()
+        self.assertEqual(counts['device:Stock'], 0)
+        self.assertEqual(counts['device:DealerPool'], 1)
+        self.assertEqual(dashboard_counters.recount(), 0)
+
+
+@override_settings(REPORT_JOB_CHUNK_DAYS=2)
+class ReportJobTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        file_settings = override_settings(REPORT_JOB_FILE_ROOT=self.root)
+        file_settings.enable()
+        self.addCleanup(file_settings.disable)
+        self.company = Company.objects.create(
+            company_id="2004", company_name="Job Corp", contact_person="Jane",
+        )
+        # Run the worker inline where the view queues it.
+        worker = patch.object(tasks.run_report_job, 'delay', side_effect=report_jobs.run)
+        worker.start()
+        self.addCleanup(worker.stop)
+        self.user = get_user_model().objects.create_user(
+            username="jobs", email="jobs@example.com", password="x",
+            company=self.company, tier='premium',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for day in (1, 3, 5):
+            trip = TripData.objects.create(
+                palmtec_id="P1", trip_no=day, schedule_no=1, bus_no="KL01",
+                start_date=date(2025, 1, day), company_code=self.company,
+            )
+            TransactionData.objects.create(
+                palmtec_id="P1", ticket_number=str(day), ticket_date=date(2025, 1, day),
+                ticket_time="08:00:00", ticket_amount='10.00', ticket_status='UPI',
+                bus_no="KL01", trip_id=trip, company_code=self.company, raw_payload="",
+            )
+
+    def test_chunked_job_matches_sync_report_and_coalesces(self):
+        params = {'bus_no': 'KL01', 'from_date': '2025-01-01', 'to_date': '2025-01-05'}
+        sync = self.client.get(reverse('apk_payment_type'), params)
+
+        submitted = self.client.post(reverse('apk_submit_report_job'), {'report': 'payment_type', **params})
+        self.assertEqual(submitted.status_code, 202)
+        job_id = submitted.data['job_id']
+
+        again = self.client.post(reverse('apk_submit_report_job'), {'report': 'payment_type', **params})
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data['job_id'], job_id)
+
+        status_ = self.client.get(reverse('apk_report_job_status', args=[job_id]))
+        self.assertEqual(status_.data['status'], 'done')
+        self.assertEqual(status_.data['progress'], {'done': 3, 'total': 3})
+
+        result = self.client.get(reverse('apk_report_job_result', args=[job_id]))
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.data, sync.data)
+        self.assertEqual(Decimal(result.data['totals']['total_upi']), Decimal('30'))
+
+    def test_queued_job_is_coalesced_and_failed_job_replaced(self):
+        params = {'from_date': '2025-01-01', 'to_date': '2025-01-05'}
+        with patch.object(tasks.run_report_job, 'delay') as delay:
+            first, created = report_jobs.submit(self.company.pk, 'tickets_csv', params)
+            self.assertTrue(created)
+            second, created = report_jobs.submit(self.company.pk, 'tickets_csv', params)
+            self.assertFalse(created)
+            self.assertEqual(second['job_id'], first['job_id'])
+            self.assertEqual(delay.call_count, 1)
+
+            report_jobs._save(first, status=report_jobs.FAILED)
+            third, created = report_jobs.submit(self.company.pk, 'tickets_csv', params)
+            self.assertTrue(created)
+            self.assertNotEqual(third['job_id'], first['job_id'])
+            self.assertEqual(delay.call_count, 2)
+
+    def test_ticket_export_is_gzip_csv(self):
+        import gzip
+
+        submitted = self.client.post(reverse('submit_report_job'), {
+            'report': 'tickets_csv', 'from_date': '2025-01-01', 'to_date': '2025-01-05',
+        })
+        job_id = submitted.data['job_id']
+        self.assertNotIn('payload', cache.get(report_jobs._result_key(job_id)))
+        result = self.client.get(reverse('report_job_result', args=[job_id]))
+
+        self.assertEqual(result['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(result.streaming_content)).decode().splitlines()
+        result.close()
+        self.assertEqual(lines[0].split(',')[0], 'ticket_date')
+        self.assertEqual(len(lines), 4)
+
+        self.assertEqual(report_jobs.cleanup_files(max_age=-1), 1)
+        expired = self.client.get(reverse('report_job_result', args=[job_id]))
+        self.assertEqual(expired.status_code, 404)
+
+    def test_range_over_limit_is_rejected(self):
+        response = self.client.post(reverse('apk_submit_report_job'), {
+            'report': 'expense', 'bus_no': 'KL01', 'from_date': '2024-01-01', 'to_date': '2025-06-01',
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class ReportShardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            company_id="2005", company_name="Shard Corp", contact_person="Jane",
+        )
+        self.user = get_user_model().objects.create_user(
+            username="shards", email="shards@example.com", password="x",
+            company=self.company, tier='premium',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for day in (1, 8, 15):
+            trip = TripData.objects.create(
+                palmtec_id="P1", trip_no=day, schedule_no=1, bus_no="KL01",
+                start_date=date(2025, 1, day), company_code=self.company,
+            )
+            TransactionData.objects.create(
+                palmtec_id="P1", ticket_number=str(day), ticket_date=date(2025, 1, day),
+                ticket_time="08:00:00", ticket_amount='10.00', ticket_status='Cash',
+                bus_no="KL01", trip_id=trip, company_code=self.company, raw_payload="",
+            )
+
+    def _get(self, **extra):
+        return self.client.get(reverse('apk_payment_type'), {
+            'bus_no': 'KL01', 'from_date': '2025-01-01', 'to_date': '2025-01-19', **extra,
+        })
+
+    def test_week_shards_are_clipped_to_range(self):
+        self.assertEqual(
+            report_shards.shards(date(2025, 1, 1), date(2025, 1, 14), 'week'),
+            [
+                (date(2025, 1, 1), date(2025, 1, 5)),
+                (date(2025, 1, 6), date(2025, 1, 12)),
+                (date(2025, 1, 13), date(2025, 1, 14)),
+            ],
+        )
+
+    def test_closed_shards_are_cached_until_their_days_change(self):
+        first = self._get()
+        self.assertEqual(Decimal(first.data['totals']['total_cash']), Decimal('30'))
+
+        with self.assertNumQueries(0):  # report cache misses, every week shard hits
+            self.assertEqual(self._get(payment_mode='cash').data['totals'], {'total_cash': first.data['totals']['total_cash']})
+
+        trip = TripData.objects.get(trip_no=8)
+        TransactionData.objects.create(
+            palmtec_id="P1", ticket_number="81", ticket_date=date(2025, 1, 8),
+            ticket_time="09:00:00", ticket_amount='5.00', ticket_status='Cash',
+            bus_no="KL01", trip_id=trip, company_code=self.company, raw_payload="",
+        )
+        report_cache.bump_data_version(self.company.pk, '2025-01-08')
+
+        with self.assertNumQueries(2):  # only the 6–12 Jan shard reruns
+            response = self._get(payment_mode='upi')
+        self.assertEqual(Decimal(self._get(payment_mode='cash').data['totals']['total_cash']), Decimal('35'))
+        self.assertEqual(len(response.data['rows']), 3)
+
+
+class RateLimitTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def _user(self, pk, tier='basic', company_id=1):
+        return SimpleNamespace(pk=pk, tier=tier, company_id=company_id, is_authenticated=True)
+
+    def test_user_bucket_returns_429_with_retry_after(self):
+        @api_view(['GET'])
+        @permission_classes([AllowAny])
+        @rate_limit.rate_limited('test_report')
+        def view(request):
+            return Response({'ok': True})
+
+        user = self._user(1)
+        factory = APIRequestFactory()
+        statuses = []
+        for _ in range(7):  # basic burst is 6
+            request = factory.get('/r')
+            force_authenticate(request, user=user)
+            statuses.append(view(request))
+        self.assertEqual([r.status_code for r in statuses], [200] * 6 + [429])
+        self.assertGreaterEqual(int(statuses[-1]['Retry-After']), 1)
+        self.assertEqual(statuses[-1].data['reason'], 'user_rate')
+        self.assertEqual(
+            rate_limit.throttle_stats(timezone.localdate()), {'1:test_report:user_rate': 1},
+        )
+
+    def test_in_flight_slots_are_released(self):
+        user = self._user(2)
+        slot = rate_limit.acquire(user, 'test_report')
+        self.assertTrue(slot.allowed)
+        blocked = rate_limit.acquire(user, 'test_report')  # basic: one in flight
+        self.assertEqual((blocked.allowed, blocked.reason), (False, 'user_concurrency'))
+        rate_limit.release(slot)
+        self.assertTrue(rate_limit.acquire(user, 'test_report').allowed)
+
+    @override_settings(REPORT_RATE_COMPANY_BURST=2)
+    def test_company_bucket_is_shared_by_users(self):
+        for pk in (3, 4):
+            rate_limit.release(rate_limit.acquire(self._user(pk, 'premium'), 'test_report'))
+        slot = rate_limit.acquire(self._user(5, 'premium'), 'test_report')
+        self.assertEqual((slot.allowed, slot.reason), (False, 'company_rate'))
+        self.assertTrue(rate_limit.acquire(self._user(6, 'premium', company_id=2), 'test_report').allowed)
+
+
+class PrincipalCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        principal_cache.clear_local()
+        self.company = Company.objects.create(
+            company_id="2007", company_name="Principal Corp", contact_person="Jane",
+        )
+        self.user = get_user_model().objects.create_user(
+            username="principal", email="principal@example.com", password="x",
+            company=self.company, tier='basic',
+        )
+        self.session_uid = '6f1c3a52-2d7e-4b7a-9d0e-5a8f3c1b2e47'
+        set_session_cache(self.session_uid, self.user.pk, 'android')
+
+    def _authenticate(self):
+        request = APIRequestFactory().get('/')
+        request.COOKIES[COOKIE_NAME] = self.session_uid
+        result = SessionAuthentication().authenticate(request)
+        return result[0] if result else None
+
+    def test_warm_auth_issues_no_sql(self):
+        self._authenticate()
+        with self.assertNumQueries(0):
+            user = self._authenticate()
+            self.assertEqual(user.company.company_name, "Principal Corp")
+            self.assertEqual((user.pk, user.tier), (self.user.pk, 'basic'))
+
+    def test_user_and_company_changes_invalidate_snapshot(self):
+        self._authenticate()
+        self.user.tier = 'premium'
+        self.user.save(update_fields=['tier'])
+        self.assertEqual(self._authenticate().tier, 'premium')
+
+        self.company.is_active = False
+        self.company.save()  # cascade deactivates users with a bulk update
+        self.assertIsNone(self._authenticate())
+
+    def test_revoked_session_is_dropped_from_cache(self):
+        self.assertIsNotNone(self._authenticate())
+        set_session_revoked(self.session_uid)
+        self.assertIsNone(self._authenticate())
+        self.assertFalse(session_key_exists(self.session_uid))
+
+
+class SessionLastSeenTests(TestCase):
+
+    def test_buffered_stamps_are_written_in_one_update(self):
+        user = get_user_model().objects.create_user(
+            username="seen", email="seen@example.com", password="x",
+        )
+        sessions = [UserSession.objects.create(user=user) for _ in range(3)]
+        stamps = {str(s.session_uid): 1760000000 + i for i, s in enumerate(sessions)}
+        with self.assertNumQueries(1):
+            self.assertEqual(authentication._write_last_seen(stamps), 3)
+        for i, s in enumerate(sessions):
+            s.refresh_from_db()
+            self.assertEqual(int(s.last_seen_at.timestamp()), 1760000000 + i)
+
+
+class SessionSweepTests(TestCase):
+
+    def test_sweep_deactivates_sessions_without_a_cache_key(self):
+        cache.clear()
+        user = get_user_model().objects.create_user(
+            username="sweep", email="sweep@example.com", password="x",
+        )
+        live, expired, fresh = [UserSession.objects.create(user=user) for _ in range(3)]
+        UserSession.objects.exclude(pk=fresh.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        set_session_cache(str(live.session_uid), user.pk)
+
+        with patch('TicketAppB.tasks._SWEEP_CHUNK', 1):
+            tasks.sweep_stale_sessions()
+
+        active = set(UserSession.objects.filter(is_active=True).values_list('pk', flat=True))
+        self.assertEqual(active, {live.pk, fresh.pk})
+
+
+class SessionSlotTests(TestCase):
+
+    def test_reserve_applies_total_and_tier_limits(self):
+        company = Company.objects.create(
+            company_id="2008", company_name="Slots Corp", contact_person="Jane",
+            total_user_count=2, premium_user_count=1,
+        )
+        premium = get_user_model().objects.create_user(
+            username="slot-p", email="slot-p@example.com", password="x",
+            company=company, tier='premium',
+        )
+        UserSession.objects.create(user=premium)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(session_slots.reserve(company, 'premium', 'x'), session_slots.PREMIUM_FULL)
+        self.assertIsNone(session_slots.reserve(company, 'basic', 'x'))
+        UserSession.objects.create(user=premium)
+        self.assertEqual(session_slots.check(company, 'basic'), session_slots.TOTAL_FULL)
+        self.assertIsNone(session_slots.reserve(company, 'none', 'x', enforce=False))
+
+
+class SessionRevocationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.company = Company.objects.create(
+            company_id="2009", company_name="Revoke Corp", contact_person="Jane",
+        )
+        self.sessions = []
+        for i in range(3):
+            user = get_user_model().objects.create_user(
+                username=f"revoke{i}", email=f"revoke{i}@example.com", password="x",
+                company=self.company,
+            )
+            session = UserSession.objects.create(user=user)
+            set_session_cache(str(session.session_uid), user.pk)
+            self.sessions.append(session)
+
+    def _assert_all_killed(self):
+        self.assertFalse(UserSession.objects.filter(is_active=True).exists())
+        for session in self.sessions:
+            self.assertFalse(session_key_exists(str(session.session_uid)))
+
+    def test_company_deactivation_kills_sessions(self):
+        self.company.is_active = False
+        self.company.save()
+        self._assert_all_killed()
+
+    @override_settings(SESSION_REVOKE_ASYNC_THRESHOLD=2)
+    def test_large_session_sets_are_killed_by_celery_after_commit(self):
+        with patch.object(tasks.kill_entity_sessions, 'delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.company.is_active = False
+                self.company.save()
+                self.assertFalse(delay.called)
+        delay.assert_called_once_with('company', self.company.pk)
+        self.assertTrue(UserSession.objects.filter(is_active=True).exists())
+
+        self.assertEqual(tasks.kill_entity_sessions('company', self.company.pk), 3)
+        self._assert_all_killed()
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', MAIL_QUEUE_MAX_ATTEMPTS=2)
+class MailQueueTests(TestCase):
+
+    def test_queued_mail_is_sent_in_one_batch(self):
+        with patch.object(tasks.deliver_outbound_mail, 'delay'):
+            for n in range(3):
+                mail_queue.enqueue(f'Reset {n}', 'token', [f'u{n}@example.com'], purpose='password_reset')
+
+        self.assertEqual(mail_queue.deliver_batch(), {'sent': 3, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.Status.SENT).exists())
+        self.assertFalse(OutboundEmail.objects.exclude(body='').exists())
+        self.assertEqual(mail_queue.deliver_batch(), {'sent': 0, 'failed': 0})
+
+    def test_failures_back_off_then_give_up(self):
+        with patch.object(tasks.deliver_outbound_mail, 'delay'):
+            message = mail_queue.enqueue('Reset', 'token', ['u@example.com'])
+
+        with patch('django.core.mail.EmailMessage.send', side_effect=OSError('refused')):
+            self.assertEqual(mail_queue.deliver_batch(), {'sent': 0, 'failed': 1})
+            message.refresh_from_db()
+            self.assertEqual(message.status, OutboundEmail.Status.QUEUED)
+            self.assertGreater(message.next_attempt_at, timezone.now())
+
+            OutboundEmail.objects.update(next_attempt_at=timezone.now())
+            mail_queue.deliver_batch()
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundEmail.Status.FAILED)
+        self.assertEqual(message.attempts, 2)
+        self.assertEqual(mail.outbox, [])
+
+
+class _LicenseStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def do_POST(self):
+        server = self.server
+        server.requests += 1
+        server.clients.add(self.client_address)
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        body = json.dumps({'Authenticationstatus': 'Approve', 'CustomerId': payload['CustomerId']}).encode()
+        self.send_response(server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LicenseClientTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _LicenseStub)
+        self.server.requests, self.server.clients, self.server.status = 0, set(), 200
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        url = f'http://127.0.0.1:{self.server.server_port}/product-authentication'
+        stub_settings = override_settings(PRODUCT_AUTH_URL=url, LICENSE_BREAKER_THRESHOLD=2)
+        stub_settings.enable()
+        self.addCleanup(stub_settings.disable)
+        cache.clear()
+
+    def test_lookups_reuse_connection_and_cache(self):
+        license_client.authenticate('C1')
+        license_client.authenticate('C1')
+        data = license_client.authenticate('C1', cached=True)
+
+        self.assertEqual(data['CustomerId'], 'C1')
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_breaker_fails_fast_while_open(self):
+        self.server.status = 503
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                license_client.authenticate('C1')
+
+        with self.assertRaises(license_client.LicenseServerUnavailable):
+            license_client.authenticate('C1')
+        self.assertEqual(self.server.requests, 2)
+
+        license_client.reset_breaker()
+        self.server.status = 200
+        self.assertEqual(license_client.authenticate('C1')['Authenticationstatus'], 'Approve')
+
+
+class LicensePollTests(TestCase):
+
+    def setUp(self):
+        self.company = Company.objects.create(
+            company_id='CUST1', company_name='Poll Co', contact_person='P',
+            authentication_status=Company.AuthStatus.VALIDATING,
+            license_poll_started_at=timezone.now(),
+        )
+
+    def _step(self, attempt, result):
+        with patch('TicketAppB.views.web.company.check_license_authentication', return_value=result), \
+                patch.object(tasks.poll_company_license, 'apply_async') as schedule:
+            tasks.poll_company_license(self.company.id, attempt)
+        self.company.refresh_from_db()
+        return schedule
+
+    def test_pending_reschedules_without_waiting(self):
+        schedule = self._step(0, {'success': True, 'status': 'Pending', 'data': {}})
+
+        schedule.assert_called_once_with((self.company.id, 1), countdown=3)
+        self.assertEqual(self.company.license_poll_attempts, 1)
+        self.assertEqual(self.company.authentication_status, Company.AuthStatus.VALIDATING)
+
+        # A duplicate of the step already advanced does nothing.
+        self.assertFalse(self._step(0, {'success': True, 'status': 'Pending', 'data': {}}).called)
+
+    def test_approval_applies_license(self):
+        data = {'TotalUserCount': '5', 'PalmtecCount': '3', 'NumberOfLicence': '10', 'ProductToDate': '2027-01-01 00:00:00'}
+        schedule = self._step(0, {'success': True, 'status': 'Approve', 'data': data})
+
+        self.assertFalse(schedule.called)
+        self.assertEqual(self.company.authentication_status, Company.AuthStatus.APPROVED)
+        self.assertEqual(self.company.total_user_count, 5)
+        self.assertEqual(self.company.product_to_date, date(2027, 1, 1))
+
+    def test_timeout_resets_to_pending(self):
+        Company.objects.filter(pk=self.company.pk).update(
+            license_poll_started_at=timezone.now() - timedelta(minutes=5),
+        )
+        dashboard_counters.recount('company')
+        schedule = self._step(0, {'success': True, 'status': 'Pending', 'data': {}})
+
+        self.assertFalse(schedule.called)
+        self.assertEqual(self.company.authentication_status, Company.AuthStatus.PENDING)
+        counts = dashboard_counters.global_counts()
+        self.assertEqual((counts['company:Validating'], counts['company:Pending']), (0, 1))
+
+    def test_startup_reset_spares_running_polls(self):
+        stuck = Company.objects.create(
+            company_id='CUST2', company_name='Stuck Co', contact_person='P', company_email='stuck@example.com',
+            authentication_status=Company.AuthStatus.VALIDATING,
+            license_poll_started_at=timezone.now() - timedelta(minutes=10),
+        )
+        from .apps import reset_stale_validations
+        self.assertEqual(reset_stale_validations(), 1)
+
+        self.company.refresh_from_db()
+        stuck.refresh_from_db()
+        self.assertEqual(self.company.authentication_status, Company.AuthStatus.VALIDATING)
+        self.assertEqual(stuck.authentication_status, Company.AuthStatus.PENDING)
+
+
+class AggregatorTidSyncTests(TestCase):
+
+    def test_concurrent_fetch_resolves_conflicts_in_one_pass(self):
+        allocated = ETMDevice.AllocationStatus.ALLOCATED
+        maps = {}
+        for n in (1, 2):
+            company = Company.objects.create(
+                company_id=f'CUST{n}', company_name=f'Tid Co {n}', contact_person='T', company_email=f't{n}@example.com',
+            )
+            for serial in (f'A{n}', f'B{n}'):
+                ETMDevice.objects.create(serial_number=serial, company=company, allocation_status=allocated)
+            maps[company.company_id] = json.dumps([{'SER': f'A{n}', 'TER': f'T{n}'}, {'SER': f'B{n}', 'TER': 'SHARED'}])
+        ETMDevice.objects.create(serial_number='HELD', aggregator_tid='T2', allocation_status=ETMDevice.AllocationStatus.STOCK)
+
+        def fetch(customer_id):
+            return {'success': True, 'status': 'Approve', 'data': {'TerminalMap': maps[customer_id]}}
+
+        with patch('TicketAppB.views.web.company.fetch_company_from_license_server', side_effect=fetch):
+            result = tasks.auto_populate_aggregator_tids()
+
+        tids = dict(ETMDevice.objects.values_list('serial_number', 'aggregator_tid'))
+        self.assertEqual(tids['A1'], 'T1')
+        self.assertIsNone(tids['A2'])              # T2 already held
+        self.assertEqual(tids['B1'], 'SHARED')     # first device by pk wins
+        self.assertIsNone(tids['B2'])
+        self.assertEqual((result['updated'], result['conflicts']), (2, 2))
+        self.assertEqual(result['companies']['CUST1']['updated'], 2)
+        self.assertEqual(result['companies']['CUST2']['matched'], 2)
+        self.assertIn('seconds', result['companies']['CUST2'])
+
+    def test_concurrent_assignment_only_skips_the_conflicting_device(self):
+        allocated = ETMDevice.AllocationStatus.ALLOCATED
+        company = Company.objects.create(
+            company_id='CUST3', company_name='Tid Co 3', contact_person='T', company_email='t3@example.com',
+        )
+        for serial in ('A3', 'B3', 'C3'):
+            ETMDevice.objects.create(serial_number=serial, company=company, allocation_status=allocated)
+        terminal_map = json.dumps([{'SER': s, 'TER': f'T-{s}'} for s in ('A3', 'B3', 'C3')])
+        other = ETMDevice.objects.create(serial_number='OTHER', allocation_status=ETMDevice.AllocationStatus.STOCK)
+
+        def racing_now():
+            # sync_aggregator_tids hands B3's TID to another device after the
+            # task's conflict check, before its updates are written.
+            ETMDevice.objects.filter(pk=other.pk).update(aggregator_tid='T-B3')
+            return timezone.now()
+
+        fetch = {'success': True, 'status': 'Approve', 'data': {'TerminalMap': terminal_map}}
+        with patch('TicketAppB.views.web.company.fetch_company_from_license_server', return_value=fetch), \
+                patch.object(tasks, 'timezone', SimpleNamespace(now=racing_now)):
+            result = tasks.auto_populate_aggregator_tids()
+
+        tids = dict(ETMDevice.objects.values_list('serial_number', 'aggregator_tid'))
+        self.assertEqual((tids['A3'], tids['B3'], tids['C3']), ('T-A3', None, 'T-C3'))
+        self.assertEqual((result['updated'], result['conflicts']), (2, 1))
+        self.assertEqual(result['companies']['CUST3']['updated'], 2)
+
+
+class TicketArchiveTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        archive_settings = override_settings(TICKET_ARCHIVE_ROOT=root, TICKET_ARCHIVE_AFTER_DAYS=120)
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+
+        self.company = Company.objects.create(
+            company_id="2006", company_name="Archive Corp", contact_person="Jane",
+        )
+        self.user = get_user_model().objects.create_user(
+            username="archive", email="archive@example.com", password="x",
+            company=self.company, tier='premium',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.day = date(2025, 1, 1)
+        trip = TripData.objects.create(
+            palmtec_id="P1", trip_no=1, schedule_no=1, bus_no="KL01",
+            start_date=self.day, company_code=self.company, is_closed=True,
+        )
+        for number, at, amount, mode in [
+            ("1", "08:00:00", '10.00', 'Cash'),
+            ("2", "09:00:00", '15.50', 'Cash'),
+            ("3", "10:00:00", '10.00', 'UPI'),
+        ]:
+            ticket = TransactionData.objects.create(
+                palmtec_id="P1", ticket_number=number, ticket_date=self.day, ticket_time=at,
+                ticket_amount=amount, ticket_status=mode, full_count=1, bus_no="KL01",
+                trip_id=trip, company_code=self.company, raw_payload=f"raw-{number}",
+            )
+        # A settled UPI ticket stays in MySQL.
+        AggregatorTransaction.objects.create(
+            transaction_date=self.day, transaction_time="10:00:00", transaction_datetime=timezone.now(),
+            transactionID=1, transactionAmount='10.00', transactionTypeId=1, raw_request_data={},
+            related_ticket=ticket,
+        )
+
+    def _farewise(self):
+        cache.clear()
+        return self.client.get(reverse('apk_farewise'), {
+            'bus_no': 'KL01', 'from_date': '2025-01-01', 'to_date': '2025-01-01',
+        }).data
+
+    def _export(self):
+        from .views.web.ticket_reports import _collect_ticket_export
+
+        out = io.StringIO()
+        _collect_ticket_export(self.company, {}, self.day, self.day, csv.writer(out))
+        return [row[8] for row in csv.reader(io.StringIO(out.getvalue()))]  # ticket_number
+
+    def test_archive_round_trip_keeps_reports_whole(self):
+        fields = [f.attname for f in TransactionData._meta.concrete_fields]
+        original = list(TransactionData.objects.order_by('id').values_list(*fields))
+        farewise = self._farewise()
+
+        self.assertEqual(ticket_archive.archive_due(), 2)
+        self.assertEqual(list(TransactionData.objects.values_list('ticket_number', flat=True)), ["3"])
+        self.assertEqual(TicketArchiveDay.objects.get(company_code=self.company).row_count, 2)
+
+        self.assertEqual(self._farewise(), farewise)
+        self.assertEqual(self._export(), ["1", "2", "3"])
+
+        self.assertEqual(ticket_archive.restore_day(self.company, self.day), 2)
+        self.assertEqual(list(TransactionData.objects.order_by('id').values_list(*fields)), original)
+
+    def test_ticket_listings_include_archived_rows(self):
+        trip_params = {'bus_no': 'KL01', 'schedule_no': 1, 'trip_no': 1, 'date': '2025-01-01'}
+        ScheduleData.objects.create(
+            palmtec_id="P1", schedule_no=1, bus_no="KL01", start_date=self.day, company_code=self.company,
+        )
+        TripData.objects.update(schedule_id=ScheduleData.objects.get())
+
+        def fetch():
+            cache.clear()
+            listing = self.client.get(reverse('get_all_transaction_data'), {
+                'from_date': '2025-01-01', 'to_date': '2025-01-01',
+            }).data
+            tickets = self.client.get(reverse('apk_tickets'), trip_params).data
+            passengers = self.client.get(reverse('apk_passengers'), trip_params).data
+            return (
+                sorted(t['ticket_number'] for t in listing['data']),
+                [t['ticket_no'] for t in tickets['tickets']],
+                tickets['passenger_totals'],
+                passengers['passenger_totals'],
+            )
+
+        before = fetch()
+        self.assertEqual(ticket_archive.archive_due(), 2)
+        self.assertEqual(fetch(), before)
+        self.assertEqual(before[:2], (["1", "2", "3"], ["1", "2", "3"]))
+        self.assertEqual(before[3]["full"], 3)
+
+
+@skipUnless(
+    db_router.REPORTING in settings.DATABASES,
+    "needs a second local database as DATABASES['reporting'] "
+    "(set REPORTING_DB_HOST, with a REPORTING_DB_NAME different from DB_NAME)",
+)
+@override_settings(REPORTING_DB_MAX_LAG_SECONDS=30, REPORTING_DB_LAG_CHECK_SECONDS=0)
+class ReportingRouterTests(TestCase):
+    """
+    The two aliases are separate test databases here, not a replica — a row
+    written to only one of them shows which database a report read.
+    """
+    databases = {'default', db_router.REPORTING} & set(settings.DATABASES)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(db_router._lag_checked.__setitem__, slice(None), [0.0, None])
+        self.company = Company.objects.create(
+            company_id="2005", company_name="Replica Corp", contact_person="Jane",
+        )
+        Company.objects.using(db_router.REPORTING).create(
+            pk=self.company.pk, company_id="2005", company_name="Replica Corp", contact_person="Jane",
+        )
+        self.user = get_user_model().objects.create_user(
+            username="replica", email="replica@example.com", password="x",
+            company=self.company, tier='premium',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _heartbeat(self, seconds_ago):
+        ReplicationHeartbeat.objects.using(db_router.REPORTING).create(
+            beat_at=timezone.now() - timedelta(seconds=seconds_ago),
+        )
+
+    def _trip(self, using, day, collection):
+        TripData.objects.using(using).create(
+            palmtec_id="P1", trip_no=1, schedule_no=1, bus_no="KL01", start_date=day,
+            is_closed=True, total_collection=collection, company_code_id=self.company.pk,
+        )
+
+    def _collection(self, day):
+        response = self.client.get(reverse('apk_expense'), {
+            'bus_no': 'KL01', 'from_date': str(day), 'to_date': str(day),
+        })
+        [row] = response.data['rows']
+        return Decimal(row['collection'])
+
+    def test_reports_read_from_replica(self):
+        today = timezone.localdate()
+        self._heartbeat(seconds_ago=1)
+        self._trip('default', today, '20.00')
+        self._trip(db_router.REPORTING, today, '50.00')
+
+        self.assertEqual(self._collection(today), Decimal('50'))
+
+    def test_lagging_replica_serves_past_days_only(self):
+        today = timezone.localdate()
+        past = today - timedelta(days=3)
+        self._heartbeat(seconds_ago=300)
+        for day in (today, past):
+            self._trip('default', day, '20.00')
+            self._trip(db_router.REPORTING, day, '50.00')
+
+        self.assertEqual(self._collection(today), Decimal('20'))
+        self.assertEqual(self._collection(past), Decimal('50'))
+
+    def test_no_heartbeat_uses_primary_and_writes_stay_on_primary(self):
+        past = timezone.localdate() - timedelta(days=3)
+        self._trip('default', past, '20.00')
+        self._trip(db_router.REPORTING, past, '50.00')
+
+        self.assertEqual(self._collection(past), Decimal('20'))
+        with db_router.reporting_reads():
+            self.assertEqual(db_router.ReportingRouter().db_for_write(TripData), 'default')
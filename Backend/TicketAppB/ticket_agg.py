@@ -0,0 +1,151 @@
+"""
+TicketAgg
+=========
+In-memory aggregation over ticket rows. A report pulls the columns it needs
+with one values_list() query into NumPy arrays (TicketFrame) and computes
+every histogram / category total / per-stage or per-trip breakdown from
+them, instead of issuing one GROUP BY per table it shows.
+
+Column encoding (TicketFrame.load)
+  DecimalField        int64 paise (×100) — sums stay exact
+  Integer / FK id     int64; NULL → NULL_ID (-1), except the passenger
+                      category counts where NULL → 0 (same as Sum(...) or 0)
+  DateField           datetime64[D]
+  TimeField           int64 seconds since midnight
+  anything else       object array
+
+Users
+  farewise_report   — fare histogram + open-trip category totals (1 query)
+  apk_passengers    — header, category totals, boarded/deboarded per stage
+  od_matrix.rebuild — trip OD matrix on trip close
+
+Comparing against the ORM aggregates on real data:
+  python manage.py bench_report_aggregates --company <company_id> --bus <bus_no> --from YYYY-MM-DD --to YYYY-MM-DD
+"""
+
+from decimal import Decimal
+
+import numpy as np
+from django.db import models
+
+from .od_matrix import CATEGORIES, TICKET_FIELDS as CATEGORY_FIELDS
+
+NULL_ID = -1
+
+_PAISE = 100
+
+
+def _encode(field, values):
+    if isinstance(field, models.DecimalField):
+        return np.fromiter(
+            (int(v * _PAISE) if v is not None else 0 for v in values), dtype=np.int64, count=len(values),
+        )
+    if isinstance(field, models.DateField) and not isinstance(field, models.DateTimeField):
+        return np.array(values, dtype='datetime64[D]')
+    if isinstance(field, models.TimeField):
+        return np.fromiter(
+            (v.hour * 3600 + v.minute * 60 + v.second if v is not None else NULL_ID for v in values),
+            dtype=np.int64, count=len(values),
+        )
+    if isinstance(field, (models.IntegerField, models.AutoField, models.ForeignKey)):
+        null = 0 if field.attname in CATEGORY_FIELDS else NULL_ID
+        return np.fromiter(
+            (v if v is not None else null for v in values), dtype=np.int64, count=len(values),
+        )
+    return np.array(values, dtype=object)
+
+
+def to_money(paise) -> Decimal:
+    """int paise (as summed from a DecimalField column) → Decimal rupees, 2 places."""
+    return Decimal(int(paise)).scaleb(-2)
+
+
+class TicketFrame:
+    """Named NumPy columns of one ticket query, all the same length."""
+
+    def __init__(self, columns: dict):
+        self.columns = columns
+
+    @classmethod
+    def load(cls, queryset, *fields) -> 'TicketFrame':
+        """One values_list() query; fields are model field names or attnames."""
+        rows = list(queryset.values_list(*fields))
+        meta = queryset.model._meta
+        values = list(zip(*rows)) if rows else [()] * len(fields)
+        return cls({
+            name: _encode(meta.get_field(name), list(column))
+            for name, column in zip(fields, values)
+        })
+
+    @classmethod
+    def concat(cls, frames) -> 'TicketFrame':
+        """Stack frames with the same columns (e.g. live rows + ticket_archive rows)."""
+        frames = [f for f in frames if f.columns]
+        if not frames:
+            return cls({})
+        return cls({name: np.concatenate([f[name] for f in frames]) for name in frames[0].columns})
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name) -> np.ndarray:
+        return self.columns[name]
+
+    def where(self, mask) -> 'TicketFrame':
+        return TicketFrame({name: column[mask] for name, column in self.columns.items()})
+
+    def date_mask(self, field, from_date, to_date) -> np.ndarray:
+        dates = self.columns[field]
+        return (dates >= np.datetime64(str(from_date), 'D')) & (dates <= np.datetime64(str(to_date), 'D'))
+
+    # ── Aggregates ────────────────────────────────────────────────────────────
+
+    def categories(self) -> np.ndarray:
+        """(rows, 7) passenger counts in CATEGORIES order."""
+        if not len(self):
+            return np.zeros((0, len(CATEGORIES)), dtype=np.int64)
+        return np.column_stack([self.columns[f] for f in CATEGORY_FIELDS])
+
+    def category_totals(self) -> dict:
+        """{'full': n, 'half': n, ...} over all rows."""
+        totals = self.categories().sum(axis=0)
+        return {name: int(totals[i]) for i, name in enumerate(CATEGORIES)}
+
+    def group_sum(self, key, values: np.ndarray):
+        """
+        Sum `values` (1-D, or 2-D with one row per ticket) grouped by column
+        `key`. Returns (sorted unique keys, sums) — NULL keys included.
+        """
+        keys, inverse = np.unique(self.columns[key], return_inverse=True)
+        shape = (len(keys),) + values.shape[1:]
+        sums = np.zeros(shape, dtype=np.int64)
+        np.add.at(sums, inverse, values)
+        return keys, sums
+
+    def fare_histogram(self, amount='ticket_amount'):
+        """[(fare Decimal, ticket_count, revenue Decimal)] ordered by fare."""
+        fares, inverse = np.unique(self.columns[amount], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(fares))
+        return [
+            (to_money(fare), int(count), to_money(fare * count))
+            for fare, count in zip(fares, counts)
+        ]
+
+    def category_totals_by(self, key) -> dict:
+        """{key value: {'full': n, ...}} — e.g. per trip or per from/to stage. NULL keys dropped."""
+        keys, sums = self.group_sum(key, self.categories())
+        return {
+            int(k): {name: int(sums[i, c]) for c, name in enumerate(CATEGORIES)}
+            for i, k in enumerate(keys) if k != NULL_ID
+        }
+
+    def last(self, *order):
+        """Index of the row that sorts last by the given columns (None if empty)."""
+        if not len(self):
+            return None
+        return int(np.lexsort([self.columns[f] for f in reversed(order)])[-1])
+
+    def total(self, field, mask=None) -> int:
+        column = self.columns[field]
+        return int(column[mask].sum() if mask is not None else column.sum())
+
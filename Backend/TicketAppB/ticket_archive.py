@@ -0,0 +1,517 @@
+"""
+TicketArchive
+=============
+Columnar cold storage for old TransactionData. Closed company-days older than
+TICKET_ARCHIVE_AFTER_DAYS (default 120) are exported to files, checked
+against MySQL and deleted from transaction_data. Reports that reach that far
+back combine the archive with the live rows.
+
+Layout
+  <TICKET_ARCHIVE_ROOT>/<company_pk>/<YYYY-MM>/<YYYY-MM-DD>/
+      manifest.json             rows, column kinds, verification totals
+      <attname>.npy             one fixed-width array per column,
+                                np.load(..., mmap_mode='r')
+      <attname>.dict.json.gz    string columns only: the sorted dictionary
+  Rows are stored in (ticket_time, id) order. A TicketArchiveDay row records
+  every archived (company, day). The root must be the same shared volume on
+  every web and worker host.
+
+Column kinds (lossless — NULL has its own value)
+  int       int64            IntegerField / FK id         NULL → INT_NULL
+  decimal   int64            value × 10**decimal_places   NULL → INT_NULL
+  date      datetime64[D]                                 NULL → NaT
+  datetime  datetime64[us]   UTC                          NULL → NaT
+  time      int64            microseconds since midnight  NULL → INT_NULL
+  bool      int8             0 / 1                        NULL → -1
+  str       int32            code into the dictionary     NULL → -1
+
+What is archived
+  Only transaction_data. TripData stays in MySQL — its rows are few, and OD
+  matrices, expenses and odometer records hang off them. A day is due when
+  ticket_date ≤ today - TICKET_ARCHIVE_AFTER_DAYS and none of its tickets
+  belongs to a still-open trip. Tickets referenced by an AggregatorTransaction
+  stay in MySQL (deleting them would null the settlement link). A late ticket
+  for an archived day is stored in MySQL as usual; the next run folds it into
+  the day's files.
+
+Archive run (tasks.archive_ticket_days, nightly)
+  read the day → write a temp dir → in one transaction: lock the rows, reload
+  the files (mmap) and compare row count / id sum / ticket_amount sum with
+  MySQL, move the files into place, record TicketArchiveDay, delete the rows.
+  Any mismatch aborts the day before anything is deleted.
+
+Query layer
+  frame(company, from, to, fields, **filters)  TicketFrame, ticket_agg encoding
+  rows(company, from, to, fields, **filters)   values_list-style tuples in
+                                                (ticket_date, ticket_time) order
+  instances(company, from, to, **filters)      read-only TransactionData objects
+  Filters are equality or __in on model fields. Archived and live rows never
+  overlap, so a view adds these to its own query. Used by the farewise report,
+  the ticket CSV export, the dashboard month totals, the web ticket listing
+  and the apk per-trip ticket / passenger views.
+  restore_day() moves a day back into MySQL.
+"""
+
+import datetime
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models, transaction
+from django.db.models import Count, Exists, OuterRef, Sum
+from django.utils import timezone
+
+from .od_matrix import TICKET_FIELDS as CATEGORY_FIELDS
+from .ticket_agg import NULL_ID, TicketFrame, _encode as _frame_encode
+
+logger = logging.getLogger(__name__)
+
+INT_NULL = int(np.iinfo(np.int64).min)
+CODE_NULL = -1
+
+_MANIFEST = 'manifest.json'
+_FORMAT = 1
+_DELETE_BATCH = 1000
+
+
+class ArchiveVerificationError(Exception):
+    """Files written for a day do not match the rows in MySQL."""
+
+
+def get_archive_root() -> str:
+    return str(getattr(settings, 'TICKET_ARCHIVE_ROOT', os.path.join(settings.BASE_DIR, 'ticket_archive')))
+
+
+def get_archive_after_days() -> int:
+    return int(getattr(settings, 'TICKET_ARCHIVE_AFTER_DAYS', 120))
+
+
+def get_archive_days_per_run() -> int:
+    return int(getattr(settings, 'TICKET_ARCHIVE_DAYS_PER_RUN', 50))
+
+
+def _model():
+    from .models import TransactionData
+    return TransactionData
+
+
+def _day_path(company_id, day) -> str:
+    return os.path.join(get_archive_root(), str(company_id), f'{day:%Y-%m}', str(day))
+
+
+# ── Encoding ──────────────────────────────────────────────────────────────────
+
+def _kind(field) -> str:
+    if isinstance(field, models.DecimalField):
+        return 'decimal'
+    if isinstance(field, models.DateTimeField):
+        return 'datetime'
+    if isinstance(field, models.DateField):
+        return 'date'
+    if isinstance(field, models.TimeField):
+        return 'time'
+    if isinstance(field, models.BooleanField):
+        return 'bool'
+    if isinstance(field, (models.IntegerField, models.AutoField, models.ForeignKey)):
+        return 'int'
+    return 'str'
+
+
+def _encode(field, values):
+    """(array, dictionary or None) for one column of Python values."""
+    kind, count = _kind(field), len(values)
+    if kind == 'decimal':
+        scale = 10 ** field.decimal_places
+        return np.fromiter(
+            (INT_NULL if v is None else int(v * scale) for v in values), dtype=np.int64, count=count,
+        ), None
+    if kind == 'int':
+        return np.fromiter((INT_NULL if v is None else v for v in values), dtype=np.int64, count=count), None
+    if kind == 'date':
+        return np.array(values, dtype='datetime64[D]'), None
+    if kind == 'datetime':
+        return np.array([
+            timezone.make_naive(v, datetime.timezone.utc) if v is not None and timezone.is_aware(v) else v
+            for v in values
+        ], dtype='datetime64[us]'), None
+    if kind == 'time':
+        return np.fromiter((
+            INT_NULL if v is None
+            else ((v.hour * 60 + v.minute) * 60 + v.second) * 1_000_000 + v.microsecond
+            for v in values
+        ), dtype=np.int64, count=count), None
+    if kind == 'bool':
+        return np.fromiter((CODE_NULL if v is None else int(v) for v in values), dtype=np.int8, count=count), None
+
+    dictionary = sorted({v for v in values if v is not None})
+    index = {v: i for i, v in enumerate(dictionary)}
+    codes = np.fromiter((CODE_NULL if v is None else index[v] for v in values), dtype=np.int32, count=count)
+    return codes, dictionary
+
+
+def _decode(kind, field, array, dictionary) -> list:
+    """Python values (as the ORM returns them) for an archived column."""
+    if kind == 'decimal':
+        return [None if v == INT_NULL else Decimal(int(v)).scaleb(-field.decimal_places) for v in array.tolist()]
+    if kind == 'int':
+        return [None if v == INT_NULL else v for v in array.tolist()]
+    if kind == 'date':
+        return [None if np.isnat(v) else v.item() for v in array]
+    if kind == 'datetime':
+        values = [None if np.isnat(v) else v.item() for v in array]
+        if settings.USE_TZ:
+            values = [None if v is None else v.replace(tzinfo=datetime.timezone.utc) for v in values]
+        return values
+    if kind == 'time':
+        return [
+            None if v == INT_NULL
+            else datetime.time(v // 3_600_000_000, v // 60_000_000 % 60, v // 1_000_000 % 60, v % 1_000_000)
+            for v in array.tolist()
+        ]
+    if kind == 'bool':
+        return [None if v == CODE_NULL else bool(v) for v in array.tolist()]
+    return [None if c == CODE_NULL else dictionary[c] for c in array.tolist()]
+
+
+# ── Reading one day ───────────────────────────────────────────────────────────
+
+class ArchivedDay:
+    """Read side of one archived company-day; columns are memory-mapped."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, _MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self.rows = self.manifest['rows']
+        self._dictionaries = {}
+
+    def has(self, attname) -> bool:
+        return attname in self.manifest['columns']
+
+    def kind(self, attname) -> str:
+        return self.manifest['columns'][attname]
+
+    def column(self, attname) -> np.ndarray:
+        return np.load(os.path.join(self.path, f'{attname}.npy'), mmap_mode='r')
+
+    def dictionary(self, attname) -> list:
+        if attname not in self._dictionaries:
+            with gzip.open(os.path.join(self.path, f'{attname}.dict.json.gz'), 'rt', encoding='utf-8') as f:
+                self._dictionaries[attname] = json.load(f)
+        return self._dictionaries[attname]
+
+    def values(self, field, index=None) -> list:
+        """Python values of a model field's column, optionally for some row positions."""
+        if not self.has(field.attname):
+            # Column added to the model after this day was archived.
+            return [None] * (self.rows if index is None else len(index))
+        kind = self.kind(field.attname)
+        array = self.column(field.attname)
+        if index is not None:
+            array = array[index]
+        return _decode(kind, field, array, self.dictionary(field.attname) if kind == 'str' else None)
+
+    def mask(self, filters) -> np.ndarray:
+        """Boolean row mask for {field: value} / {field__in: values} filters."""
+        meta = _model()._meta
+        mask = np.ones(self.rows, dtype=bool)
+        for key, wanted in filters.items():
+            name, lookup = (key[:-4], 'in') if key.endswith('__in') else (key, 'exact')
+            field = meta.get_field(name)
+            wanted = list(wanted) if lookup == 'in' else [wanted]
+            wanted = [getattr(v, 'pk', v) for v in wanted]
+            if not self.has(field.attname):
+                mask &= any(v is None for v in wanted)
+                continue
+            mask &= np.isin(self.column(field.attname), self._encoded(field, wanted))
+        return mask
+
+    def _encoded(self, field, wanted):
+        if self.kind(field.attname) == 'str':
+            index = {v: i for i, v in enumerate(self.dictionary(field.attname))}
+            return np.array(
+                [CODE_NULL if v is None else index.get(v, -2) for v in wanted], dtype=np.int32,
+            )
+        return _encode(field, wanted)[0]
+
+
+def open_day(path) -> ArchivedDay:
+    return ArchivedDay(path)
+
+
+# ── Writing one day ───────────────────────────────────────────────────────────
+
+def _write(path, fields, rows, checks) -> None:
+    os.makedirs(path, exist_ok=True)
+    columns = {}
+    values = list(zip(*rows))
+    for i, field in enumerate(fields):
+        array, dictionary = _encode(field, list(values[i]))
+        np.save(os.path.join(path, f'{field.attname}.npy'), array, allow_pickle=False)
+        if dictionary is not None:
+            with gzip.open(os.path.join(path, f'{field.attname}.dict.json.gz'), 'wt', encoding='utf-8') as f:
+                json.dump(dictionary, f, separators=(',', ':'))
+        columns[field.attname] = _kind(field)
+    with open(os.path.join(path, _MANIFEST), 'w') as f:
+        json.dump({
+            'format': _FORMAT,
+            'table': _model()._meta.db_table,
+            'rows': len(rows),
+            'columns': columns,
+            'checks': checks,
+        }, f, separators=(',', ':'))
+
+
+def _file_checks(path) -> dict:
+    """Totals recomputed from the written files (read back through mmap)."""
+    day = open_day(path)
+    if not day.rows:
+        return {'rows': 0, 'id_sum': 0, 'ticket_amount': 0}
+    amount = day.column('ticket_amount')
+    return {
+        'rows': day.rows,
+        'id_sum': int(day.column('id').sum()),
+        'ticket_amount': int(amount[amount != INT_NULL].sum()),
+    }
+
+
+def _archivable(queryset):
+    """Tickets that may leave MySQL: not on an open trip, not linked to a settlement."""
+    from .models import AggregatorTransaction
+
+    return queryset.exclude(trip_id__is_closed=False).exclude(
+        Exists(AggregatorTransaction.objects.filter(related_ticket=OuterRef('pk')))
+    )
+
+
+def archive_day(company, day) -> int:
+    """
+    Move one closed company-day into the archive (merging with files already
+    there). Returns the number of rows moved out of MySQL.
+    """
+    from .models import TicketArchiveDay
+    from .report_cache import bump_data_version
+
+    TransactionData = _model()
+    fields = list(TransactionData._meta.concrete_fields)
+    attnames = [f.attname for f in fields]
+
+    live = _archivable(TransactionData.objects.filter(company_code=company, ticket_date=day))
+    rows = list(live.values_list(*attnames))
+    if not rows:
+        return 0
+    ids = [row[attnames.index('id')] for row in rows]
+
+    final = _day_path(company.pk, day)
+    record = TicketArchiveDay.objects.filter(company_code=company, day=day).first()
+    previous = open_day(record.path) if record else None
+    if previous is not None:
+        rows = list(zip(*(previous.values(f) for f in fields))) + rows
+    rows.sort(key=lambda r: (r[attnames.index('ticket_time')], r[attnames.index('id')]))
+
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f'.{day}-', dir=os.path.dirname(final))
+    backup = None
+    try:
+        _write(staging, fields, rows, {})
+        with transaction.atomic():
+            locked = list(live.filter(id__in=ids).select_for_update().values_list('id', flat=True))
+            if len(locked) != len(ids):
+                raise ArchiveVerificationError(f'{day}: rows changed while archiving')
+
+            db = TransactionData.objects.filter(id__in=ids).aggregate(
+                rows=Count('id'), id_sum=Sum('id'), ticket_amount=Sum('ticket_amount'),
+            )
+            expected = {
+                'rows': db['rows'],
+                'id_sum': db['id_sum'] or 0,
+                'ticket_amount': int((db['ticket_amount'] or 0) * 100),
+            }
+            if previous is not None:
+                for key, value in previous.manifest['checks'].items():
+                    expected[key] += value
+            written = _file_checks(staging)
+            if written != expected:
+                raise ArchiveVerificationError(f'{day}: files {written} != database {expected}')
+            _set_checks(staging, written)
+
+            if os.path.exists(final):
+                backup = final + '.old'
+                os.replace(final, backup)
+            os.replace(staging, final)
+            staging = None
+
+            TicketArchiveDay.objects.update_or_create(
+                company_code=company, day=day,
+                defaults={
+                    'row_count': written['rows'],
+                    'ticket_amount': Decimal(written['ticket_amount']).scaleb(-2),
+                    'path': final,
+                },
+            )
+            for start in range(0, len(ids), _DELETE_BATCH):
+                TransactionData.objects.filter(id__in=ids[start:start + _DELETE_BATCH]).delete()
+            company_id = company.pk
+            transaction.on_commit(lambda: bump_data_version(company_id, day))
+    except Exception:
+        if backup is not None and os.path.exists(backup):
+            if os.path.exists(final):
+                shutil.rmtree(final)
+            os.replace(backup, final)
+            backup = None
+        raise
+    finally:
+        if staging is not None:
+            shutil.rmtree(staging, ignore_errors=True)
+        if backup is not None:
+            shutil.rmtree(backup, ignore_errors=True)
+    return len(ids)
+
+
+def _set_checks(path, checks) -> None:
+    manifest_path = os.path.join(path, _MANIFEST)
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest['checks'] = checks
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+
+
+def due_days(limit=None):
+    """[(company_id, day)] with archivable tickets, oldest first."""
+    TransactionData = _model()
+    cutoff = timezone.localdate() - datetime.timedelta(days=get_archive_after_days())
+    limit = limit or get_archive_days_per_run()
+
+    candidates = list(
+        _archivable(TransactionData.objects.filter(ticket_date__lte=cutoff, company_code__isnull=False))
+        .values_list('company_code', 'ticket_date').distinct().order_by('ticket_date', 'company_code')[:limit]
+    )
+    if not candidates:
+        return []
+    still_open = set(
+        TransactionData.objects.filter(
+            ticket_date__in={day for _, day in candidates},
+            trip_id__is_closed=False,
+        ).values_list('company_code', 'ticket_date').distinct()
+    )
+    return [c for c in candidates if c not in still_open]
+
+
+def archive_due(limit=None) -> int:
+    """Archive every due day (tasks.archive_ticket_days). Returns rows moved."""
+    from .models import Company
+
+    moved = 0
+    companies = {}
+    for company_id, day in due_days(limit):
+        company = companies.get(company_id)
+        if company is None:
+            company = companies[company_id] = Company.objects.get(pk=company_id)
+        try:
+            moved += archive_day(company, day)
+        except Exception:
+            logger.exception(f'Archiving tickets of company {company_id} for {day} failed')
+    return moved
+
+
+def restore_day(company, day) -> int:
+    """Move an archived day back into transaction_data. Returns rows restored."""
+    from .models import TicketArchiveDay
+    from .report_cache import bump_data_version
+
+    TransactionData = _model()
+    record = TicketArchiveDay.objects.filter(company_code=company, day=day).first()
+    if record is None:
+        return 0
+    archived = open_day(record.path)
+    fields = list(TransactionData._meta.concrete_fields)
+    columns = [archived.values(f) for f in fields]
+    objs = [
+        TransactionData(**{f.attname: value for f, value in zip(fields, row)})
+        for row in zip(*columns)
+    ]
+    with transaction.atomic():
+        for obj in objs:
+            # Raw save, as loaddata does: keeps the archived created_at.
+            obj.save_base(raw=True, force_insert=True)
+        record.delete()
+        company_id = company.pk
+        transaction.on_commit(lambda: bump_data_version(company_id, day))
+    shutil.rmtree(record.path, ignore_errors=True)
+    return len(objs)
+
+
+# ── Query layer ───────────────────────────────────────────────────────────────
+
+def archived_days(company, from_date, to_date) -> list:
+    from .models import TicketArchiveDay
+
+    return list(
+        TicketArchiveDay.objects.filter(company_code=company, day__range=[from_date, to_date]).order_by('day')
+    )
+
+
+def _frame_column(field, day, mask) -> np.ndarray:
+    """One archived column in TicketFrame's encoding (see ticket_agg)."""
+    if not day.has(field.attname):
+        return _frame_encode(field, [None] * int(mask.sum()))
+    kind = day.kind(field.attname)
+    array = np.asarray(day.column(field.attname)[mask])
+    if kind == 'decimal':
+        return np.where(array == INT_NULL, 0, array * 100 // 10 ** field.decimal_places)
+    if kind == 'int':
+        null = 0 if field.attname in CATEGORY_FIELDS else NULL_ID
+        return np.where(array == INT_NULL, null, array)
+    if kind == 'time':
+        return np.where(array == INT_NULL, NULL_ID, array // 1_000_000)
+    if kind == 'date':
+        return array
+    return np.array(day.values(field, np.flatnonzero(mask)), dtype=object)
+
+
+def frame(company, from_date, to_date, fields, **filters) -> TicketFrame:
+    """Archived tickets in the range as a TicketFrame (empty if none)."""
+    meta = _model()._meta
+    parts = []
+    for record in archived_days(company, from_date, to_date):
+        day = open_day(record.path)
+        mask = day.mask(filters)
+        parts.append(TicketFrame({
+            name: _frame_column(meta.get_field(name), day, mask) for name in fields
+        }))
+    return TicketFrame.concat(parts)
+
+
+def rows(company, from_date, to_date, fields, **filters):
+    """
+    Archived tickets in the range as values_list()-style tuples, in
+    (ticket_date, ticket_time, id) order. Generator.
+    """
+    meta = _model()._meta
+    model_fields = [meta.get_field(name) for name in fields]
+    for record in archived_days(company, from_date, to_date):
+        day = open_day(record.path)
+        index = np.flatnonzero(day.mask(filters))
+        if len(index):
+            yield from zip(*(day.values(f, index) for f in model_fields))
+
+
+def instances(company, from_date, to_date, **filters) -> list:
+    """
+    Archived tickets as TransactionData instances, for views that serialize
+    model objects. They are not in MySQL — never save them. Foreign keys load
+    lazily; use prefetch_related_objects() for the relations a view follows.
+    """
+    model = _model()
+    fields = [f.attname for f in model._meta.concrete_fields]
+    return [
+        model.from_db(DEFAULT_DB_ALIAS, fields, row)
+        for row in rows(company, from_date, to_date, fields, **filters)
+    ]
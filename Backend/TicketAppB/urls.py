@@ -1,5 +1,7 @@
 from django.urls import path
 from .views.web import ticket_reports
+from .views.web import live as live_views
+from .views.web import report_jobs as report_job_views
 from .views.web import auth as auth_views
 from .views.web import users as user_views
 from .views.web import depots as depot_views
@@ -99,6 +101,12 @@ urlpatterns = [
     path('get_all_transaction_data', ticket_reports.get_all_transaction_data, name='get_all_transaction_data'),
     path('get_all_trip_data',        ticket_reports.get_all_trip_data,        name='get_all_trip_data'),
     path('get_all_schedule_data',    ticket_reports.get_all_schedule_data,    name='get_all_schedule_data'),
+    path('live_updates',             live_views.live_updates,                 name='live_updates'),
+
+    # background report jobs (long ranges / full ticket export)
+    path('report-jobs',                      report_job_views.submit_report_job, name='submit_report_job'),
+    path('report-jobs/<str:job_id>',         report_job_views.report_job_status, name='report_job_status'),
+    path('report-jobs/<str:job_id>/result',  report_job_views.report_job_result, name='report_job_result'),
 
     # payment aggregator webhooks (aggregator server → us)
     path('postTransactionDetails', aggregator_webhooks.aggregator_settlement_data, name='postTransactionDetails'),
@@ -1,15 +1,92 @@
 import datetime
+from decimal import Decimal
+import numpy as np
 from rest_framework.response import Response
-from django.db.models import Q, Sum, Count
+from django.db.models import Q, Sum, F, Window
+from django.db.models.functions import RowNumber
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from ...models import TransactionData, TripData, ScheduleData, Stage, ExpenseData, Route, RouteStage, VehicleType, AggregatorTransaction
+from ...models import TransactionData, TripData, TripODMatrix, ScheduleData, Stage, ExpenseData, Route, RouteStage, VehicleType, AggregatorTransaction
+from ... import od_matrix, ticket_archive
+from ...ticket_agg import NULL_ID, TicketFrame, to_money
 from ...permissions import LicensePermission
+from ...report_cache import cached_report, single_date, date_range, week_of
+from ...report_shards import collect_sharded
+from ...rate_limit import rate_limited
+from ...db_router import use_reporting_db
 from ..utils import _meets_tier, _TIER_ERROR
 
 PAYMENT_LABELS = {'Cash': 'Cash', 'UPI': 'UPI', 'Card': 'Card'}
 
 
+def _trip_days(trip):
+    """(first, last) ticket_date a trip's tickets can carry — archive lookups."""
+    return trip.start_date, max(trip.end_date or trip.start_date, trip.start_date)
+
+
+def _latest_ticket_per_trip(company, trip_ids, *fields):
+    """
+    Last ticket (by ticket_time) of each trip in one query — ROW_NUMBER()
+    partitioned by trip instead of one ORDER BY ... LIMIT 1 per trip.
+    Yields dicts with trip_id plus the requested fields.
+    """
+    return TransactionData.objects.filter(
+        company_code=company,
+        trip_id__in=trip_ids,
+    ).annotate(
+        rn=Window(
+            expression=RowNumber(),
+            partition_by=[F('trip_id')],
+            order_by=[F('ticket_time').desc(), F('id').desc()],
+        ),
+    ).filter(rn=1).values('trip_id', *fields)
+
+
+def _trip_rows(company, trips):
+    """
+    apk_trips / apk_bus_timeline row for each trip. Closed trips carry their
+    own totals; live totals for all open trips come from one grouped query.
+    """
+    trips = list(trips)
+    open_ids = [t.id for t in trips if not t.is_closed]
+    live = {}
+    if open_ids:
+        live = {
+            r['trip_id']: r
+            for r in TransactionData.objects.filter(
+                company_code=company,
+                trip_id__in=open_ids,
+            ).values('trip_id').annotate(
+                total=Sum('ticket_amount'),
+                upi=Sum('ticket_amount', filter=Q(ticket_status='UPI')),
+            )
+        }
+
+    rows = []
+    for t in trips:
+        if t.is_closed:
+            revenue = t.total_collection or 0
+            upi_amt = t.upi_ticket_amount or 0
+        else:
+            agg = live.get(t.id, {})
+            revenue = agg.get('total') or 0
+            upi_amt = agg.get('upi') or 0
+
+        cash_amt = revenue - upi_amt
+        rows.append({
+            'trip_no': t.trip_no,
+            'status': 'open' if not t.is_closed else 'closed',
+            'route_name': t.route_id.route_name if t.route_id else None,
+            'route_code': t.route_id.route_code if t.route_id else None,
+            'start_time': str(t.start_time) if t.start_time else None,
+            'end_time': str(t.end_time) if t.end_time else None,
+            'revenue': str(revenue),
+            'cash_amt': str(cash_amt),
+            'upi_amt': str(upi_amt),
+        })
+    return rows
+
+
 # GET /apk/buses
 # Returns all active bus registration numbers for the company.
 @api_view(['GET'])
@@ -68,11 +145,80 @@ def apk_schedules(request):
     })
 
 
+# GET /apk/bus-timeline
+# One-call drill-down for a bus on a date: schedules, each with its trips
+# (same rows as /apk/trips), plus live totals for the bus.
+# Replaces the buses → schedules → trips sequence of calls.
+# Params: bus_no, date (YYYY-MM-DD)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('apk_bus_timeline', single_date('date'))
+@rate_limited('apk_bus_timeline')
+@use_reporting_db(single_date('date'))
+def apk_bus_timeline(request):
+    user = request.user
+
+    bus_no = request.GET.get('bus_no')
+    date_str = request.GET.get('date')
+
+    if not bus_no or not date_str:
+        return Response({'error': 'bus_no and date are required'}, status=400)
+
+    schedules = list(
+        ScheduleData.objects.filter(
+            company_code=user.company,
+            bus_no=bus_no,
+            start_date=date_str,
+        ).order_by('schedule_no').values('id', 'schedule_no', 'is_closed')
+    )
+
+    # Same guard as apk_trips: only trips whose schedule opened on this date.
+    trips = list(
+        TripData.objects.filter(
+            company_code=user.company,
+            bus_no=bus_no,
+            start_date=date_str,
+            schedule_id__start_date=date_str,
+        ).select_related('route_id').order_by('schedule_no', 'trip_no')
+    )
+    rows = _trip_rows(user.company, trips)
+
+    trips_by_schedule = {}
+    for t, row in zip(trips, rows):
+        trips_by_schedule.setdefault(t.schedule_id_id, []).append(row)
+
+    totals = {'revenue': 0, 'cash_amt': 0, 'upi_amt': 0}
+    for row in rows:
+        for key in totals:
+            totals[key] += Decimal(row[key])
+
+    return Response({
+        'bus_no': bus_no,
+        'date': date_str,
+        'schedules': [
+            {
+                'schedule_no': s['schedule_no'],
+                'status': 'closed' if s['is_closed'] else 'open',
+                'trips': trips_by_schedule.get(s['id'], []),
+            }
+            for s in schedules
+        ],
+        'totals': {
+            'trips': len(rows),
+            'open_trips': sum(1 for row in rows if row['status'] == 'open'),
+            **{key: str(value) for key, value in totals.items()},
+        },
+    })
+
+
 # GET /apk/dashboard
 # APK home dashboard: revenue header, weekly chart (Mon–Sun), per-bus list with status.
 # Params: date (YYYY-MM-DD)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('apk_dashboard', week_of('date'))
+@rate_limited('apk_dashboard')
+@use_reporting_db(week_of('date'))
 def apk_dashboard(request):
     user = request.user
 
@@ -103,7 +249,7 @@ def apk_dashboard(request):
     # Alternate: keyed on the schedule's own start_date (same gate as bus status below)
     open_day = TransactionData.objects.filter(
         company_code=company,
-        schedule_id__start_date=date_str,
+        schedule_start_date=date_str,
         trip_id__is_closed=False,
     ).aggregate(
         total=Sum('ticket_amount'),
@@ -146,7 +292,7 @@ def apk_dashboard(request):
         row['bus_no']: row
         for row in TransactionData.objects.filter(
             company_code=company,
-            schedule_id__start_date=date_str,
+            schedule_start_date=date_str,
             trip_id__is_closed=False,
             bus_no__isnull=False,
         ).values('bus_no').annotate(
@@ -227,12 +373,12 @@ def apk_dashboard(request):
 
     # Alternate: keyed on the schedule's own start_date
     open_weekly = {
-        str(r['schedule_id__start_date']): {'total': r['total'] or 0, 'upi': r['upi'] or 0}
+        str(r['schedule_start_date']): {'total': r['total'] or 0, 'upi': r['upi'] or 0}
         for r in TransactionData.objects.filter(
             company_code=company,
-            schedule_id__start_date__range=[week_start, week_end],
+            schedule_start_date__range=[week_start, week_end],
             trip_id__is_closed=False,
-        ).values('schedule_id__start_date').annotate(
+        ).values('schedule_start_date').annotate(
             total=Sum('ticket_amount'),
             upi=Sum('ticket_amount', filter=Q(ticket_status='UPI')),
         )
@@ -266,6 +412,9 @@ def apk_dashboard(request):
 # Params: bus_no, schedule_no, date (YYYY-MM-DD)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('apk_trips', single_date('date'))
+@rate_limited('apk_trips')
+@use_reporting_db(single_date('date'))
 def apk_trips(request):
     user = request.user
 
@@ -294,34 +443,7 @@ def apk_trips(request):
         schedule_id__start_date=date_str,
     ).select_related('route_id').order_by('trip_no')
 
-    trip_list = []
-    for t in trips:
-        if t.is_closed:
-            revenue = t.total_collection or 0
-            upi_amt = t.upi_ticket_amount or 0
-        else:
-            live = TransactionData.objects.filter(
-                company_code=user.company,
-                trip_id=t,
-            ).aggregate(
-                total=Sum('ticket_amount'),
-                upi=Sum('ticket_amount', filter=Q(ticket_status='UPI')),
-            )
-            revenue = live['total'] or 0
-            upi_amt = live['upi'] or 0
-
-        cash_amt = revenue - upi_amt
-        trip_list.append({
-            'trip_no': t.trip_no,
-            'status': 'open' if not t.is_closed else 'closed',
-            'route_name': t.route_id.route_name if t.route_id else None,
-            'route_code': t.route_id.route_code if t.route_id else None,
-            'start_time': str(t.start_time) if t.start_time else None,
-            'end_time': str(t.end_time) if t.end_time else None,
-            'revenue': str(revenue),
-            'cash_amt': str(cash_amt),
-            'upi_amt': str(upi_amt),
-        })
+    trip_list = _trip_rows(user.company, trips)
 
     return Response({
         'bus_no': bus_no,
@@ -336,6 +458,9 @@ def apk_trips(request):
 # Params: bus_no, schedule_no, trip_no, date (YYYY-MM-DD)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('apk_tickets', single_date('date'))
+@rate_limited('apk_tickets')
+@use_reporting_db(single_date('date'))
 def apk_tickets(request):
     user = request.user
 
@@ -391,10 +516,13 @@ def apk_tickets(request):
         company_code=user.company,
         trip_id=trip,
     ).order_by('ticket_time')
+    # A closed trip's tickets may have moved to the cold archive.
+    archived = ticket_archive.instances(user.company, *_trip_days(trip), trip_id=trip.pk) if trip.is_closed else []
+    tickets = sorted([*qs, *archived], key=lambda t: (t.ticket_time or datetime.time.min, t.id)) if archived else qs
 
     totals = {'full': 0, 'half': 0, 'st': 0, 'phy': 0, 'lugg': 0, 'ladies': 0, 'senior': 0}
     ticket_list = []
-    for t in qs:
+    for t in tickets:
         totals['full'] += t.full_count or 0
         totals['half'] += t.half_count or 0
         totals['st'] += t.st_count or 0
@@ -431,6 +559,9 @@ def apk_tickets(request):
 # Params: bus_no, schedule_no, trip_no, date (YYYY-MM-DD)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('apk_passengers', single_date('date'))
+@rate_limited('apk_passengers')
+@use_reporting_db(single_date('date'))
 def apk_passengers(request):
     user = request.user
 
@@ -486,64 +617,59 @@ def apk_passengers(request):
             .order_by('sequence_no')
         )
 
+    # One query: every aggregate below is computed from these columns.
+    frame = TicketFrame.load(
+        qs, 'ticket_time', 'id', 'ticket_amount', 'from_stage_id', 'to_stage_id', 'passenger_count',
+        *od_matrix.TICKET_FIELDS,
+    )
+    # A closed trip's tickets may have moved to the cold archive.
+    if trip.is_closed:
+        frame = TicketFrame.concat([frame, ticket_archive.frame(
+            user.company, *_trip_days(trip), frame.columns, trip_id=trip.pk,
+        )])
+
     # ── Header ────────────────────────────────────────────────────────────────
     status = 'open' if not trip.is_closed else 'closed'
     if status == 'open':
-        last_ticket = qs.order_by('-ticket_time').values('to_stage_id_id', 'passenger_count').first()
-        if last_ticket and last_ticket['to_stage_id_id']:
-            try:
-                rs = RouteStage.objects.select_related('stage').get(id=last_ticket['to_stage_id_id'])
-                current_stage = rs.stage.stage_name
-            except RouteStage.DoesNotExist:
-                current_stage = None
-        else:
-            current_stage = None
-        passengers_in_bus = last_ticket['passenger_count'] if last_ticket else None
-
-        live = qs.aggregate(
-            total=Sum('ticket_amount'),
-            upi=Sum('ticket_amount', filter=Q(ticket_status='UPI')),
-        )
-        total_collection = live['total'] or 0
+        last = frame.last('ticket_time', 'id')
+        stage_names = {rs.id: rs.stage.stage_name for rs in route_stages}
+        current_stage = stage_names.get(int(frame['to_stage_id'][last])) if last is not None else None
+        passengers_in_bus = None
+        if last is not None and frame['passenger_count'][last] != NULL_ID:
+            passengers_in_bus = int(frame['passenger_count'][last])
+        total_collection = to_money(frame.total('ticket_amount')) if len(frame) else 0
     else:
         current_stage = None
         passengers_in_bus = None
         total_collection = trip.total_collection or 0
 
     # ── Passenger totals ──────────────────────────────────────────────────────
-    agg = qs.aggregate(
-        full=Sum('full_count'), half=Sum('half_count'),
-        st=Sum('st_count'), phy=Sum('phy_count'),
-        lugg=Sum('lugg_count'), ladies=Sum('ladies_count'), senior=Sum('senior_count'),
-    )
-    passenger_totals = {k: v or 0 for k, v in agg.items()}
+    passenger_totals = frame.category_totals()
 
     # ── Stage table: keyed by RouteStage PK (from_stage_id_id / to_stage_id_id) ──
     empty = {'f': 0, 'h': 0, 'st': 0, 'ph': 0}
 
-    boarded = {
-        r['from_stage_id_id']: {
-            'f': r['full'] or 0, 'h': r['half'] or 0,
-            'st': r['st'] or 0, 'ph': r['phy'] or 0,
-        }
-        for r in qs.values('from_stage_id_id').annotate(
-            full=Sum('full_count'), half=Sum('half_count'),
-            st=Sum('st_count'), phy=Sum('phy_count'),
-        )
-        if r['from_stage_id_id'] is not None
-    }
+    od = TripODMatrix.objects.filter(trip=trip).only('stage_count', 'data').first()
+    if od and route_stages:
+        # Materialised OD matrix: ordinal i ↔ route_stages[i] (sequence order,
+        # same mapping the ingest task used for from_stage_id/to_stage_id).
+        board, alight = od_matrix.stage_flows(od_matrix.to_array(od))
+        f, h, st, ph = (od_matrix.CATEGORIES.index(c) for c in ('full', 'half', 'st', 'phy'))
 
-    deboarded = {
-        r['to_stage_id_id']: {
-            'f': r['full'] or 0, 'h': r['half'] or 0,
-            'st': r['st'] or 0, 'ph': r['phy'] or 0,
-        }
-        for r in qs.values('to_stage_id_id').annotate(
-            full=Sum('full_count'), half=Sum('half_count'),
-            st=Sum('st_count'), phy=Sum('phy_count'),
-        )
-        if r['to_stage_id_id'] is not None
-    }
+        def _flow(m, i):
+            return {'f': int(m[f, i]), 'h': int(m[h, i]), 'st': int(m[st, i]), 'ph': int(m[ph, i])}
+
+        boarded = {rs.id: _flow(board, i) for i, rs in enumerate(route_stages) if i < od.stage_count}
+        deboarded = {rs.id: _flow(alight, i) for i, rs in enumerate(route_stages) if i < od.stage_count}
+    else:
+        def _flows(stage_field):
+            return {
+                sid: {'f': c['full'], 'h': c['half'], 'st': c['st'], 'ph': c['phy']}
+                for sid, c in frame.category_totals_by(stage_field).items()
+            }
+
+        boarded = _flows('from_stage_id')
+        deboarded = _flows('to_stage_id')
 
     if route_stages:
         stage_table = [
@@ -587,6 +713,9 @@ def apk_passengers(request):
 # Params: bus_no, date (YYYY-MM-DD)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('duty', single_date('date'))
+@rate_limited('duty')
+@use_reporting_db(single_date('date'))
 def duty_report(request):
     user = request.user
     if not _meets_tier(user, 'intermediate'):
@@ -607,6 +736,27 @@ def duty_report(request):
         'total_collection', 'is_closed', 'driver', 'conductor'
     )
 
+    trips = list(trips)
+
+    # Open trips: live collection + last ticket for all of them in two queries
+    open_ids = [t['id'] for t in trips if not t['is_closed']]
+    live_collection = {}
+    last_ticket = {}
+    if open_ids:
+        # Not gated on ticket_date — tickets punched after midnight under the
+        # same still-open trip still belong to it.
+        live_collection = {
+            r['trip_id']: r['live_collection']
+            for r in TransactionData.objects.filter(
+                company_code=user.company,
+                trip_id__in=open_ids,
+            ).values('trip_id').annotate(live_collection=Sum('ticket_amount'))
+        }
+        last_ticket = {
+            r['trip_id']: r['ticket_number']
+            for r in _latest_ticket_per_trip(user.company, open_ids, 'ticket_number')
+        }
+
     driver_name = None
     conductor_name = None
     trip_list = []
@@ -620,29 +770,8 @@ def duty_report(request):
             end_ticket = t['end_ticket_no']
             collection = str(t['total_collection'])
         else:
-            # Current: also gated on ticket_date — drops tickets punched after midnight
-            # under the same still-open trip.
-            # live = TransactionData.objects.filter(
-            #     company_code=user.company,
-            #     trip_id=t['id'],
-            #     ticket_date=date_str,
-            # ).aggregate(live_collection=Sum('ticket_amount'))
-            # last_ticket = TransactionData.objects.filter(
-            #     company_code=user.company,
-            #     trip_id=t['id'],
-            #     ticket_date=date_str,
-            # ).order_by('-ticket_time').values_list('ticket_number', flat=True).first()
-
-            live = TransactionData.objects.filter(
-                company_code=user.company,
-                trip_id=t['id'],
-            ).aggregate(live_collection=Sum('ticket_amount'))
-            last_ticket = TransactionData.objects.filter(
-                company_code=user.company,
-                trip_id=t['id'],
-            ).order_by('-ticket_time').values_list('ticket_number', flat=True).first()
-            end_ticket = last_ticket
-            collection = str(live['live_collection'] or '0.00')
+            end_ticket = last_ticket.get(t['id'])
+            collection = str(live_collection.get(t['id']) or '0.00')
 
         trip_list.append({
             'trip_no': t['trip_no'],
@@ -661,106 +790,96 @@ def duty_report(request):
     })
 
 
-# GET /reports/bus-summary
-# Per-date revenue and distance for a bus over a date range.
-# Params: bus_no, from_date (YYYY-MM-DD), to_date (YYYY-MM-DD)
-@api_view(['GET'])
-@permission_classes([IsAuthenticated, LicensePermission])
-def bus_summary_report(request):
-    user = request.user
-    if not _meets_tier(user, 'intermediate'):
-        return Response(_TIER_ERROR, status=403)
-
-    bus_no = request.GET.get('bus_no')
-    from_date = request.GET.get('from_date')
-    to_date = request.GET.get('to_date')
+def _collect_bus_summary(company, params, from_date, to_date, acc):
+    bus_no = params['bus_no']
 
-    if not bus_no or not from_date or not to_date:
-        return Response({'error': 'bus_no, from_date and to_date are required'}, status=400)
+    def _day(date):
+        return acc.setdefault(str(date), {'revenue': 0, 'distance': 0})
 
-    closed_qs = TripData.objects.filter(
-        company_code=user.company,
+    for r in TripData.objects.filter(
+        company_code=company,
         bus_no=bus_no,
         start_date__range=[from_date, to_date],
         is_closed=True,
     ).values('start_date').annotate(
         revenue=Sum('total_collection'),
         distance=Sum('total_km'),
-    )
-    closed_map = {
-        str(r['start_date']): {'revenue': r['revenue'] or 0, 'distance': r['distance'] or 0}
-        for r in closed_qs
-    }
+    ):
+        day = _day(r['start_date'])
+        day['revenue'] += r['revenue'] or 0
+        day['distance'] += r['distance'] or 0
 
-    open_revenue = {
-        str(r['ticket_date']): r['collection'] or 0
-        for r in TransactionData.objects.filter(
-            company_code=user.company,
+    for r in TransactionData.objects.filter(
+        company_code=company,
+        bus_no=bus_no,
+        ticket_date__range=[from_date, to_date],
+        trip_id__is_closed=False,
+    ).values('ticket_date').annotate(collection=Sum('ticket_amount')):
+        _day(r['ticket_date'])['revenue'] += r['collection'] or 0
+
+    open_trips = dict(
+        TripData.objects.filter(
+            company_code=company,
             bus_no=bus_no,
-            ticket_date__range=[from_date, to_date],
-            trip_id__is_closed=False,
-        ).values('ticket_date').annotate(collection=Sum('ticket_amount'))
-    }
+            start_date__range=[from_date, to_date],
+            is_closed=False,
+            route_id__isnull=False,
+        ).values_list('id', 'start_date')
+    )
+    last_stage = {
+        r['trip_id']: r['to_stage_id_id']
+        for r in _latest_ticket_per_trip(company, list(open_trips), 'to_stage_id_id')
+        if r['to_stage_id_id'] is not None
+    } if open_trips else {}
+    stage_distance = dict(
+        RouteStage.objects.filter(id__in=set(last_stage.values())).values_list('id', 'distance')
+    ) if last_stage else {}
 
-    open_distance = {}
-    for trip in TripData.objects.filter(
-        company_code=user.company,
-        bus_no=bus_no,
-        start_date__range=[from_date, to_date],
-        is_closed=False,
-        route_id__isnull=False,
-    ).select_related('route_id'):
-        last = TransactionData.objects.filter(
-            company_code=user.company,
-            trip_id=trip,
-        ).order_by('-ticket_time').values('to_stage_id_id').first()
-        if last and last['to_stage_id_id'] is not None:
-            try:
-                rs = RouteStage.objects.get(id=last['to_stage_id_id'])
-                date_key = str(trip.start_date)
-                open_distance[date_key] = open_distance.get(date_key, 0) + (rs.distance or 0)
-            except RouteStage.DoesNotExist:
-                pass
-
-    all_dates = sorted(set(closed_map.keys()) | set(open_revenue.keys()) | set(open_distance.keys()))
-
-    rows = [
-        {
-            'date': date,
-            'revenue': str((closed_map.get(date, {}).get('revenue', 0)) + open_revenue.get(date, 0)),
-            'distance': str((closed_map.get(date, {}).get('distance', 0)) + open_distance.get(date, 0)),
-        }
-        for date in all_dates
-    ]
+    for trip_id, stage_id in last_stage.items():
+        if stage_id not in stage_distance:
+            continue
+        _day(open_trips[trip_id])['distance'] += stage_distance[stage_id] or 0
+    return acc
 
-    return Response({'rows': rows})
 
+def _render_bus_summary(acc, params):
+    return {
+        'rows': [
+            {
+                'date': date,
+                'revenue': str(acc[date]['revenue']),
+                'distance': str(acc[date]['distance']),
+            }
+            for date in sorted(acc)
+        ]
+    }
 
-# GET /reports/payment-type
-# Per-date cash/UPI breakdown for a bus over a date range.
-# Params: bus_no, from_date (YYYY-MM-DD), to_date (YYYY-MM-DD),
-#         payment_mode (cash | upi) — optional, returns both if omitted
+
+# GET /reports/bus-summary
+# Per-date revenue and distance for a bus over a date range.
+# Params: bus_no, from_date (YYYY-MM-DD), to_date (YYYY-MM-DD)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
-def payment_type_report(request):
-    user = request.user
-    if not _meets_tier(user, 'intermediate'):
-        return Response(_TIER_ERROR, status=403)
-
-    bus_no = request.GET.get('bus_no')
-    from_date = request.GET.get('from_date')
-    to_date = request.GET.get('to_date')
-    payment_mode = request.GET.get('payment_mode', '').lower()
+@cached_report('bus_summary', date_range())
+@rate_limited('bus_summary')
+@use_reporting_db(date_range())
+def bus_summary_report(request):
+    return _range_report(request, _collect_bus_summary, _render_bus_summary, shard='bus_summary')
 
-    if not bus_no or not from_date or not to_date:
-        return Response({'error': 'bus_no, from_date and to_date are required'}, status=400)
 
-    want_cash = payment_mode in ('', 'cash')
-    want_upi = payment_mode in ('', 'upi')
+# ── Range reports ─────────────────────────────────────────────────────────────
+# payment-type, farewise and expense are split into collect / render so that
+# report_jobs.py can walk a long range chunk by chunk in a Celery worker:
+#   _collect_<report>(company, params, from_date, to_date, acc) folds one
+#       sub-range into acc (every date falls in exactly one chunk)
+#   _render_<report>(acc, params) builds the response body
+# The views run a single collect over the whole requested range, or — with
+# shard= — one per week through report_shards, which caches closed weeks.
 
-    closed_map = {}
+def _collect_payment_type(company, params, from_date, to_date, acc):
+    bus_no = params['bus_no']
     for r in TripData.objects.filter(
-        company_code=user.company,
+        company_code=company,
         bus_no=bus_no,
         start_date__range=[from_date, to_date],
         is_closed=True,
@@ -768,35 +887,38 @@ def payment_type_report(request):
         total=Sum('total_collection'),
         upi=Sum('upi_ticket_amount'),
     ):
-        date = str(r['start_date'])
+        day = acc.setdefault(str(r['start_date']), {'cash': 0, 'upi': 0})
         upi = r['upi'] or 0
         total = r['total'] or 0
-        closed_map[date] = {'cash': total - upi, 'upi': upi}
+        day['cash'] += total - upi
+        day['upi'] += upi
 
-    open_map = {}
     for r in TransactionData.objects.filter(
-        company_code=user.company,
+        company_code=company,
         bus_no=bus_no,
         ticket_date__range=[from_date, to_date],
         trip_id__is_closed=False,
         ticket_status__in=['Cash', 'UPI'],
     ).values('ticket_date', 'ticket_status').annotate(amount=Sum('ticket_amount')):
-        date = str(r['ticket_date'])
-        if date not in open_map:
-            open_map[date] = {'cash': 0, 'upi': 0}
+        day = acc.setdefault(str(r['ticket_date']), {'cash': 0, 'upi': 0})
         if r['ticket_status'] == 'Cash':
-            open_map[date]['cash'] += r['amount'] or 0
+            day['cash'] += r['amount'] or 0
         else:
-            open_map[date]['upi'] += r['amount'] or 0
+            day['upi'] += r['amount'] or 0
+    return acc
 
-    all_dates = sorted(set(closed_map.keys()) | set(open_map.keys()))
+
+def _render_payment_type(acc, params):
+    payment_mode = params.get('payment_mode', '').lower()
+    want_cash = payment_mode in ('', 'cash')
+    want_upi = payment_mode in ('', 'upi')
 
     rows = []
     total_cash = 0
     total_upi = 0
-    for date in all_dates:
-        cash = closed_map.get(date, {}).get('cash', 0) + open_map.get(date, {}).get('cash', 0)
-        upi = closed_map.get(date, {}).get('upi', 0) + open_map.get(date, {}).get('upi', 0)
+    for date in sorted(acc):
+        cash = acc[date]['cash']
+        upi = acc[date]['upi']
         total_cash += cash
         total_upi += upi
         row = {'date': date}
@@ -812,61 +934,42 @@ def payment_type_report(request):
     if want_upi:
         totals['total_upi'] = str(total_upi)
 
-    return Response({'rows': rows, 'totals': totals})
+    return {'rows': rows, 'totals': totals}
 
 
-# GET /reports/farewise
-# Fare-wise ticket count/revenue and per-trip passenger counts for a date range.
-# Params: bus_no, from_date (YYYY-MM-DD), to_date (YYYY-MM-DD)
-@api_view(['GET'])
-@permission_classes([IsAuthenticated, LicensePermission])
-def farewise_report(request):
-    user = request.user
-    if not _meets_tier(user, 'intermediate'):
-        return Response(_TIER_ERROR, status=403)
-
-    bus_no = request.GET.get('bus_no')
-    from_date = request.GET.get('from_date')
-    to_date = request.GET.get('to_date')
+def _collect_farewise(company, params, from_date, to_date, acc):
+    bus_no = params['bus_no']
+    trips = list(TripData.objects.filter(
+        company_code=company,
+        bus_no=bus_no,
+        start_date__range=[from_date, to_date],
+    ).order_by('start_date', 'trip_no'))
+    open_trip_ids = [t.id for t in trips if not t.is_closed]
 
-    if not bus_no or not from_date or not to_date:
-        return Response({'error': 'bus_no, from_date and to_date are required'}, status=400)
+    # One ticket query feeds both tables: the range's tickets for the fare
+    # histogram, plus every ticket of a still-open trip (including ones
+    # punched after midnight) for its live passenger counts.
+    frame = TicketFrame.load(
+        TransactionData.objects.filter(company_code=company).filter(
+            Q(bus_no=bus_no, ticket_date__range=[from_date, to_date]) | Q(trip_id__in=open_trip_ids)
+        ),
+        'ticket_date', 'ticket_amount', 'trip_id', *od_matrix.TICKET_FIELDS,
+    )
+    # Days moved to the cold archive are closed, so they only add fares.
+    frame = TicketFrame.concat([frame, ticket_archive.frame(
+        company, from_date, to_date, frame.columns, bus_no=bus_no,
+    )])
 
-    fares = [
-        {
-            'fare': str(r['ticket_amount']),
-            'ticket_count': r['ticket_count'],
-            'revenue': str(r['revenue'] or '0.00'),
-        }
-        for r in TransactionData.objects.filter(
-            company_code=user.company,
-            bus_no=bus_no,
-            ticket_date__range=[from_date, to_date],
-        ).values('ticket_amount').annotate(
-            ticket_count=Count('id'),
-            revenue=Sum('ticket_amount'),
-        ).order_by('ticket_amount')
-    ]
+    fares = acc.setdefault('fares', {})
+    in_range = frame.where(frame.date_mask('ticket_date', from_date, to_date))
+    for amount, ticket_count, revenue in in_range.fare_histogram():
+        fare = fares.setdefault(amount, {'ticket_count': 0, 'revenue': 0})
+        fare['ticket_count'] += ticket_count
+        fare['revenue'] += revenue
 
-    trips = TripData.objects.filter(
-        company_code=user.company,
-        bus_no=bus_no,
-        start_date__range=[from_date, to_date],
-    ).order_by('start_date', 'trip_no')
+    open_agg = frame.where(np.isin(frame['trip_id'], open_trip_ids)).category_totals_by('trip_id')
 
-    open_trip_ids = [t.id for t in trips if not t.is_closed]
-    open_agg = {}
-    if open_trip_ids:
-        for row in TransactionData.objects.filter(
-            trip_id__in=open_trip_ids,
-        ).values('trip_id').annotate(
-            full=Sum('full_count'), half=Sum('half_count'),
-            st=Sum('st_count'), phy=Sum('phy_count'),
-            lugg=Sum('lugg_count'), ladies=Sum('ladies_count'), senior=Sum('senior_count'),
-        ):
-            open_agg[row['trip_id']] = row
-
-    passenger_counts = []
+    passenger_counts = acc.setdefault('passenger_counts', [])
     for t in trips:
         if t.is_closed:
             passenger_counts.append({
@@ -895,11 +998,112 @@ def farewise_report(request):
                 'ladies': agg.get('ladies') or 0,
                 'senior': agg.get('senior') or 0,
             })
+    return acc
 
-    return Response({
-        'fares': fares,
-        'passenger_counts': passenger_counts,
-    })
+
+def _render_farewise(acc, params):
+    fares = acc.get('fares', {})
+    return {
+        'fares': [
+            {
+                'fare': str(amount),
+                'ticket_count': fares[amount]['ticket_count'],
+                'revenue': str(fares[amount]['revenue'] or '0.00'),
+            }
+            for amount in sorted(fares)
+        ],
+        'passenger_counts': acc.get('passenger_counts', []),
+    }
+
+
+def _collect_expense(company, params, from_date, to_date, acc):
+    bus_no = params['bus_no']
+    for r in TripData.objects.filter(
+        company_code=company,
+        bus_no=bus_no,
+        start_date__range=[from_date, to_date],
+        is_closed=True,
+    ).values('start_date').annotate(collection=Sum('total_collection')):
+        day = acc.setdefault(str(r['start_date']), {'collection': 0, 'expense': 0})
+        day['collection'] += r['collection'] or 0
+
+    for r in TransactionData.objects.filter(
+        company_code=company,
+        bus_no=bus_no,
+        ticket_date__range=[from_date, to_date],
+        trip_id__is_closed=False,
+    ).values('ticket_date').annotate(collection=Sum('ticket_amount')):
+        day = acc.setdefault(str(r['ticket_date']), {'collection': 0, 'expense': 0})
+        day['collection'] += r['collection'] or 0
+
+    for e in ExpenseData.objects.filter(
+        company_code=company,
+        bus_no=bus_no,
+        expense_date__range=[from_date, to_date],
+    ).values('expense_date').annotate(expense=Sum('expense_amount')):
+        day = acc.setdefault(str(e['expense_date']), {'collection': 0, 'expense': 0})
+        day['expense'] += e['expense'] or 0
+    return acc
+
+
+def _render_expense(acc, params):
+    return {
+        'rows': [
+            {
+                'date': date,
+                'collection': str(acc[date]['collection']),
+                'expense': str(acc[date]['expense']),
+            }
+            for date in sorted(acc)
+        ]
+    }
+
+
+def _range_report(request, collect, render, shard=None):
+    user = request.user
+    if not _meets_tier(user, 'intermediate'):
+        return Response(_TIER_ERROR, status=403)
+
+    from_date = request.GET.get('from_date')
+    to_date = request.GET.get('to_date')
+    if not request.GET.get('bus_no') or not from_date or not to_date:
+        return Response({'error': 'bus_no, from_date and to_date are required'}, status=400)
+
+    if shard is None:
+        acc = collect(user.company, request.GET, from_date, to_date, {})
+    else:
+        try:
+            acc = collect_sharded(
+                shard, collect, user.company, request.GET, from_date, to_date, key_params=('bus_no',),
+            )
+        except ValueError:
+            return Response({'error': 'from_date and to_date must be YYYY-MM-DD'}, status=400)
+    return Response(render(acc, request.GET))
+
+
+# GET /reports/payment-type
+# Per-date cash/UPI breakdown for a bus over a date range.
+# Params: bus_no, from_date (YYYY-MM-DD), to_date (YYYY-MM-DD),
+#         payment_mode (cash | upi) — optional, returns both if omitted
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('payment_type', date_range())
+@rate_limited('payment_type')
+@use_reporting_db(date_range())
+def payment_type_report(request):
+    return _range_report(request, _collect_payment_type, _render_payment_type, shard='payment_type')
+
+
+# GET /reports/farewise
+# Fare-wise ticket count/revenue and per-trip passenger counts for a date range.
+# Params: bus_no, from_date (YYYY-MM-DD), to_date (YYYY-MM-DD)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('farewise', date_range())
+@rate_limited('farewise')
+@use_reporting_db(date_range())
+def farewise_report(request):
+    return _range_report(request, _collect_farewise, _render_farewise)
 
 
 # GET /reports/expense
@@ -907,63 +1111,60 @@ def farewise_report(request):
 # Params: bus_no, from_date (YYYY-MM-DD), to_date (YYYY-MM-DD)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('expense', date_range())
+@rate_limited('expense')
+@use_reporting_db(date_range())
 def expense_report(request):
+    return _range_report(request, _collect_expense, _render_expense)
+
+
+# GET /reports/od-matrix
+# Origin–destination passenger matrix for a route over a date range, summed
+# from the per-trip TripODMatrix rows (no transaction_data scan).
+# Params: route_code, from_date (YYYY-MM-DD), to_date (YYYY-MM-DD)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('od_matrix', date_range())
+@rate_limited('od_matrix')
+@use_reporting_db(date_range())
+def od_matrix_report(request):
     user = request.user
     if not _meets_tier(user, 'intermediate'):
         return Response(_TIER_ERROR, status=403)
 
-    bus_no = request.GET.get('bus_no')
+    route_code = request.GET.get('route_code')
     from_date = request.GET.get('from_date')
     to_date = request.GET.get('to_date')
 
-    if not bus_no or not from_date or not to_date:
-        return Response({'error': 'bus_no, from_date and to_date are required'}, status=400)
-
-    closed_revenue = {
-        str(r['start_date']): r['collection'] or 0
-        for r in TripData.objects.filter(
-            company_code=user.company,
-            bus_no=bus_no,
-            start_date__range=[from_date, to_date],
-            is_closed=True,
-        ).values('start_date').annotate(collection=Sum('total_collection'))
-    }
-
-    open_revenue = {
-        str(r['ticket_date']): r['collection'] or 0
-        for r in TransactionData.objects.filter(
-            company_code=user.company,
-            bus_no=bus_no,
-            ticket_date__range=[from_date, to_date],
-            trip_id__is_closed=False,
-        ).values('ticket_date').annotate(collection=Sum('ticket_amount'))
-    }
+    if not route_code or not from_date or not to_date:
+        return Response({'error': 'route_code, from_date and to_date are required'}, status=400)
 
-    revenue_map = {
-        date: closed_revenue.get(date, 0) + open_revenue.get(date, 0)
-        for date in set(closed_revenue.keys()) | set(open_revenue.keys())
-    }
+    route = Route.objects.filter(company=user.company, route_code=route_code).first()
+    if route is None:
+        return Response({'error': 'Route not found'}, status=404)
 
-    expense_map = {
-        str(e['expense_date']): e['expense'] or 0
-        for e in ExpenseData.objects.filter(
-            company_code=user.company,
-            bus_no=bus_no,
-            expense_date__range=[from_date, to_date],
-        ).values('expense_date').annotate(expense=Sum('expense_amount'))
-    }
+    rows = TripODMatrix.objects.filter(
+        company_code=user.company,
+        route=route,
+        start_date__range=[from_date, to_date],
+    ).only('stage_count', 'data')
+    matrix = od_matrix.sum_matrices(rows)
+    n = matrix.shape[1]
 
-    all_dates = sorted(set(revenue_map.keys()) | set(expense_map.keys()))
+    stage_names = [
+        rs.stage.stage_name
+        for rs in RouteStage.objects.filter(route=route).select_related('stage').order_by('sequence_no')
+    ]
 
     return Response({
-        'rows': [
-            {
-                'date': date,
-                'collection': str(revenue_map.get(date, 0)),
-                'expense': str(expense_map.get(date, 0)),
-            }
-            for date in all_dates
-        ]
+        'route_code': route.route_code,
+        'stages': [
+            {'ordinal': i + 1, 'stage_name': stage_names[i] if i < len(stage_names) else None}
+            for i in range(n)
+        ],
+        'categories': list(od_matrix.CATEGORIES),
+        'total': matrix.sum(axis=0).tolist(),
+        'by_category': {c: matrix[i].tolist() for i, c in enumerate(od_matrix.CATEGORIES)},
     })
 
 
@@ -972,6 +1173,8 @@ def expense_report(request):
 # Params: date (YYYY-MM-DD)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@rate_limited('aggregator_transactions')
+@use_reporting_db(single_date('date'))
 def aggregator_transaction_report(request):
     user = request.user
     date_str = request.GET.get('date')
@@ -26,7 +26,6 @@ import logging
 
 from django.db import transaction
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
@@ -39,15 +38,23 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 
 from ...models import Company, UserSession, AuditLog, UserApprovedDevice, DevicePendingApproval, UserTier
 from ...authentication import (
-    set_session_cache, delete_session_cache, set_session_revoked,
+    set_session_cache, delete_session_cache,
     kill_session, session_key_exists, get_session_timeout, SessionInfo, COOKIE_NAME,
+    kill_sessions, last_seen, stamp_last_seen,
 )
+from ... import mail_queue, session_slots
 from .audit_logs import log_action
 
 logger = logging.getLogger(__name__)
 _token_generator = PasswordResetTokenGenerator()
 User = get_user_model()
 
+_LOGIN_SLOT_ERRORS = {
+    session_slots.TOTAL_FULL:        'All login slots are in use. Another user must log out first.',
+    session_slots.PREMIUM_FULL:      'All premium tier slots are in use.',
+    session_slots.INTERMEDIATE_FULL: 'All intermediate tier slots are in use.',
+}
+
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
@@ -277,7 +284,7 @@ def login_view(request):
             # No extra DB read — existing_session is already in memory.
             if not session_key_exists(str(existing_session.session_uid)):
                 idle_seconds = (
-                    timezone.now() - existing_session.last_seen_at
+                    timezone.now() - last_seen(existing_session)
                 ).total_seconds()
                 session_timeout = get_session_timeout(str(existing_session.device_type))
 
@@ -287,6 +294,7 @@ def login_view(request):
                     # Safe to treat as ghost — clear it and allow login.
                     existing_session.is_active = False
                     existing_session.save(update_fields=['is_active'])
+                    session_slots.release(user.company_id, [existing_session.session_uid])
                     existing_session = None
                 else:
                     # Redis key is absent but last_seen_at is recent — Redis was
@@ -319,47 +327,36 @@ def login_view(request):
                 kill_session(existing_session)
 
         # ── 7: Tier / concurrent session cap (company_user only) ──────────────
-        if user.role == 'company_user' and company:
-            if company.total_user_count > 0:
-                active_count = UserSession.objects.filter(
-                    user__company=company, is_active=True,
-                ).count()
-                if active_count >= company.total_user_count:
-                    return Response(
-                        {'error': 'All login slots are in use. Another user must log out first.'},
-                        status=status.HTTP_403_FORBIDDEN,
-                    )
-
-            if user.tier == UserTier.PREMIUM and company.premium_user_count > 0:
-                premium_active = UserSession.objects.filter(
-                    user__company=company, user__tier=UserTier.PREMIUM, is_active=True,
-                ).count()
-                if premium_active >= company.premium_user_count:
-                    return Response(
-                        {'error': 'All premium tier slots are in use.'},
-                        status=status.HTTP_403_FORBIDDEN,
-                    )
-
-            if user.tier == UserTier.INTERMEDIATE and company.intermediate_user_count > 0:
-                intermediate_active = UserSession.objects.filter(
-                    user__company=company, user__tier=UserTier.INTERMEDIATE, is_active=True,
-                ).count()
-                if intermediate_active >= company.intermediate_user_count:
-                    return Response(
-                        {'error': 'All intermediate tier slots are in use.'},
-                        status=status.HTTP_403_FORBIDDEN,
-                    )
+        # Counted in Redis (session_slots): check and reserve in one step, so
+        # concurrent logins can't both take the last slot. Other company roles
+        # are recorded against the total but never refused.
+        new_session_uid = uuid.uuid4()
+        if company:
+            full = session_slots.reserve(
+                company, user.tier, new_session_uid,
+                enforce=user.role == 'company_user',
+            )
+            if full:
+                return Response(
+                    {'error': _LOGIN_SLOT_ERRORS[full]},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
 
         # ── 8: Create session ──────────────────────────────────────────────────
-        session = UserSession.objects.create(
-            user=user,
-            session_uid=uuid.uuid4(),
-            device_type=_detect_device_type(request),
-            user_agent=(request.META.get('HTTP_USER_AGENT') or '')[:500],
-            is_active=True,
-            last_seen_at=timezone.now(),
-            device_uuid=device_uuid,
-        )
+        try:
+            session = UserSession.objects.create(
+                user=user,
+                session_uid=new_session_uid,
+                device_type=_detect_device_type(request),
+                user_agent=(request.META.get('HTTP_USER_AGENT') or '')[:500],
+                is_active=True,
+                last_seen_at=timezone.now(),
+                device_uuid=device_uuid,
+            )
+        except Exception:
+            if company:
+                session_slots.release(company.pk, [new_session_uid])
+            raise
         session_uid = str(session.session_uid)
         device_type = str(session.device_type)
         set_session_cache(session_uid, user.pk, device_type)
@@ -447,10 +444,7 @@ def session_keepalive(request):
     user = request.user
 
     set_session_cache(session_uid, user.pk, device_type)
-
-    UserSession.objects.filter(
-        session_uid=session_uid, is_active=True,
-    ).update(last_seen_at=timezone.now())
+    stamp_last_seen(session_uid)
 
     response = Response({
         'alive': True,
@@ -514,17 +508,12 @@ def forgot_password(request):
         f'— Bus Management App'
     )
 
+    # Queued, not sent inline — the response never waits on SMTP (mail_queue).
     try:
-        send_mail(
-            subject,
-            body,
-            getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@busmanagement.app'),
-            [user.email],
-            fail_silently=False,
-        )
-        logger.info(f"Password reset email sent to {user.email} (user_id={user.pk})")
+        mail_queue.enqueue(subject, body, [user.email], purpose='password_reset')
+        logger.info(f"Password reset email queued for {user.email} (user_id={user.pk})")
     except Exception as exc:
-        logger.error(f"Failed to send password reset email to {user.email}: {exc}")
+        logger.error(f"Failed to queue password reset email to {user.email}: {exc}")
 
     return Response({'message': 'If an account with that email exists, a reset link has been sent.'}, status=status.HTTP_200_OK)
 
@@ -570,14 +559,7 @@ def reset_password(request):
     # The original code only bulk-updated the DB, leaving Redis keys alive for up
     # to 20 minutes. An attacker holding a stolen cookie could still authenticate
     # during that window because SessionAuthentication finds the Redis key first.
-    active_sessions = list(
-        UserSession.objects.filter(user=user, is_active=True).values_list('session_uid', flat=True)
-    )
-    UserSession.objects.filter(user=user, is_active=True).update(is_active=False)
-    for uid in active_sessions:
-        uid_str = str(uid)
-        set_session_revoked(uid_str)
-        delete_session_cache(uid_str)
+    kill_sessions(UserSession.objects.filter(user=user))
 
     logger.info(f"Password reset completed for user_id={user.pk} ({user.username})")
     return Response({'message': 'Password reset successfully. Please log in with your new password.'}, status=status.HTTP_200_OK)
\ No newline at end of file
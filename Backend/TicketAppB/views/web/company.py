@@ -1,11 +1,9 @@
 import json
 import os
 from pathlib import Path
-import time
 import logging
 import requests
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from datetime import datetime, timedelta
 from django.conf import settings
 from django.utils import timezone
 from rest_framework import status
@@ -18,11 +16,15 @@ from django.contrib.auth import get_user_model
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from ...permissions import LicensePermission
-from django.db.utils import OperationalError, ProgrammingError
-from django.db.models import Sum, Q, Count, Case, When, IntegerField
-from ...models import Company, TransactionData, TripData, ScheduleData, Route, VehicleType, AggregatorTransaction, Dealer, ETMDevice, UserSession, UserRole, UserTier
+from django.db.models import Q, Count, Case, When, IntegerField
+from ...models import Company, Dealer, ETMDevice, UserSession, UserRole, UserTier
 from ..utils import _is_superadmin, _is_executive, _is_dealer_admin, _is_company_admin
 from .audit_logs import log_action
+from ...dashboard_snapshot import empty_snapshot, get_snapshot
+from ...db_router import use_reporting_db
+from ...rate_limit import rate_limited
+from ...report_cache import single_date
+from ... import dashboard_counters, license_client
 from ...models import AuditLog
 
 
@@ -123,17 +125,7 @@ def register_with_license_server(company):
         logger.info(f"Sending registration request to: {settings.PRODUCT_REGISTRATION_URL}")
         logger.debug(f"Registration payload: {payload}")
         
-        response = requests.post(
-            settings.PRODUCT_REGISTRATION_URL,
-            json=payload,
-            timeout=30
-        )
-        
-        logger.info(f"Registration response status: {response.status_code}")
-        logger.debug(f"Registration response: {response.text}")
-        
-        response.raise_for_status()
-        data = response.json()
+        data = license_client.register(payload)
         
         if data.get('status') == 'Success' and data.get('CustomerId'):
             logger.info(f"Registration successful. Customer ID: {data.get('CustomerId')}")
@@ -174,108 +166,79 @@ def register_with_license_server(company):
         }
 
 
-def poll_license_authentication(customer_id, timeout_seconds=120, interval_seconds=3):
+def get_license_poll_timeout() -> int:
+    return int(getattr(settings, 'LICENSE_POLL_TIMEOUT_SECONDS', 120))
+
+
+def get_license_poll_interval() -> int:
+    return int(getattr(settings, 'LICENSE_POLL_INTERVAL_SECONDS', 3))
+
+
+def check_license_authentication(customer_id):
     """
-    Poll license server for authentication approval.
-    Checks every 3 seconds for up to 2 minutes (40 attempts max).
-    Returns authentication data when approved.
+    One authentication check against the license server (no waiting).
+    tasks.poll_company_license calls this once per step and re-schedules
+    itself while the status is still pending.
+
+    Returns {'success': True, 'status': 'Approve' | 'Expired' | 'Block' | 'Pending', 'data': ...}
+    or {'success': False, 'error': ..., 'retry': bool} — retry is True for
+    failures worth another attempt (timeout, connection, 5xx).
     """
-    payload = {"CustomerId": customer_id}
-    start_time = time.time()
-    poll_count = 0
-    
-    logger.info(f"Starting authentication polling for Customer ID: {customer_id}")
-    
-    while time.time() - start_time < timeout_seconds:
-        poll_count += 1
-        
-        try:
-            logger.debug(f"Poll attempt #{poll_count} for Customer ID: {customer_id}")
+    try:
+        data = license_client.authenticate(customer_id)
+        auth_status = data.get('Authenticationstatus', '')
+        logger.debug(f"License check for Customer ID {customer_id}: {auth_status}")
 
-            response = requests.post(
-                settings.PRODUCT_AUTH_URL,
-                json=payload,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            auth_status = data.get('Authenticationstatus', '')
-            
-            logger.debug(f"Poll #{poll_count} status: {auth_status}")
-            
-            # Success case
-            if auth_status == 'Approve':
-                logger.info(f"Authentication approved for Customer ID: {customer_id}")
-                return {
-                    'success': True,
-                    'status': 'Approve',
-                    'data': data
-                }
-
-            # Expired license
-            if 'expired' in auth_status.lower():
-                logger.warning(f"License expired for Customer ID: {customer_id}")
-                return {
-                    'success': True,
-                    'status': 'Expired',
-                    'data': data
-                }
-
-            # Blocked
-            if auth_status == 'Block':
-                logger.warning(f"License blocked for Customer ID: {customer_id}")
-                return {
-                    'success': True,
-                    'status': 'Block',
-                    'data': data
-                }
-
-            # Still waiting - continue polling
-            if 'waiting' in auth_status.lower() or auth_status == 'Pending':
-                logger.debug(f"Still waiting for approval. Next poll in {interval_seconds}s")
-                time.sleep(interval_seconds)
-                continue
-            
-            # Unknown status - treat as error
-            logger.error(f"Unexpected authentication status: {auth_status}")
-            return {
-                'success': False,
-                'error': f'Unexpected authentication status: {auth_status}'
-            }
-        
-        except requests.exceptions.Timeout as e:
-            logger.error(f"Timeout during poll #{poll_count}: {str(e)}")
-            return {
-                'success': False,
-                'error': 'License server not responding. Please try again later.'
-            }
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"Connection error during poll #{poll_count}: {str(e)}")
-            return {
-                'success': False,
-                'error': 'Cannot connect to license server. Check your network connection.'
-            }
-        except requests.exceptions.HTTPError as e:
-            logger.error(f"HTTP error during poll #{poll_count}: {str(e)}")
-            return {
-                'success': False,
-                'error': f'License server error: {e.response.status_code}. Try again later.'
-            }
-        except Exception as e:
-            logger.exception(f"Unexpected error during poll #{poll_count}: {str(e)}")
-            return {
-                'success': False,
-                'error': 'Unexpected error during validation. Please try again.'
-            }
-    
-    # Timeout
-    elapsed = time.time() - start_time
-    logger.error(f"Validation timeout after {elapsed:.1f}s and {poll_count} polls")
-    return {
-        'success': False,
-        'error': f'Validation timeout - License not approved yet. Please try again later. ({poll_count} attempts over {int(elapsed)}s)'
-    }
+        if auth_status == 'Approve':
+            logger.info(f"Authentication approved for Customer ID: {customer_id}")
+            return {'success': True, 'status': 'Approve', 'data': data}
+
+        if 'expired' in auth_status.lower():
+            logger.warning(f"License expired for Customer ID: {customer_id}")
+            return {'success': True, 'status': 'Expired', 'data': data}
+
+        if auth_status == 'Block':
+            logger.warning(f"License blocked for Customer ID: {customer_id}")
+            return {'success': True, 'status': 'Block', 'data': data}
+
+        if 'waiting' in auth_status.lower() or auth_status == 'Pending':
+            return {'success': True, 'status': 'Pending', 'data': data}
+
+        logger.error(f"Unexpected authentication status: {auth_status}")
+        return {
+            'success': False,
+            'error': f'Unexpected authentication status: {auth_status}',
+            'retry': False,
+        }
+
+    except requests.exceptions.Timeout as e:
+        logger.warning(f"License check timeout for Customer ID {customer_id}: {str(e)}")
+        return {
+            'success': False,
+            'error': 'License server not responding. Please try again later.',
+            'retry': True,
+        }
+    except requests.exceptions.ConnectionError as e:
+        logger.warning(f"License check connection error for Customer ID {customer_id}: {str(e)}")
+        return {
+            'success': False,
+            'error': 'Cannot connect to license server. Check your network connection.',
+            'retry': True,
+        }
+    except requests.exceptions.HTTPError as e:
+        logger.error(f"License check HTTP error for Customer ID {customer_id}: {str(e)}")
+        return {
+            'success': False,
+            'error': f'License server error: {e.response.status_code}. Try again later.',
+            'retry': e.response.status_code >= 500,
+        }
+    except Exception as e:
+        logger.exception(f"Unexpected error during license check for Customer ID {customer_id}: {str(e)}")
+        return {
+            'success': False,
+            'error': 'Unexpected error during validation. Please try again.',
+            'retry': False,
+        }
 
 
 @api_view(['POST'])
@@ -350,7 +313,7 @@ def register_company_with_license_server(request, pk):
 def validate_company_license(request, pk):
     """
     START license validation by setting status to 'Validating' and
-    launching background polling thread.
+    queueing tasks.poll_company_license.
 
     Returns immediately - polling happens in background.
     User can refresh to see updated status.
@@ -360,7 +323,7 @@ def validate_company_license(request, pk):
     2. Check if company is registered (has company_id)
     3. Check if already validating
     4. Set status to 'Validating'
-    5. Start background thread
+    5. Queue the polling task
     6. Return immediately
     """
     logger.info(f"License validation requested for company ID: {pk}")
@@ -389,8 +352,16 @@ def validate_company_license(request, pk):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if already validating
-        if company.authentication_status == Company.AuthStatus.VALIDATING:
+        # Check if already validating. A poll that outlived its deadline by
+        # more than a minute lost its task (worker killed between steps), so
+        # a new validation may take over.
+        poll_deadline = (
+            company.license_poll_started_at
+            + timedelta(seconds=get_license_poll_timeout() + 60)
+            if company.license_poll_started_at else None
+        )
+        if (company.authentication_status == Company.AuthStatus.VALIDATING
+                and poll_deadline and poll_deadline > timezone.now()):
             logger.info(f"Company already validating: {company.company_name}")
             return Response(
                 {
@@ -402,14 +373,15 @@ def validate_company_license(request, pk):
         
         # Set status to Validating
         company.authentication_status = Company.AuthStatus.VALIDATING
+        company.license_poll_started_at = timezone.now()
+        company.license_poll_attempts = 0
         company.save()
     logger.info(f"Set status to 'Validating' for company: {company.company_name}")
     
-    # Hand off to Celery — returns immediately, polling runs in the background.
-    # Unlike a daemon thread, this survives worker restarts: the task is
-    # re-queued from the broker if the worker dies mid-poll.
+    # Hand off to Celery — returns immediately. The task checks once and
+    # re-schedules itself with a countdown; no worker waits on the server.
     from ...tasks import poll_company_license
-    poll_company_license.delay(company.id)
+    transaction.on_commit(lambda: poll_company_license.delay(company.id, 0))
     logger.info(f"Queued poll_company_license task for company ID: {pk}")
     
     # Return immediately
@@ -424,22 +396,17 @@ def validate_company_license(request, pk):
     )
 
 
-def fetch_company_from_license_server(customer_id):
+def fetch_company_from_license_server(customer_id, cached=False):
     """
     Single (non-polling) call to the license server to get current status
     and license details for a given customer_id.
     Used for the import-existing-company preview and atomic import.
+    cached=True may answer from the short-lived license_client cache —
+    read-only previews only; anything that writes fetches fresh.
     Returns a dict with success, status, and data keys.
     """
-    payload = {"CustomerId": customer_id}
     try:
-        response = requests.post(
-            settings.PRODUCT_AUTH_URL,
-            json=payload,
-            timeout=30
-        )
-        response.raise_for_status()
-        data = response.json()
+        data = license_client.authenticate(customer_id, cached=cached)
         auth_status = data.get('Authenticationstatus', '')
 
         if not auth_status:
@@ -483,7 +450,7 @@ def get_company_by_company_id(request, company_id):
         )
 
     # ── Single license server fetch (no polling loop) ────────────────────────
-    result = fetch_company_from_license_server(customer_id=company_id)
+    result = fetch_company_from_license_server(customer_id=company_id, cached=True)
     if not result['success']:
         return Response({'message': result['error']}, status=status.HTTP_502_BAD_GATEWAY)
 
@@ -1111,6 +1078,8 @@ def update_company_details(request, pk):
 # Returns collections, operations, and settlements data for a given date.
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@rate_limited('company_dashboard')
+@use_reporting_db(single_date('date'))
 def get_company_dashboard_metrics(request):
     user = request.user
     
@@ -1137,280 +1106,14 @@ def get_company_dashboard_metrics(request):
         # User has no company — return zeros
         return Response({
             "message": "success",
-            "data": {
-                "collections": {
-                    "daily_cash": 0,
-                    "daily_upi": 0,
-                    "monthly_total": 0,
-                    "prev_month_total": 0,
-                },
-                "operations": {
-                    "buses_active": 0,
-                    "buses_idle": 0,
-                    "buses_running": 0,
-                    "buses_total": 0,
-                    "trips_completed": 0,
-                    "trips_scheduled": 0,
-                    "routes_active": 0,
-                    "routes_total": 0,
-                    "total_passengers": 0,
-                },
-                "settlements": {
-                    "total_transactions": 0,
-                    "verified": 0,
-                    "pending_verification": 0,
-                    "failed": 0,
-                },
-                "recent_activity": [],
-            }
+            "data": empty_snapshot(),
         }, status=status.HTTP_200_OK)
-    
-    #  Initialize response structure ─
-    collections = {
-        "daily_cash": 0,
-        "daily_upi": 0,
-        "monthly_total": 0,
-    }
-    operations = {
-        "buses_active": 0,
-        "buses_idle": 0,
-        "buses_running": 0,
-        "buses_total": 0,
-        "trips_completed": 0,
-        "trips_scheduled": 0,
-        "routes_active": 0,
-        "routes_total": 0,
-        "total_passengers": 0,
-    }
-    settlements = {
-        "total_transactions": 0,
-        "verified": 0,
-        "pending_verification": 0,
-        "failed": 0,
-    }
-    
-    #  Section 1: Collections (from TransactionData) 
-    try:
-        transaction_base = TransactionData.objects.filter(
-            company_code=company,
-            ticket_date=selected_date
-        )
-        
-        # Daily cash collection
-        daily_cash = transaction_base.filter(
-            ticket_status=TransactionData.PaymentMode.CASH
-        ).aggregate(total=Sum('ticket_amount'))['total'] or 0
-        
-        # Daily UPI collection
-        daily_upi = transaction_base.filter(
-            ticket_status=TransactionData.PaymentMode.UPI
-        ).aggregate(total=Sum('ticket_amount'))['total'] or 0
-        
-        # Monthly total (all transactions in the same month)
-        monthly_total = TransactionData.objects.filter(
-            company_code=company,
-            ticket_date__year=selected_date.year,
-            ticket_date__month=selected_date.month
-        ).aggregate(total=Sum('ticket_amount'))['total'] or 0
-        
-        # Previous month total (for month-over-month comparison)
-        prev_month_date = selected_date - relativedelta(months=1)
-        prev_month_total = TransactionData.objects.filter(
-            company_code=company,
-            ticket_date__year=prev_month_date.year,
-            ticket_date__month=prev_month_date.month
-        ).aggregate(total=Sum('ticket_amount'))['total'] or 0
-
-        collections = {
-            "daily_cash": float(daily_cash),
-            "daily_upi": float(daily_upi),
-            "monthly_total": float(monthly_total),
-            "prev_month_total": float(prev_month_total),
-        }
-        
-        # Total passengers (from ticket counts)
-        total_passengers = transaction_base.aggregate(
-            total=Sum('total_tickets')
-        )['total'] or 0
-        operations["total_passengers"] = int(total_passengers)
-        
-    except (OperationalError, ProgrammingError) as e:
-        logger.warning(f"Collection metrics unavailable: {str(e)}")
-    except Exception as e:
-        logger.exception(f"Collection metrics error: {str(e)}")
-    
-    #  Section 2: Operations (from TripCloseData, Route, VehicleType) ─
-    try:
-        # Trips completed on this date
-        trips_completed = TripData.objects.filter(
-            company_code=company,
-            start_date=selected_date,
-            is_closed=True,
-        ).count()
-        operations["trips_completed"] = trips_completed
-        operations["trips_scheduled"] = trips_completed
-
-        # Buses with an open schedule today, split into:
-        #   running = schedule open AND a trip currently open under it
-        #   idle    = schedule open, no trip currently open
-        open_schedule_bus_ids = set(
-            ScheduleData.objects.filter(
-                company_code=company,
-                start_date=selected_date,
-                is_closed=False,
-                bus_id__isnull=False,
-            ).values_list('bus_id', flat=True)
-        )
-        running_bus_ids = set(
-            TripData.objects.filter(
-                company_code=company,
-                start_date=selected_date,
-                is_closed=False,
-                bus_id__isnull=False,
-            ).values_list('bus_id', flat=True)
-        ) & open_schedule_bus_ids
-        idle_bus_ids = open_schedule_bus_ids - running_bus_ids
-
-        operations["buses_running"] = len(running_bus_ids)
-        operations["buses_idle"] = len(idle_bus_ids)
-        operations["buses_active"] = len(open_schedule_bus_ids)
-
-    except (OperationalError, ProgrammingError) as e:
-        logger.warning(f"Trip metrics unavailable: {str(e)}")
-    except Exception as e:
-        logger.exception(f"Trip metrics error: {str(e)}")
-    
-    try:
-        # Total buses registered (not soft-deleted)
-        operations["buses_total"] = VehicleType.objects.filter(
-            company=company,
-            is_deleted=False
-        ).count()
-        
-        # Total routes
-        operations["routes_total"] = Route.objects.filter(
-            company=company
-        ).count()
-        
-        # Active routes (not soft-deleted)
-        operations["routes_active"] = Route.objects.filter(
-            company=company,
-            is_deleted=False
-        ).count()
-        
-    except (OperationalError, ProgrammingError) as e:
-        logger.warning(f"Route/vehicle metrics unavailable: {str(e)}")
-    except Exception as e:
-        logger.exception(f"Route/vehicle metrics error: {str(e)}")
-    
-    #  Section 3: Settlements (from AggregatorTransaction) 
-    # IMPORTANT FIX: AggregatorTransaction doesn't have a direct company FK.
-    # It links to TransactionData via related_ticket → company_code.
-    # However, not all aggregator transactions may be reconciled yet (related_ticket could be null).
-    # 
-    # Solution: We filter by transactions that are EITHER:
-    #   1. Already linked to a ticket from this company, OR
-    #   2. Have a merchantId that belongs to this company's devices/terminals
-    #
-    # For now, we use a simpler approach: filter by related_ticket__company_code
-    # and include null related_ticket if merchantId matches company terminals.
-    # If you don't have a merchantId → company mapping, just use related_ticket filter.
-    
-    try:
-        # Base queryset: all transactions on this date
-        settlement_qs = AggregatorTransaction.objects.filter(
-            transaction_date=selected_date
-        )
-        
-        # Filter by company:
-        # Approach 1 (safer): Only count transactions linked to company's tickets
-        settlement_qs = settlement_qs.filter(
-            related_ticket__company_code=company
-        )
-        
-        # Count totals
-        settlements["total_transactions"] = settlement_qs.count()
-        
-        # Verified transactions
-        settlements["verified"] = settlement_qs.filter(
-            verification_status=AggregatorTransaction.VerificationStatus.VERIFIED
-        ).count()
-        
-        # Pending verification (unverified + flagged)
-        settlements["pending_verification"] = settlement_qs.filter(
-            verification_status__in=[
-                AggregatorTransaction.VerificationStatus.UNVERIFIED,
-                AggregatorTransaction.VerificationStatus.FLAGGED,
-            ]
-        ).count()
-        
-        # Failed (rejected + disputed)
-        settlements["failed"] = settlement_qs.filter(
-            verification_status__in=[
-                AggregatorTransaction.VerificationStatus.REJECTED,
-                AggregatorTransaction.VerificationStatus.DISPUTED,
-            ]
-        ).count()
-        
-    except (OperationalError, ProgrammingError) as e:
-        logger.warning(f"Settlement metrics unavailable: {str(e)}")
-    except Exception as e:
-        logger.exception(f"Settlement metrics error: {str(e)}")
-    
-    #  Section 4: Recent Activity (last 8 closed trips + recent settlements) ─
-    recent_activity = []
-    try:
-        # Recent closed trips for this date
-        closed_trips = TripData.objects.filter(
-            company_code=company,
-            start_date=selected_date,
-            is_closed=True,
-            end_datetime__isnull=False,
-        ).select_related('route_id').order_by('-end_datetime')[:6]
-
-        for trip in closed_trips:
-            route_code = trip.route_id.route_code if trip.route_id else f"Sch {trip.schedule_no}"
-            recent_activity.append({
-                "type": "trip_close",
-                "label": f"Trip #{trip.trip_no} closed — {trip.palmtec_id}",
-                "route": route_code,
-                "time": trip.end_datetime.strftime("%H:%M") if trip.end_datetime else "",
-                "amount": float(trip.total_collection) if trip.total_collection else None,
-            })
-
-        # Recent verified settlements for this date
-        recent_settlements = AggregatorTransaction.objects.filter(
-            transaction_date=selected_date,
-            related_ticket__company_code=company,
-            verification_status=AggregatorTransaction.VerificationStatus.VERIFIED,
-        ).order_by('-created_at')[:2]
-
-        for s in recent_settlements:
-            recent_activity.append({
-                "type": "settlement",
-                "label": f"Payment verified — {s.transaction_id or 'UPI'}",
-                "route": None,
-                "time": s.created_at.strftime("%H:%M") if s.created_at else "",
-                "amount": float(s.amount) if hasattr(s, 'amount') and s.amount else None,
-            })
-
-        # Sort combined list by time desc, keep top 8
-        recent_activity = sorted(recent_activity, key=lambda x: x["time"], reverse=True)[:8]
 
-    except Exception as e:
-        logger.exception(f"Recent activity error: {str(e)}")
-        recent_activity = []
-
-    #  Return response ─
+    #  Step 4: Snapshot (cached per company + date, see dashboard_snapshot.py) ─
     return Response(
         {
             "message": "success",
-            "data": {
-                "collections": collections,
-                "operations": operations,
-                "settlements": settlements,
-                "recent_activity": recent_activity,
-            }
+            "data": get_snapshot(company, selected_date),
         },
         status=status.HTTP_200_OK
     )
@@ -1418,20 +1121,17 @@ def get_company_dashboard_metrics(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@use_reporting_db()
 def get_admin_dashboard_data(request):
     user = request.user
     if not _is_superadmin(user):
         return Response({'error': 'Superadmin access required.'}, status=status.HTTP_403_FORBIDDEN)
 
     try:
-        company_counts = Company.objects.aggregate(
-            total=Count('id'),
-            validated=Count(Case(When(authentication_status=Company.AuthStatus.APPROVED, then=1), output_field=IntegerField())),
-            unvalidated=Count(Case(When(authentication_status=Company.AuthStatus.PENDING, then=1), output_field=IntegerField())),
-            validating=Count(Case(When(authentication_status=Company.AuthStatus.VALIDATING, then=1), output_field=IntegerField())),
-            expired=Count(Case(When(authentication_status=Company.AuthStatus.EXPIRED, then=1), output_field=IntegerField())),
-            blocked=Count(Case(When(authentication_status=Company.AuthStatus.BLOCKED, then=1), output_field=IntegerField())),
-        )
+        # Registry counts come from the maintained DashboardCounter table
+        # (dashboard_counters.py) instead of COUNT(CASE ...) over every row.
+        counts = dashboard_counters.global_counts()
+        AS = Company.AuthStatus
         dashboard_data = {
             "company_summary": {},
             "user_summary": {},
@@ -1441,57 +1141,45 @@ def get_admin_dashboard_data(request):
         }
 
         dashboard_data['company_summary'].update({
-            "total_companies": company_counts['total'],
-            "validated_companies": company_counts['validated'],
-            "unvalidated_companies": company_counts['unvalidated'],
-            "validating_companies": company_counts['validating'],
-            "expired_companies": company_counts['expired'],
-            "blocked_companies": company_counts['blocked'],
+            "total_companies": counts.get('company:total', 0),
+            "validated_companies": counts.get(f'company:{AS.APPROVED}', 0),
+            "unvalidated_companies": counts.get(f'company:{AS.PENDING}', 0),
+            "validating_companies": counts.get(f'company:{AS.VALIDATING}', 0),
+            "expired_companies": counts.get(f'company:{AS.EXPIRED}', 0),
+            "blocked_companies": counts.get(f'company:{AS.BLOCKED}', 0),
         })
 
-        all_non_admin_users = User.objects.filter(is_superuser=False).count()
-        users_by_company_qs = (
-            User.objects.filter(is_superuser=False)
-            .values('company__company_name')
-            .annotate(count=Count('id'))
+        users_per_company = dashboard_counters.per_company('user:total')
+        company_names = dict(
+            Company.objects.filter(id__in=list(users_per_company)).values_list('id', 'company_name')
         )
         users_by_company = [
-            {"company_name": row["company__company_name"], "count": row["count"]}
-            for row in users_by_company_qs
+            {"company_name": company_names[cid], "count": users_per_company[cid]}
+            for cid in company_names
         ]
+        if counts.get('user:no_company'):
+            users_by_company.append({"company_name": None, "count": counts['user:no_company']})
         dashboard_data['user_summary'].update({
-            "total_users": all_non_admin_users,
+            "total_users": counts.get('user:total', 0),
             "users_by_company": users_by_company,
         })
 
-        device_counts = ETMDevice.objects.aggregate(
-            total=Count('id'),
-            stock=Count(Case(When(allocation_status=ETMDevice.AllocationStatus.STOCK, then=1), output_field=IntegerField())),
-            dealer_pool=Count(Case(When(allocation_status=ETMDevice.AllocationStatus.DEALER_POOL, then=1), output_field=IntegerField())),
-            allocated=Count(Case(When(allocation_status=ETMDevice.AllocationStatus.ALLOCATED, then=1), output_field=IntegerField())),
-        )
+        DS = ETMDevice.AllocationStatus
         dashboard_data['device_summary'].update({
-            "total_devices": device_counts['total'],
-            "in_stock": device_counts['stock'],
-            "dealer_pool": device_counts['dealer_pool'],
-            "mapped": device_counts['allocated'],
+            "total_devices": counts.get('device:total', 0),
+            "in_stock": counts.get(f'device:{DS.STOCK}', 0),
+            "dealer_pool": counts.get(f'device:{DS.DEALER_POOL}', 0),
+            "mapped": counts.get(f'device:{DS.ALLOCATED}', 0),
         })
 
-        dealer_counts = Dealer.objects.aggregate(
-            total=Count('id'),
-            validated=Count(Case(When(authentication_status=Dealer.AuthStatus.APPROVED, then=1), output_field=IntegerField())),
-            unvalidated=Count(Case(When(authentication_status=Dealer.AuthStatus.PENDING, then=1), output_field=IntegerField())),
-            validating=Count(Case(When(authentication_status=Dealer.AuthStatus.VALIDATING, then=1), output_field=IntegerField())),
-            expired=Count(Case(When(authentication_status=Dealer.AuthStatus.EXPIRED, then=1), output_field=IntegerField())),
-            blocked=Count(Case(When(authentication_status=Dealer.AuthStatus.BLOCKED, then=1), output_field=IntegerField())),
-        )
+        DAS = Dealer.AuthStatus
         dashboard_data['dealer_summary'].update({
-            "total_dealers": dealer_counts['total'],
-            "validated_dealers": dealer_counts['validated'],
-            "unvalidated_dealers": dealer_counts['unvalidated'],
-            "validating_dealers": dealer_counts['validating'],
-            "expired_dealers": dealer_counts['expired'],
-            "blocked_dealers": dealer_counts['blocked'],
+            "total_dealers": counts.get('dealer:total', 0),
+            "validated_dealers": counts.get(f'dealer:{DAS.APPROVED}', 0),
+            "unvalidated_dealers": counts.get(f'dealer:{DAS.PENDING}', 0),
+            "validating_dealers": counts.get(f'dealer:{DAS.VALIDATING}', 0),
+            "expired_dealers": counts.get(f'dealer:{DAS.EXPIRED}', 0),
+            "blocked_dealers": counts.get(f'dealer:{DAS.BLOCKED}', 0),
         })
 
         active_admin_sessions = UserSession.objects.filter(
@@ -1624,7 +1312,7 @@ def sync_company_license(request, pk):
         return Response({'error': 'Company is not registered with the license server yet.'}, status=status.HTTP_400_BAD_REQUEST)
 
     # Fetch from license server (single call, no polling)
-    result = fetch_company_from_license_server(company.company_id)
+    result = fetch_company_from_license_server(company.company_id, cached=True)
     if not result['success']:
         return Response({'error': result['error']}, status=status.HTTP_502_BAD_GATEWAY)
 
@@ -23,12 +23,14 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
 
-from ...models import Dealer, Company, ETMDevice, AuditLog, UserRole, UserTier
+from ...models import Dealer, Company, AuditLog, UserRole, UserTier
 from ...serializers.dealers import DealerSerializer
 from ...serializers.company import CompanySerializer
 from ...permissions import LicensePermission
 from ..utils import _is_superadmin, _is_dealer_admin
 from .audit_logs import log_action
+from ... import dashboard_counters, license_client
+from ...db_router import use_reporting_db
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -73,10 +75,7 @@ def _register_dealer_with_license_server(dealer):
     payload = _build_dealer_registration_payload(dealer)
     logger.debug(f"Dealer registration payload: {payload}")
     try:
-        resp = requests.post(settings.PRODUCT_REGISTRATION_URL, json=payload, timeout=30)
-        logger.debug(f"Dealer registration response [{resp.status_code}]: {resp.text}")
-        resp.raise_for_status()
-        data = resp.json()
+        data = license_client.register(payload)
         if data.get('status') == 'Success' and data.get('CustomerId'):
             return {'success': True, 'customer_id': data['CustomerId']}
         logger.error(f"Dealer registration failed. Response data: {data}")
@@ -107,7 +106,7 @@ def _background_dealer_license_polling(dealer_id):
         dealer = Dealer.objects.get(id=dealer_id)
 
         # Poll (reuses same auth endpoint as company)
-        payload = {"CustomerId": dealer.unique_identifier or dealer.product_registration_id}
+        customer_id = dealer.unique_identifier or dealer.product_registration_id
         import time
         deadline = time.time() + 120
         interval = 3
@@ -116,9 +115,7 @@ def _background_dealer_license_polling(dealer_id):
         while time.time() < deadline:
             poll_count += 1
             try:
-                resp = requests.post(settings.PRODUCT_AUTH_URL, json=payload, timeout=30)
-                resp.raise_for_status()
-                data = resp.json()
+                data = license_client.authenticate(customer_id)
                 auth_status = data.get('Authenticationstatus', '')
 
                 if auth_status == 'Approve':
@@ -457,6 +454,8 @@ def delete_dealer(request, pk):
         dealer=dealer,
         allocation_status=ETMDevice.AllocationStatus.DEALER_POOL,
     ).update(dealer=None, allocation_status=ETMDevice.AllocationStatus.STOCK)
+    if returned:
+        dashboard_counters.recount_on_commit('device')
 
     # Soft-deactivate all dealer users
     from django.contrib.auth import get_user_model as _get_user_model
@@ -502,13 +501,12 @@ def update_dealer_mapping(request, pk):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@use_reporting_db()
 def dealer_dashboard(request):
     """
     Dealer admin dashboard — companies with per-company device breakdowns.
     Superadmin can inspect via ?dealer=<id>.
     """
-    from django.db.models import Count, Q
-
     user = request.user
 
     if _is_superadmin(user):
@@ -532,30 +530,14 @@ def dealer_dashboard(request):
         .filter(dealer_id=dealer_id, is_active=True)
         .order_by('company_name')
     )
-    company_ids = list(companies.values_list('id', flat=True))
-
-    device_counts = (
-        ETMDevice.objects.filter(company_id__in=company_ids)
-        .values('company_id')
-        .annotate(
-            total     = Count('id'),
-            active    = Count('id', filter=Q(allocation_status=ETMDevice.AllocationStatus.ALLOCATED, is_active=True)),
-            pending   = Count('id', filter=Q(allocation_status=ETMDevice.AllocationStatus.DEALER_POOL)),
-            suspended = Count('id', filter=Q(is_active=False)),
-        )
-    )
-    device_map = {row['company_id']: row for row in device_counts}
+    # Per-company device breakdown from the maintained counters — one lookup
+    # for all companies instead of a grouped COUNT over ETMDevice.
+    device_map = dashboard_counters.company_counts(c.id for c in companies)
 
     companies_data = []
     for company in companies:
-        dc = device_map.get(company.id, {})
         company_dict = CompanySerializer(company).data
-        company_dict['devices'] = {
-            'total':     dc.get('total', 0),
-            'active':    dc.get('active', 0),
-            'pending':   dc.get('pending', 0),
-            'suspended': dc.get('suspended', 0),
-        }
+        company_dict['devices'] = dashboard_counters.device_breakdown(device_map.get(company.id, {}))
         companies_data.append(company_dict)
 
     # ── Pool balance (live-computed from child companies) ─────────────────────
@@ -611,16 +593,13 @@ def dealer_dashboard(request):
 
 # ── Sync license (dry-run + confirm) ─────────────────────────────────────────
 
-def _fetch_dealer_from_license_server(customer_id):
-    """Single non-polling call to license server. Returns {success, status, data}."""
+def _fetch_dealer_from_license_server(customer_id, cached=False):
+    """
+    Single non-polling call to license server. Returns {success, status, data}.
+    cached=True (previews only) may answer from the license_client cache.
+    """
     try:
-        resp = requests.post(
-            settings.PRODUCT_AUTH_URL,
-            json={"CustomerId": customer_id},
-            timeout=30,
-        )
-        resp.raise_for_status()
-        data = resp.json()
+        data = license_client.authenticate(customer_id, cached=cached)
         auth_status = data.get('Authenticationstatus', '')
         if not auth_status:
             return {'success': False, 'error': 'No response from license server.'}
@@ -718,7 +697,7 @@ def sync_dealer_license(request, pk):
         return Response({'error': 'Dealer is not registered with the license server yet.'}, status=status.HTTP_400_BAD_REQUEST)
 
     customer_id = dealer.unique_identifier or dealer.product_registration_id
-    result = _fetch_dealer_from_license_server(customer_id)
+    result = _fetch_dealer_from_license_server(customer_id, cached=True)
     if not result['success']:
         return Response({'error': result['error']}, status=status.HTTP_502_BAD_GATEWAY)
 
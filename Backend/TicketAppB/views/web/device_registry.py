@@ -40,6 +40,7 @@ from ..utils import (
     _is_superadmin_or_executive,
 )
 from .audit_logs import log_action
+from ... import dashboard_counters
 
 logger = logging.getLogger(__name__)
 
@@ -298,6 +299,7 @@ class DeviceUploadView(APIView):
             )
             for s in new_serials
         ])
+        dashboard_counters.recount_on_commit('device')
 
         log_action(
             actor=user, action=AuditLog.ActionType.SERIAL_UPLOAD,
@@ -416,6 +418,7 @@ def bulk_assign_dealer(request):
             serial_number__in=serial_numbers,
             allocation_status=ETMDevice.AllocationStatus.STOCK,
         ).update(dealer=dealer, allocation_status=ETMDevice.AllocationStatus.DEALER_POOL)
+        dashboard_counters.recount_on_commit('device')
 
     log_action(
         actor=user, action=AuditLog.ActionType.DEVICE_ALLOCATE,
@@ -485,6 +488,8 @@ def bulk_assign_company(request):
         dealer=dealer,
         allocation_status=ETMDevice.AllocationStatus.ALLOCATED,
     )
+    # Bulk .update() skips the counter signals.
+    dashboard_counters.recount_on_commit('device')
 
     log_action(
         actor=user, action=AuditLog.ActionType.DEVICE_ALLOCATE,
@@ -16,6 +16,8 @@ from ...models import Company, UserRole
 from ...serializers.company import CompanySerializer
 from ...permissions import LicensePermission
 from ..utils import _is_superadmin
+from ... import dashboard_counters
+from ...db_router import use_reporting_db
 
 
 User = get_user_model()
@@ -51,10 +53,12 @@ def update_executive_mapping(request, pk):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@use_reporting_db()
 def executive_dashboard(request):
     """
     Executive dashboard.
-    Returns all active companies created by this executive.
+    Returns all active companies created by this executive, each with the
+    same counter-backed `devices` breakdown as the dealer dashboard.
 
     TODO Phase 4: also filter by executive's state (CustomUser.state) if set,
                   so state-restricted executives only see their own state's companies.
@@ -86,5 +90,8 @@ def executive_dashboard(request):
         .filter(created_by=target_user, is_active=True)
         .order_by('company_name')
     )
-    serializer = CompanySerializer(companies, many=True)
-    return Response({'message': 'Success', 'data': serializer.data}, status=status.HTTP_200_OK)
+    device_map = dashboard_counters.company_counts(c.id for c in companies)
+    data = CompanySerializer(companies, many=True).data
+    for company_dict in data:
+        company_dict['devices'] = dashboard_counters.device_breakdown(device_map.get(company_dict['id'], {}))
+    return Response({'message': 'Success', 'data': data}, status=status.HTTP_200_OK)
@@ -0,0 +1,125 @@
+"""
+Live report updates (Server-Sent Events).
+
+GET /live_updates?kinds=ticket,trip&from_date=YYYY-MM-DD&to_date=YYYY-MM-DD
+
+Streams new/updated ticket, trip and schedule rows for the user's company as
+the ingest tasks commit them (see TicketAppB/live_events.py). Each event's
+`data` is the same row shape the matching get_all_*_data endpoint returns.
+
+Served only through the ASGI entry point (Backend/asgi.py). Under WSGI
+(runserver, gunicorn) Django consumes the whole async iterator before sending
+anything, so the view answers 503 instead and the page keeps polling.
+
+Plain async Django view, not DRF: DRF views are sync-only. Auth and the
+license check reuse SessionAuthentication / LicensePermission directly.
+"""
+
+import asyncio
+import datetime
+import json
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+
+from ...authentication import SessionAuthentication, session_key_exists
+from ...live_events import hub, RESYNC
+from ...permissions import LicensePermission
+
+_KINDS = ('ticket', 'trip', 'schedule')
+
+# Comment line every HEARTBEAT seconds keeps proxies from closing the idle
+# stream, and is where we notice the session was logged out / expired.
+HEARTBEAT = 20
+
+
+def _authorize(request):
+    try:
+        result = SessionAuthentication().authenticate(request)
+    except AuthenticationFailed as e:
+        return None, None, JsonResponse({'error': str(e.detail)}, status=401)
+    if result is None:
+        return None, None, JsonResponse({'error': 'Authentication required.'}, status=401)
+    user, session = result
+    permission = LicensePermission()
+    if not permission.has_permission(SimpleNamespace(user=user), None):
+        return None, None, JsonResponse({'error': permission.message}, status=403)
+    if not user.company_id:
+        return None, None, JsonResponse({'error': 'No company mapped to this user.'}, status=400)
+    return user, session, None
+
+
+def _format(message: dict) -> str:
+    return f"event: {message['kind']}\ndata: {json.dumps(message.get('row'))}\n\n"
+
+
+async def _stream(company_id, session_uid, kinds, window):
+    queue = hub.subscribe(company_id)
+    try:
+        # Tell the page the channel is up — it stops its polling timer on this.
+        yield 'event: ready\ndata: {}\n\n'
+        loop = asyncio.get_running_loop()
+        checked_at = loop.time()
+        while True:
+            # Re-check the session every HEARTBEAT seconds however busy the
+            # company is — messages for other kinds / dates keep arriving.
+            if loop.time() - checked_at >= HEARTBEAT:
+                if not await sync_to_async(session_key_exists)(session_uid):
+                    yield 'event: logout\ndata: {}\n\n'
+                    return
+                checked_at = loop.time()
+            try:
+                message = await asyncio.wait_for(
+                    queue.get(), timeout=HEARTBEAT - (loop.time() - checked_at),
+                )
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+
+            if message is RESYNC or message.get('kind') == 'resync':
+                yield _format(RESYNC)
+                continue
+            if message.get('kind') not in kinds:
+                continue
+            # ISO dates compare correctly as strings
+            if window and not (window[0] <= (message.get('date') or '') <= window[1]):
+                continue
+            yield _format(message)
+    finally:
+        hub.unsubscribe(company_id, queue)
+
+
+async def live_updates(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Live updates need the ASGI server; poll instead.'}, status=503)
+
+    user, session, error = await sync_to_async(_authorize)(request)
+    if error:
+        return error
+
+    kinds = {k for k in request.GET.get('kinds', ','.join(_KINDS)).split(',') if k in _KINDS}
+    if not kinds:
+        return JsonResponse({'error': f"kinds must be any of {', '.join(_KINDS)}"}, status=400)
+
+    window = None
+    if request.GET.get('from_date') or request.GET.get('to_date'):
+        try:
+            window = (
+                str(datetime.date.fromisoformat(request.GET.get('from_date', ''))),
+                str(datetime.date.fromisoformat(request.GET.get('to_date', ''))),
+            )
+        except ValueError:
+            return JsonResponse({'error': 'from_date and to_date must be YYYY-MM-DD'}, status=400)
+
+    response = StreamingHttpResponse(
+        _stream(user.company_id, session.session_uid, kinds, window),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: don't buffer the stream
+    return response
@@ -0,0 +1,95 @@
+"""
+Background report jobs.
+
+POST report-jobs                    body: {report, from_date, to_date, ...report params}
+GET  report-jobs/<job_id>           status + progress
+GET  report-jobs/<job_id>/result    JSON report body, or the file as an attachment
+
+Also mounted under the APK prefix as reports/jobs. Reports: payment_type,
+farewise, expense (same params and body as their reports/ endpoints) and
+tickets_csv (gzip CSV of every ticket in the range). Computation, storage
+and coalescing live in TicketAppB/report_jobs.py.
+"""
+
+from django.http import FileResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from ... import report_jobs
+from ...permissions import LicensePermission
+from ...rate_limit import rate_limited
+from ..utils import _meets_tier, _TIER_ERROR
+
+
+def _job_body(job) -> dict:
+    return {
+        'job_id': job['job_id'],
+        'report': job['report'],
+        'params': job['params'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'error': job['error'],
+    }
+
+
+def _company_job(request, job_id):
+    job = report_jobs.get_job(job_id)
+    if job is None or job['company_id'] != request.user.company_id:
+        return None
+    return job
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, LicensePermission])
+@rate_limited('report_jobs')
+def submit_report_job(request):
+    user = request.user
+    if not user.company_id:
+        return Response({'error': 'No company mapped to this user.'}, status=400)
+
+    name = request.data.get('report')
+    spec = report_jobs.get_report(name)
+    if spec is None:
+        return Response({'error': f'Unknown report: {name}'}, status=400)
+    if spec.tier and not _meets_tier(user, spec.tier):
+        return Response(_TIER_ERROR, status=403)
+
+    try:
+        params = report_jobs.clean_params(spec, request.data)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    job, created = report_jobs.submit(user.company_id, name, params)
+    return Response(_job_body(job), status=202 if created else 200)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, LicensePermission])
+def report_job_status(request, job_id):
+    job = _company_job(request, job_id)
+    if job is None:
+        return Response({'error': 'Job not found or expired'}, status=404)
+    return Response(_job_body(job))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, LicensePermission])
+def report_job_result(request, job_id):
+    job = _company_job(request, job_id)
+    if job is None:
+        return Response({'error': 'Job not found or expired'}, status=404)
+    if job['status'] == report_jobs.FAILED:
+        return Response(_job_body(job), status=500)
+    if job['status'] != report_jobs.DONE:
+        return Response(_job_body(job), status=202)
+
+    result = report_jobs.get_result(job_id)
+    if result is None:
+        return Response({'error': 'Job not found or expired'}, status=404)
+    if result['filename'] is None:
+        return Response(result['payload'])
+    return FileResponse(
+        open(result['path'], 'rb'), as_attachment=True,
+        filename=result['filename'], content_type=result['content_type'],
+    )
@@ -13,9 +13,10 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from ...models import UserSession, UserApprovedDevice, DevicePendingApproval, Company, UserTier
-from ...authentication import kill_session
+from ...models import UserSession, UserApprovedDevice, DevicePendingApproval, Company
+from ...authentication import buffered_last_seen, kill_session
 from ...permissions import LicensePermission
+from ... import session_slots
 
 logger = logging.getLogger(__name__)
 
@@ -24,26 +25,19 @@ logger = logging.getLogger(__name__)
 
 
 
+_SLOT_ERRORS = {
+    session_slots.TOTAL_FULL:        'All login slots are in use. Deactivate a user first.',
+    session_slots.PREMIUM_FULL:      'All premium tier slots are in use.',
+    session_slots.INTERMEDIATE_FULL: 'All intermediate tier slots are in use.',
+}
+
+
 def _tier_slot_available(company, user):
     if not company or company.total_user_count == 0:
         return True, None
-    active_total = UserSession.objects.filter(
-        user__company=company, is_active=True,
-    ).count()
-    if active_total >= company.total_user_count:
-        return False, 'All login slots are in use. Deactivate a user first.'
-    if user.tier == UserTier.PREMIUM and company.premium_user_count > 0:
-        active_premium = UserSession.objects.filter(
-            user__company=company, user__tier=UserTier.PREMIUM, is_active=True,
-        ).count()
-        if active_premium >= company.premium_user_count:
-            return False, 'All premium tier slots are in use.'
-    if user.tier == UserTier.INTERMEDIATE and company.intermediate_user_count > 0:
-        active_intermediate = UserSession.objects.filter(
-            user__company=company, user__tier=UserTier.INTERMEDIATE, is_active=True,
-        ).count()
-        if active_intermediate >= company.intermediate_user_count:
-            return False, 'All intermediate tier slots are in use.'
+    full = session_slots.check(company, user.tier)
+    if full:
+        return False, _SLOT_ERRORS[full]
     return True, None
 
 
@@ -66,6 +60,9 @@ def list_sessions(request):
         user__company=user.company,
         is_active=True,
     ).select_related('user').order_by('-created_at')
+    sessions = list(sessions)
+    # Activity since the last flush is still in Redis.
+    stamps = buffered_last_seen(s.session_uid for s in sessions)
 
     data = [
         {
@@ -76,7 +73,7 @@ def list_sessions(request):
             'device_type':        s.device_type,
             'device_uuid':        s.device_uuid or None,
             'login_time':         s.created_at,
-            'last_active':        s.last_seen_at,
+            'last_active':        stamps.get(str(s.session_uid), s.last_seen_at),
             'is_current_session': str(s.session_uid) == current_session_uid,
         }
         for s in sessions
@@ -148,6 +145,9 @@ def list_all_sessions(request):
         is_active=True,
         user__role__in=_ADMIN_ROLES,
     ).select_related('user', 'user__company').order_by('-created_at')
+    sessions = list(sessions)
+    # Activity since the last flush is still in Redis.
+    stamps = buffered_last_seen(s.session_uid for s in sessions)
 
     data = [
         {
@@ -159,7 +159,7 @@ def list_all_sessions(request):
             'device_type':        s.device_type,
             'device_uuid':        s.device_uuid or None,
             'login_time':         s.created_at,
-            'last_active':        s.last_seen_at,
+            'last_active':        stamps.get(str(s.session_uid), s.last_seen_at),
             'is_current_session': str(s.session_uid) == current_session_uid,
         }
         for s in sessions
@@ -1,3 +1,4 @@
+import heapq
 import logging
 from datetime import datetime
 from rest_framework import status
@@ -5,13 +6,17 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.http import JsonResponse
-from django.db.models import Count
+from django.db.models import Count, prefetch_related_objects
 from django.db import OperationalError
 from django.utils.dateparse import parse_datetime
 import pytz
 
 from ...models import TransactionData, TripData, ScheduleData
+from ... import ticket_archive
 from ...permissions import LicensePermission
+from ...report_cache import cached_report, date_range
+from ...db_router import use_reporting_db
+from ...rate_limit import rate_limited
 from ...serializers.transactions import TicketDataSerializer,TripDataSerializer,ScheduleDataSerializer
 
 logger = logging.getLogger('ticket.ticket_report')
@@ -32,8 +37,31 @@ def _parse_since(since_timestamp):
         return None
 
 
+_TICKET_RELATED = ('route_id', 'from_stage_id__stage', 'to_stage_id__stage', 'trip_id', 'schedule_id', 'depot_id')
+
+
+def _archived_tickets(company, from_date, to_date, since_dt, limit):
+    """
+    Newest `limit` tickets of the range from the cold archive (created after
+    since_dt), with the relations TicketDataSerializer follows prefetched.
+    """
+    newest = heapq.nlargest(limit, (
+        (created_at, pk)
+        for pk, created_at in ticket_archive.rows(company, from_date, to_date, ('id', 'created_at'))
+        if created_at is not None and (since_dt is None or created_at > since_dt)
+    ))
+    if not newest:
+        return []
+    tickets = ticket_archive.instances(company, from_date, to_date, id__in=[pk for _, pk in newest])
+    prefetch_related_objects(tickets, *_TICKET_RELATED, 'route_id__route_depots__depot')
+    return tickets
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('web_tickets', date_range(), skip_params=('since',))
+@rate_limited('web_tickets')
+@use_reporting_db(date_range(), skip_params=('since',))
 def get_all_transaction_data(request):
     """
     Ticket transactions for the web report page.
@@ -60,11 +88,7 @@ def get_all_transaction_data(request):
                 ticket_date__gte=from_date,
                 ticket_date__lte=to_date,
             ).select_related(
-                'route_id',
-                'from_stage_id__stage',
-                'to_stage_id__stage',
-                'trip_id',
-                'schedule_id',
+                *_TICKET_RELATED
             ).prefetch_related('route_id__route_depots__depot')
         else:
             qs = TransactionData.objects.none()
@@ -78,9 +102,13 @@ def get_all_transaction_data(request):
             qs = qs.filter(created_at__gt=since_dt)
             logger.info(f"Ticket polling: since={since_ts}")
 
-        qs = qs.order_by('-created_at')[:500]
+        tickets = list(qs.order_by('-created_at')[:500])
+        if user.company:
+            archived = _archived_tickets(user.company, from_date, to_date, since_dt, 500)
+            if archived:
+                tickets = sorted(tickets + archived, key=lambda t: t.created_at, reverse=True)[:500]
 
-        serializer = TicketDataSerializer(qs, many=True)
+        serializer = TicketDataSerializer(tickets, many=True)
         return Response({
             "message": "success",
             "data": serializer.data,
@@ -98,6 +126,9 @@ def get_all_transaction_data(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('web_trips', date_range(), skip_params=('since',))
+@rate_limited('web_trips')
+@use_reporting_db(date_range(), skip_params=('since',))
 def get_all_trip_data(request):
     """
     Combined trip open+close data for the Trip Data report page.
@@ -162,6 +193,9 @@ def get_all_trip_data(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, LicensePermission])
+@cached_report('web_schedules', date_range(), skip_params=('since',))
+@rate_limited('web_schedules')
+@use_reporting_db(date_range(), skip_params=('since',))
 def get_all_schedule_data(request):
     """
     Combined schedule open+close data for the Schedule Data report page.
@@ -228,3 +262,33 @@ def get_all_schedule_data(request):
         logger.exception("Error fetching schedule data")
         return JsonResponse({"message": str(e)},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# ── Ticket export (background report job) ─────────────────────────────────────
+# The ticket page above shows at most 500 rows. The full range is exported as
+# CSV by a report job instead (see report_jobs.py). Columns are the dimensions
+# stamped on the ticket at ingest, so the export streams transaction_data
+# without joins.
+
+TICKET_EXPORT_COLUMNS = (
+    'ticket_date', 'ticket_time', 'palmtec_id', 'bus_no', 'route_code',
+    'schedule_start_date', 'schedule_no', 'trip_no', 'ticket_number',
+    'from_stage', 'to_stage', 'full_count', 'half_count', 'st_count',
+    'phy_count', 'lugg_count', 'ladies_count', 'senior_count', 'total_tickets',
+    'ticket_amount', 'lugg_amount', 'ticket_status', 'transaction_id',
+)
+
+
+def _collect_ticket_export(company, params, from_date, to_date, writer):
+    rows = TransactionData.objects.filter(
+        company_code=company,
+        ticket_date__range=[from_date, to_date],
+    ).order_by('ticket_date', 'ticket_time', 'id').values_list(*TICKET_EXPORT_COLUMNS)
+    # Both streams are in (ticket_date, ticket_time) order — the first two columns.
+    for row in heapq.merge(
+        rows.iterator(chunk_size=2000),
+        ticket_archive.rows(company, from_date, to_date, TICKET_EXPORT_COLUMNS),
+        key=lambda r: (r[0], r[1]),
+    ):
+        writer.writerow(row)
+    return writer
@@ -506,11 +506,8 @@ def toggle_user_active(request, user_id):
     # Kill the active session when deactivating so the token is immediately invalid
     if not new_state:
         from ...models import UserSession
-        from ...authentication import kill_session
-        sessions_to_kill = list(UserSession.objects.filter(user=target, is_active=True))
-        for s in sessions_to_kill:
-            kill_session(s)
-        killed = len(sessions_to_kill)
+        from ...authentication import kill_sessions
+        killed = kill_sessions(UserSession.objects.filter(user=target))
         if killed:
             import logging
             logging.getLogger(__name__).info(
@@ -0,0 +1,81 @@
+/**
+ * useLiveUpdates
+ * ==============
+ * Subscribes a report page to the server's live push channel
+ * (GET /live_updates, Server-Sent Events) instead of polling `since=`.
+ *
+ * Behaviour:
+ *  - Opens one EventSource for the given kind + date range while enabled.
+ *  - Each pushed row (same shape as get_all_*_data rows) goes to onRows([row]).
+ *  - 'resync' (server dropped events for this tab) and every reconnect after
+ *    an error call onResync() — caller runs one normal since= poll.
+ *  - 'logout' closes the stream; the next API call handles the redirect.
+ *
+ * Props:
+ *  kind        — 'ticket' | 'trip' | 'schedule'
+ *  fromDate    — YYYY-MM-DD
+ *  toDate      — YYYY-MM-DD
+ *  onRows(rows)
+ *  onResync()
+ *  enabled     — false pauses the stream (hidden tab, past date range)
+ *
+ * Returns:
+ *  connected   — true while the stream is live; pages skip their polling
+ *                timer while this is true and fall back to it otherwise.
+ */
+
+import { useEffect, useRef, useState } from 'react';
+import { BASE_URL } from '../assets/js/axiosConfig';
+
+export function useLiveUpdates({ kind, fromDate, toDate, onRows, onResync, enabled = true }) {
+    const [connected, setConnected] = useState(false);
+
+    // Keep latest callbacks without reopening the stream on every render.
+    const onRowsRef = useRef(onRows);
+    const onResyncRef = useRef(onResync);
+    onRowsRef.current = onRows;
+    onResyncRef.current = onResync;
+
+    useEffect(() => {
+        if (!enabled || !fromDate || !toDate || typeof EventSource === 'undefined') {
+            setConnected(false);
+            return undefined;
+        }
+
+        const url = `${BASE_URL}/live_updates?kinds=${kind}` +
+            `&from_date=${fromDate}&to_date=${toDate}`;
+        const source = new EventSource(url, { withCredentials: true });
+        let hadError = false;
+
+        source.addEventListener('ready', () => {
+            setConnected(true);
+            // Anything that landed while we were reconnecting was missed.
+            if (hadError) onResyncRef.current?.();
+            hadError = false;
+        });
+        source.addEventListener(kind, (e) => {
+            try {
+                onRowsRef.current?.([JSON.parse(e.data)]);
+            } catch (err) {
+                console.error('Live update parse error:', err);
+            }
+        });
+        source.addEventListener('resync', () => onResyncRef.current?.());
+        source.addEventListener('logout', () => {
+            source.close();
+            setConnected(false);
+        });
+        source.onerror = () => {
+            // EventSource reconnects by itself; fall back to polling meanwhile.
+            hadError = true;
+            setConnected(false);
+        };
+
+        return () => {
+            source.close();
+            setConnected(false);
+        };
+    }, [kind, fromDate, toDate, enabled]);
+
+    return connected;
+}
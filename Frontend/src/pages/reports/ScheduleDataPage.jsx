@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from 'react';
 import ExcelJS from 'exceljs';
 import api, { BASE_URL } from '../../assets/js/axiosConfig';
 import cacheManager from '../../assets/js/reportCache';
+import { useLiveUpdates } from '../../hooks/useLiveUpdates';
 import { Card, CardContent } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -469,13 +470,23 @@ export default function ScheduleDataPage() {
     }
   }, []);
 
+  // Live push (SSE) — while connected it replaces the polling timer below
+  const liveConnected = useLiveUpdates({
+    kind: 'schedule',
+    fromDate: appliedFilters.startDate,
+    toDate: appliedFilters.endDate,
+    onRows: (rows) => applyIncoming(rows),
+    onResync: () => pollForUpdates(),
+    enabled: isPolling && !pollingPaused && isPageVisible,
+  });
+
   useEffect(() => {
-    if (isPolling && !pollingPaused && isPageVisible && appliedFilters.startDate && appliedFilters.endDate) {
+    if (isPolling && !pollingPaused && isPageVisible && !liveConnected && appliedFilters.startDate && appliedFilters.endDate) {
       pollingIntervalRef.current = setInterval(pollForUpdates, 8000);
       return () => clearInterval(pollingIntervalRef.current);
     }
     clearInterval(pollingIntervalRef.current);
-  }, [isPolling, pollingPaused, isPageVisible, appliedFilters.startDate, appliedFilters.endDate]);
+  }, [isPolling, pollingPaused, isPageVisible, liveConnected, appliedFilters.startDate, appliedFilters.endDate]);
 
   useEffect(() => {
     if (isDateRangeEnded()) { setPollingPaused(true); setIsPolling(false); }
@@ -487,6 +498,30 @@ export default function ScheduleDataPage() {
     return data.reduce((max, s) => (s.updated_at > max ? s.updated_at : max), data[0].updated_at);
   };
 
+  // Merge new/updated rows — from a since= poll or a live push
+  const applyIncoming = (incoming) => {
+    if (!incoming.length) return;
+    setScheduleData(prev => {
+      const byId = new Map(prev.map(s => [s.id, s]));
+      const brandNew = [];
+      incoming.forEach(s => {
+        if (!byId.has(s.id)) brandNew.push(s);
+        byId.set(s.id, s);
+      });
+      const merged = prev.map(s => byId.get(s.id));
+      return brandNew.length > 0 ? [...brandNew, ...merged] : merged;
+    });
+
+    const maxTs = getMaxUpdatedAt(incoming);
+    if (maxTs && (!latestTimestampRef.current || maxTs > latestTimestampRef.current)) {
+      latestTimestampRef.current = maxTs;
+    }
+
+    const newIds = new Set(incoming.map(s => s.id));
+    setNewScheduleIds(newIds);
+    setTimeout(() => setNewScheduleIds(new Set()), 2500);
+  };
+
   const fetchScheduleData = async (startDate, endDate, sinceTimestamp = null) => {
     try {
       if (!sinceTimestamp) setIsRefreshing(true);
@@ -499,28 +534,7 @@ export default function ScheduleDataPage() {
 
       if (response.data.message === 'success') {
         if (sinceTimestamp) {
-          const incoming = response.data.data || [];
-          if (incoming.length > 0) {
-            setScheduleData(prev => {
-              const byId = new Map(prev.map(s => [s.id, s]));
-              const brandNew = [];
-              incoming.forEach(s => {
-                if (!byId.has(s.id)) brandNew.push(s);
-                byId.set(s.id, s);
-              });
-              const merged = prev.map(s => byId.get(s.id));
-              return brandNew.length > 0 ? [...brandNew, ...merged] : merged;
-            });
-
-            const maxTs = getMaxUpdatedAt(incoming);
-            if (maxTs && (!latestTimestampRef.current || maxTs > latestTimestampRef.current)) {
-              latestTimestampRef.current = maxTs;
-            }
-
-            const newIds = new Set(incoming.map(s => s.id));
-            setNewScheduleIds(newIds);
-            setTimeout(() => setNewScheduleIds(new Set()), 2500);
-          }
+          applyIncoming(response.data.data || []);
           setLastUpdated(new Date());
           setLastUpdateDuration(duration);
         } else {
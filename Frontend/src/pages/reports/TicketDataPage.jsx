@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from 'react';
 import ExcelJS from 'exceljs';
 import api, { BASE_URL } from '../../assets/js/axiosConfig';
 import cacheManager from '../../assets/js/reportCache';
+import { useLiveUpdates } from '../../hooks/useLiveUpdates';
 import { Card, CardContent } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -422,20 +423,48 @@ export default function TicketDataPage() {
     }
   }, []);
 
+  // Live push (SSE) — while connected it replaces the polling timer below
+  const liveConnected = useLiveUpdates({
+    kind: 'ticket',
+    fromDate: appliedFilters.startDate,
+    toDate: appliedFilters.endDate,
+    onRows: (rows) => applyIncoming(rows),
+    onResync: () => pollForNew(),
+    enabled: isPolling && !pollingPaused && isPageVisible,
+  });
+
   // Polling
   useEffect(() => {
-    if (isPolling && !pollingPaused && isPageVisible && appliedFilters.startDate && appliedFilters.endDate) {
+    if (isPolling && !pollingPaused && isPageVisible && !liveConnected && appliedFilters.startDate && appliedFilters.endDate) {
       pollingIntervalRef.current = setInterval(pollForNew, 10000);
       return () => clearInterval(pollingIntervalRef.current);
     }
     clearInterval(pollingIntervalRef.current);
-  }, [isPolling, pollingPaused, isPageVisible, appliedFilters.startDate, appliedFilters.endDate]);
+  }, [isPolling, pollingPaused, isPageVisible, liveConnected, appliedFilters.startDate, appliedFilters.endDate]);
 
   useEffect(() => {
     if (isDateRangeEnded()) { setPollingPaused(true); setIsPolling(false); }
     else setPollingPaused(false);
   }, [appliedFilters.endDate]);
 
+  // Merge new/updated rows — from a since= poll or a live push
+  const applyIncoming = (incoming) => {
+    if (!incoming.length) return;
+    setTransactions(prev => {
+      const existingIds = new Set(prev.map(t => t.id));
+      const brandNew = incoming.filter(t => !existingIds.has(t.id));
+      if (!brandNew.length) return prev;
+      const newIds = new Set(brandNew.map(t => t.id));
+      setNewTicketIds(newIds);
+      setTimeout(() => setNewTicketIds(new Set()), 2500);
+      return [...brandNew, ...prev];
+    });
+    const ts = incoming[0].created_at;
+    if (ts && (!latestTimestampRef.current || ts > latestTimestampRef.current)) {
+      latestTimestampRef.current = ts;
+    }
+  };
+
   const fetchTransactions = async (startDate, endDate, sinceTimestamp = null) => {
     try {
       if (!sinceTimestamp) setIsRefreshing(true);
@@ -448,19 +477,7 @@ export default function TicketDataPage() {
 
       if (response.data.message === 'success') {
         if (sinceTimestamp) {
-          const incoming = response.data.data || [];
-          if (incoming.length > 0) {
-            setTransactions(prev => {
-              const existingIds = new Set(prev.map(t => t.id));
-              const brandNew = incoming.filter(t => !existingIds.has(t.id));
-              if (!brandNew.length) return prev;
-              const newIds = new Set(brandNew.map(t => t.id));
-              setNewTicketIds(newIds);
-              setTimeout(() => setNewTicketIds(new Set()), 2500);
-              return [...brandNew, ...prev];
-            });
-            latestTimestampRef.current = incoming[0].created_at;
-          }
+          applyIncoming(response.data.data || []);
           setLastUpdated(new Date());
           setLastUpdateDuration(duration);
         } else {
@@ -2,6 +2,7 @@ import React, { useState, useEffect, useRef } from 'react';
 import ExcelJS from 'exceljs';
 import api, { BASE_URL } from '../../assets/js/axiosConfig';
 import cacheManager from '../../assets/js/reportCache';
+import { useLiveUpdates } from '../../hooks/useLiveUpdates';
 import { Card, CardContent } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -462,14 +463,24 @@ export default function TripDataPage() {
     }
   }, []);
 
+  // Live push (SSE) — while connected it replaces the polling timer below
+  const liveConnected = useLiveUpdates({
+    kind: 'trip',
+    fromDate: appliedFilters.startDate,
+    toDate: appliedFilters.endDate,
+    onRows: (rows) => applyIncoming(rows),
+    onResync: () => pollForUpdates(),
+    enabled: isPolling && !pollingPaused && isPageVisible,
+  });
+
   // Polling
   useEffect(() => {
-    if (isPolling && !pollingPaused && isPageVisible && appliedFilters.startDate && appliedFilters.endDate) {
+    if (isPolling && !pollingPaused && isPageVisible && !liveConnected && appliedFilters.startDate && appliedFilters.endDate) {
       pollingIntervalRef.current = setInterval(pollForUpdates, 8000);
       return () => clearInterval(pollingIntervalRef.current);
     }
     clearInterval(pollingIntervalRef.current);
-  }, [isPolling, pollingPaused, isPageVisible, appliedFilters.startDate, appliedFilters.endDate]);
+  }, [isPolling, pollingPaused, isPageVisible, liveConnected, appliedFilters.startDate, appliedFilters.endDate]);
 
   // Pause polling when date range has passed
   useEffect(() => {
@@ -482,6 +493,30 @@ export default function TripDataPage() {
     return data.reduce((max, t) => (t.updated_at > max ? t.updated_at : max), data[0].updated_at);
   };
 
+  // Merge new/updated rows — from a since= poll or a live push
+  const applyIncoming = (incoming) => {
+    if (!incoming.length) return;
+    setTripData(prev => {
+      const byId = new Map(prev.map(t => [t.id, t]));
+      const brandNew = [];
+      incoming.forEach(t => {
+        if (!byId.has(t.id)) brandNew.push(t);
+        byId.set(t.id, t);
+      });
+      const merged = prev.map(t => byId.get(t.id));
+      return brandNew.length > 0 ? [...brandNew, ...merged] : merged;
+    });
+
+    const maxTs = getMaxUpdatedAt(incoming);
+    if (maxTs && (!latestTimestampRef.current || maxTs > latestTimestampRef.current)) {
+      latestTimestampRef.current = maxTs;
+    }
+
+    const newIds = new Set(incoming.map(t => t.id));
+    setNewTripIds(newIds);
+    setTimeout(() => setNewTripIds(new Set()), 2500);
+  };
+
   const fetchTripData = async (startDate, endDate, sinceTimestamp = null) => {
     try {
       if (!sinceTimestamp) setIsRefreshing(true);
@@ -494,28 +529,7 @@ export default function TripDataPage() {
 
       if (response.data.message === 'success') {
         if (sinceTimestamp) {
-          const incoming = response.data.data || [];
-          if (incoming.length > 0) {
-            setTripData(prev => {
-              const byId = new Map(prev.map(t => [t.id, t]));
-              const brandNew = [];
-              incoming.forEach(t => {
-                if (!byId.has(t.id)) brandNew.push(t);
-                byId.set(t.id, t);
-              });
-              const merged = prev.map(t => byId.get(t.id));
-              return brandNew.length > 0 ? [...brandNew, ...merged] : merged;
-            });
-
-            const maxTs = getMaxUpdatedAt(incoming);
-            if (maxTs && (!latestTimestampRef.current || maxTs > latestTimestampRef.current)) {
-              latestTimestampRef.current = maxTs;
-            }
-
-            const newIds = new Set(incoming.map(t => t.id));
-            setNewTripIds(newIds);
-            setTimeout(() => setNewTripIds(new Set()), 2500);
-          }
+          applyIncoming(response.data.data || []);
           setLastUpdated(new Date());
           setLastUpdateDuration(duration);
         } else {